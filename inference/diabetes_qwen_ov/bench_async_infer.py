@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark: sync (one implicit infer request) vs async
+(AsyncInferQueue + THROUGHPUT streams) execution modes.
+
+    python bench_async_infer.py [--concurrency 16] [--requests 64] [--max-new-tokens 64]
+
+Each mode runs in its own process (the service reads its config at import)
+and replays val.jsonl prompts through the batcher with N concurrent clients.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+# Same val.jsonl prompts as verify_kv_parity.py, same percentiles as bench_load.py
+from bench_load import percentiles
+from verify_kv_parity import load_prompts
+
+
+async def run_clients(svc, prompts, concurrency: int, max_new_tokens: int) -> dict:
+    sem = asyncio.Semaphore(concurrency)
+    latencies, tokens = [], 0
+
+    async def one(prompt):
+        nonlocal tokens
+        async with sem:
+            t0 = time.perf_counter()
+            ids = svc.encode_prompt(prompt)
+            new_ids = await svc.batcher.submit(
+                ids, max_new_tokens, prefix_len=svc.prefix_length(prompt, ids)
+            )
+            latencies.append(time.perf_counter() - t0)
+            tokens += len(new_ids)
+
+    await one(prompts[0])  # warm-up
+    latencies.clear()
+    tokens = 0
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(p) for p in prompts))
+    wall = time.perf_counter() - t0
+
+    return {
+        "requests": len(prompts),
+        "tokens": tokens,
+        "wall_s": round(wall, 3),
+        "tokens_per_s": round(tokens / wall, 2),
+        "latency_s": percentiles(latencies),
+    }
+
+
+def worker(args):
+    import ov_diabetes_service as svc
+    svc.load_model()
+
+    prompts = load_prompts(args.requests, every_turn=True, repeat=True)
+    result = asyncio.run(run_clients(svc, prompts, args.concurrency, args.max_new_tokens))
+    result["mode"] = svc.INFER_MODE
+    # A draft model (DRAFT_OV_DIR) swaps the BatcherPool for one SpeculativeRunner
+    speculative = isinstance(svc.batcher, svc.SpeculativeRunner)
+    result["decoding"] = "speculative" if speculative else "batching"
+    result["lanes"] = len(getattr(svc.batcher, "lanes", [svc.batcher]))
+    print("RESULT " + json.dumps(result), flush=True)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--requests", type=int, default=64)
+    ap.add_argument("--max-new-tokens", type=int, default=64)
+    ap.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.worker:
+        worker(args)
+        return
+
+    results = {}
+    for mode in ("sync", "async"):
+        env = dict(os.environ, INFER_MODE=mode)
+        out = subprocess.run(
+            [sys.executable, __file__, "--worker"] + sys.argv[1:],
+            env=env, capture_output=True, text=True, cwd=Path(__file__).parent,
+        )
+        lines = [l for l in out.stdout.splitlines() if l.startswith("RESULT ")]
+        if out.returncode != 0 or not lines:
+            print(f"❌ {mode} run failed:\n{out.stderr[-2000:]}")
+            sys.exit(1)
+        results[mode] = json.loads(lines[-1][len("RESULT "):])
+        print(f"{mode:>5}: {results[mode]}")
+
+    gain = results["async"]["tokens_per_s"] / max(results["sync"]["tokens_per_s"], 1e-9)
+    print(f"🔹 async / sync throughput: {gain:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
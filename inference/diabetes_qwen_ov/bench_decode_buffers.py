@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Memory/latency benchmark for the decode loop.
+
+    python bench_decode_buffers.py [--n 5] [--max-new-tokens 64]
+
+before: full (1, seq_len, vocab) logits + np.concatenate-grown inputs
+        (the original greedy loop, LOGITS_LAST_ONLY=0)
+after : last-position logits window + preallocated token/mask buffers
+        (OVCausalLM.generate, LOGITS_LAST_ONLY=1), both in full-recompute
+        mode (same work per step as "before") and with the KV cache
+
+Each variant runs in its own process; we report ms/token, the peak of
+Python-side (numpy) allocations during decoding, and peak RSS.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+# Same val.jsonl prompts as verify_kv_parity.py
+from verify_kv_parity import load_prompts
+
+
+def legacy_generate(lm, input_ids, attention_mask, max_new_tokens):
+    """The pre-optimization loop: full recompute, full logits, growing arrays."""
+    new_ids = []
+    for _ in range(max_new_tokens):
+        logits, _ = lm.forward(input_ids, attention_mask)
+        next_id = int(logits[0, -1].argmax())
+        new_ids.append(next_id)
+        input_ids = np.concatenate([input_ids, [[next_id]]], axis=1)
+        attention_mask = np.concatenate([attention_mask, [[1]]], axis=1)
+        if lm.eos_id is not None and next_id == lm.eos_id:
+            break
+    return new_ids
+
+
+def worker(args):
+    import ov_diabetes_service as svc
+    svc.load_model()
+
+    variant = os.environ["BENCH_VARIANT"]
+    prompts = load_prompts(args.n, every_turn=True)
+    encoded = [np.array([svc.encode_prompt(p)], dtype=np.int64) for p in prompts]
+
+    def run(ids):
+        if variant == "before":
+            return legacy_generate(svc.lm, ids, np.ones_like(ids), args.max_new_tokens)
+        return svc.lm.generate(ids, np.ones_like(ids), args.max_new_tokens)
+
+    run(encoded[0])  # warm-up
+    tracemalloc.start()
+    tokens, t0 = 0, time.perf_counter()
+    for ids in encoded:
+        tokens += len(run(ids))
+    wall = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print("RESULT " + json.dumps({
+        "variant": variant,
+        "kv_cache": svc.lm.kv_cache,
+        "tokens": tokens,
+        "ms_per_token": round(1000 * wall / max(tokens, 1), 2),
+        "peak_numpy_mb": round(peak / 2**20, 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }), flush=True)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=5)
+    ap.add_argument("--max-new-tokens", type=int, default=64)
+    ap.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.worker:
+        worker(args)
+        return
+
+    variants = {
+        "before": {"LOGITS_LAST_ONLY": "0", "KV_CACHE": "0"},
+        "after": {"LOGITS_LAST_ONLY": "1", "KV_CACHE": "0"},
+        "after+kv": {"LOGITS_LAST_ONLY": "1", "KV_CACHE": "1"},
+    }
+    for name, extra in variants.items():
+        env = dict(os.environ, BENCH_VARIANT=name, **extra)
+        out = subprocess.run(
+            [sys.executable, __file__, "--worker"] + sys.argv[1:],
+            env=env, capture_output=True, text=True, cwd=Path(__file__).parent,
+        )
+        lines = [l for l in out.stdout.splitlines() if l.startswith("RESULT ")]
+        if out.returncode != 0 or not lines:
+            print(f"❌ {name} run failed:\n{out.stderr[-2000:]}")
+            sys.exit(1)
+        print(f"{name:>8}: {lines[-1][len('RESULT '):]}")
+
+
+if __name__ == "__main__":
+    main()
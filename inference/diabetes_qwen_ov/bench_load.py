@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Load test / latency benchmark for the inference services over HTTP.
+
+    python bench_load.py --url http://localhost:8080 [--concurrency 8 | --rate 4]
+                         [--requests 100] [--source curated] [--out run.json]
+    python bench_load.py --local ...          # against a tiny stand-in model
+    python bench_load.py ... --compare base.json
+
+Prompts (--source):
+  curated    user turns of data/hypertension/curated/*.jsonl (default)
+  synthetic  generated patient questions (--seed)
+  <file>     any JSONL with "prompt", "messages" (user turns) or "body"
+--template diabetes|hypertension wraps each prompt like the Orchestrator tools do.
+
+Load:
+  --concurrency N  closed loop, N clients send back to back
+  --rate R         open loop, Poisson arrivals at R req/s (queueing shows up
+                   in latency instead of being hidden by the clients)
+
+Requests go to <url><path>/stream by default, so time-to-first-token is
+measured; --no-stream uses <url><path>. Results (per-request records,
+p50/p95/p99 latency and TTFT, tokens/s) are written as JSON together with
+the git commit, so runs can be compared across commits with --compare.
+
+--local builds make_tiny_model.py's stand-in (if missing), serves it with
+ov_diabetes_service.py on a free port and benchmarks that. The result
+cache is off there (RESULT_CACHE_SIZE=0) so every request decodes; against
+a real service, repeated prompts may be served from its cache ("cached").
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import numpy as np
+
+# This file lives at: inference/diabetes_qwen_ov/bench_load.py
+HERE = Path(__file__).resolve().parent
+ROOT = HERE.parents[1]
+CURATED_DIR = ROOT / "data/hypertension/curated"
+ORCHESTRATOR_DIR = ROOT / "modules/Orchestrator"
+
+SYNTHETIC_CONDITIONS = [
+    "type 2 diabetes", "hypertension", "high LDL cholesterol", "CKD stage 3",
+    "prediabetes", "high triglycerides", "diabetes and high blood pressure",
+]
+SYNTHETIC_ASKS = [
+    "Give me a one-day Indian vegetarian meal plan.",
+    "What should I eat for breakfast?",
+    "Suggest low-salt snacks for the evening.",
+    "Which millets are good for me and how much per meal?",
+    "Is it safe to eat rice at dinner every day?",
+    "Plan my lunch and dinner for a working day.",
+]
+
+
+# -------------------------------------------------------------------
+# Prompts
+# -------------------------------------------------------------------
+def _prompts_from_jsonl(path: Path):
+    prompts = []
+    with path.open() as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            rec = json.loads(line)
+            if rec.get("prompt"):
+                prompts.append(rec["prompt"])
+            elif rec.get("messages"):
+                prompts += [m["content"] for m in rec["messages"] if m.get("role") == "user"]
+            elif rec.get("body"):
+                prompts.append(rec["body"])
+    return prompts
+
+
+def load_prompts(source: str, n: int, seed: int):
+    rng = random.Random(seed)
+    if source == "synthetic":
+        prompts = [
+            f"I am {rng.randint(28, 75)} years old with {rng.choice(SYNTHETIC_CONDITIONS)}. "
+            f"{rng.choice(SYNTHETIC_ASKS)}"
+            for _ in range(n)
+        ]
+    else:
+        paths = sorted(CURATED_DIR.glob("*.jsonl")) if source == "curated" else [Path(source)]
+        prompts = [p for path in paths for p in _prompts_from_jsonl(path)]
+        if not prompts:
+            raise SystemExit(f"❌ No prompts found in {source}")
+        rng.shuffle(prompts)
+    return [prompts[i % len(prompts)] for i in range(n)]
+
+
+def template_fn(name: str):
+    if name == "none":
+        return lambda p: p
+    sys.path.insert(0, str(ORCHESTRATOR_DIR))
+    if name == "diabetes":
+        from app.tools.diabetes_qwen_ov import build_diabetes_prompt
+        return build_diabetes_prompt
+    from app.tools.hypertension_qwen_ov import build_htn_prompt
+    return build_htn_prompt
+
+
+# -------------------------------------------------------------------
+# One request
+# -------------------------------------------------------------------
+async def send(client: httpx.AsyncClient, url: str, payload: dict, stream: bool) -> dict:
+    rec = {"ok": False, "latency_s": None, "ttft_s": None, "tokens": 0, "cached": False}
+    t0 = time.perf_counter()
+    try:
+        if stream:
+            async with client.stream("POST", url + "/stream", json=payload) as r:
+                rec["status"] = r.status_code
+                r.raise_for_status()
+                async for line in r.aiter_lines():
+                    if not line:
+                        continue
+                    event = json.loads(line)
+                    if event.get("text") and rec["ttft_s"] is None:
+                        rec["ttft_s"] = time.perf_counter() - t0
+                    if event.get("done"):
+                        rec["tokens"] = event.get("num_tokens", 0)
+                        rec["cached"] = bool(event.get("cached"))
+        else:
+            r = await client.post(url, json=payload)
+            rec["status"] = r.status_code
+            r.raise_for_status()
+            data = r.json()
+            rec["tokens"] = data.get("num_tokens", 0)
+            rec["cached"] = bool(data.get("cached"))
+        rec["ok"] = True
+    except Exception as e:
+        rec["error"] = repr(e)
+    rec["latency_s"] = time.perf_counter() - t0
+    return rec
+
+
+async def run_load(args, prompts) -> tuple:
+    url = args.url.rstrip("/") + args.path
+    timeout = httpx.Timeout(args.timeout, connect=5.0)
+    limits = httpx.Limits(max_connections=max(args.concurrency, 64))
+
+    def payload(prompt):
+        return {"prompt": prompt, "max_new_tokens": args.max_new_tokens}
+
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        for prompt in prompts[:args.warmup]:
+            await send(client, url, payload(prompt), args.stream)
+
+        records = []
+        t0 = time.perf_counter()
+        if args.rate:
+            # Open loop: exponential inter-arrival times
+            rng = random.Random(args.seed)
+            tasks = []
+            for prompt in prompts:
+                tasks.append(asyncio.create_task(send(client, url, payload(prompt), args.stream)))
+                await asyncio.sleep(rng.expovariate(args.rate))
+            records = await asyncio.gather(*tasks)
+        else:
+            queue = list(reversed(prompts))
+
+            async def client_loop():
+                while queue:
+                    records.append(await send(client, url, payload(queue.pop()), args.stream))
+
+            await asyncio.gather(*(client_loop() for _ in range(args.concurrency)))
+        wall = time.perf_counter() - t0
+    return list(records), wall
+
+
+# -------------------------------------------------------------------
+# Summary / comparison
+# -------------------------------------------------------------------
+def percentiles(values) -> dict:
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "mean": None, "max": None}
+    arr = np.array(values)
+    return {
+        "p50": round(float(np.percentile(arr, 50)), 4),
+        "p95": round(float(np.percentile(arr, 95)), 4),
+        "p99": round(float(np.percentile(arr, 99)), 4),
+        "mean": round(float(arr.mean()), 4),
+        "max": round(float(arr.max()), 4),
+    }
+
+
+def summarize(records, wall: float) -> dict:
+    ok = [r for r in records if r["ok"]]
+    tokens = sum(r["tokens"] for r in ok)
+    decode_rates = [
+        r["tokens"] / (r["latency_s"] - r["ttft_s"])
+        for r in ok if r["ttft_s"] is not None and r["latency_s"] > r["ttft_s"] and r["tokens"]
+    ]
+    return {
+        "requests": len(records),
+        "ok": len(ok),
+        "errors": len(records) - len(ok),
+        "cached": sum(r["cached"] for r in ok),
+        "wall_s": round(wall, 3),
+        "req_per_s": round(len(ok) / wall, 3) if wall else 0.0,
+        "tokens": tokens,
+        "tokens_per_s": round(tokens / wall, 2) if wall else 0.0,
+        "latency_s": percentiles([r["latency_s"] for r in ok]),
+        "ttft_s": percentiles([r["ttft_s"] for r in ok if r["ttft_s"] is not None]),
+        "decode_tokens_per_s": percentiles(decode_rates),
+    }
+
+
+def git_info() -> dict:
+    def git(*cmd):
+        out = subprocess.run(["git", *cmd], cwd=ROOT, capture_output=True, text=True)
+        return out.stdout.strip() if out.returncode == 0 else None
+
+    return {"commit": git("rev-parse", "HEAD"), "dirty": bool(git("status", "--porcelain", "-uno"))}
+
+
+COMPARE_KEYS = [
+    ("req_per_s", None), ("tokens_per_s", None),
+    ("latency_s", "p50"), ("latency_s", "p95"), ("latency_s", "p99"),
+    ("ttft_s", "p50"), ("ttft_s", "p95"), ("ttft_s", "p99"),
+]
+
+
+def compare(base: dict, cur: dict):
+    print(f"🔹 vs {base['meta'].get('git', {}).get('commit', '?')[:10]}:")
+    for key, sub in COMPARE_KEYS:
+        a, b = base["summary"].get(key), cur["summary"].get(key)
+        if sub:
+            a, b = (a or {}).get(sub), (b or {}).get(sub)
+        name = f"{key}.{sub}" if sub else key
+        if a is None or b is None:
+            print(f"  {name:>20}: {a} -> {b}")
+            continue
+        delta = (b - a) / a * 100 if a else 0.0
+        print(f"  {name:>20}: {a} -> {b} ({delta:+.1f}%)")
+
+
+# -------------------------------------------------------------------
+# Local stand-in server
+# -------------------------------------------------------------------
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_local(args):
+    model_dir = Path(args.local_dir)
+    if not (model_dir / "model_fp16.xml").exists():
+        subprocess.run([sys.executable, str(HERE / "make_tiny_model.py"), "--out", str(model_dir)],
+                       check=True)
+    port = _free_port()
+    env = dict(os.environ, MODEL_BASE_DIR=str(model_dir), RESULT_CACHE_SIZE="0")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "ov_diabetes_service:app",
+         "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=HERE, env=env,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit("❌ Local service exited during startup")
+        try:
+            if httpx.get(url + "/ready", timeout=1.0).status_code == 200:
+                return proc, url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    proc.terminate()
+    raise SystemExit("❌ Local service did not become ready")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--url", default="http://localhost:8080")
+    ap.add_argument("--path", default="/generate", help="e.g. /models/diabetes/generate")
+    ap.add_argument("--source", default="curated", help="curated | synthetic | <file.jsonl>")
+    ap.add_argument("--template", default="none", choices=["none", "diabetes", "hypertension"])
+    ap.add_argument("--requests", type=int, default=50)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--rate", type=float, default=None, help="open-loop arrivals per second")
+    ap.add_argument("--max-new-tokens", type=int, default=64)
+    ap.add_argument("--no-stream", dest="stream", action="store_false")
+    ap.add_argument("--warmup", type=int, default=2)
+    ap.add_argument("--timeout", type=float, default=300.0)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", default=None, help="write the JSON results here")
+    ap.add_argument("--compare", default=None, help="previous --out file to diff against")
+    ap.add_argument("--local", action="store_true", help="serve a tiny stand-in model")
+    ap.add_argument("--local-dir", default="/tmp/tiny_qwen_ov")
+    args = ap.parse_args()
+
+    wrap = template_fn(args.template)
+    prompts = [wrap(p) for p in load_prompts(args.source, args.requests, args.seed)]
+
+    proc = None
+    if args.local:
+        proc, args.url = start_local(args)
+    try:
+        records, wall = asyncio.run(run_load(args, prompts))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+
+    result = {
+        "meta": {
+            "git": git_info(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "args": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        },
+        "summary": summarize(records, wall),
+        "requests": records,
+    }
+    print(json.dumps(result["summary"], indent=2))
+    errors = [r["error"] for r in records if not r["ok"]]
+    if errors:
+        print(f"⚠️ {len(errors)} failed, e.g. {errors[0]}")
+
+    if args.out:
+        Path(args.out).write_text(json.dumps(result, indent=2))
+        print("🔹 Results written to", args.out)
+    if args.compare:
+        compare(json.loads(Path(args.compare).read_text()), result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for ov_diabetes_service.py with and without the
+compiled-model cache (CACHE_DIR).
+
+    python bench_startup.py [--cache-dir /tmp/ov_cache]
+
+Runs, each in a fresh process:
+  no-cache   : CACHE_DIR unset, the model is compiled
+  cache-cold : empty CACHE_DIR, compiled and the blob is written
+  cache-warm : same CACHE_DIR again, the blob is imported
+
+and reports the load_model()/warm_up() timings plus process wall time.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+
+def worker():
+    t0 = time.perf_counter()
+    import ov_diabetes_service as svc
+
+    svc.load_model()
+    svc.warm_up()
+    result = {k: v for k, v in svc.startup.items() if k.endswith("_s")}
+    result["in_process_s"] = round(time.perf_counter() - t0, 3)
+    print("RESULT " + json.dumps(result), flush=True)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--cache-dir", default=None, help="default: a fresh temp dir")
+    ap.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.worker:
+        worker()
+        return
+
+    cache_dir = Path(args.cache_dir or tempfile.mkdtemp(prefix="ov_cache_"))
+    shutil.rmtree(cache_dir, ignore_errors=True)
+
+    runs = {
+        "no-cache": {"CACHE_DIR": ""},
+        "cache-cold": {"CACHE_DIR": str(cache_dir)},
+        "cache-warm": {"CACHE_DIR": str(cache_dir)},
+    }
+    results = {}
+    for name, extra in runs.items():
+        env = dict(os.environ, **extra)
+        t0 = time.perf_counter()
+        out = subprocess.run(
+            [sys.executable, __file__, "--worker"],
+            env=env, capture_output=True, text=True, cwd=Path(__file__).parent,
+        )
+        wall = time.perf_counter() - t0
+        lines = [l for l in out.stdout.splitlines() if l.startswith("RESULT ")]
+        if out.returncode != 0 or not lines:
+            print(f"❌ {name} run failed:\n{out.stderr[-2000:]}")
+            sys.exit(1)
+        results[name] = json.loads(lines[-1][len("RESULT "):])
+        results[name]["process_s"] = round(wall, 3)
+        print(f"{name:>10}: {results[name]}")
+
+    blobs = sum(f.stat().st_size for f in cache_dir.glob("*") if f.is_file())
+    print(f"🔹 cache: {cache_dir} ({blobs / 2**20:.1f} MB)")
+    speedup = results["no-cache"]["compile_s"] / max(results["cache-warm"]["compile_s"], 1e-9)
+    print(f"🔹 compile step, no cache / warm cache: {speedup:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Quality/throughput comparison of weight variants (fp16 / int8 / int4).
+
+    python compare_ov_variants.py [--variants fp16 int8 int4] [--n 20]
+                                  [--max-new-tokens 64] [--out report.json]
+
+Each variant runs in its own process (OV_MODEL_VARIANT is read at import),
+replays data/hypertension/curated/val.jsonl user prompts one at a time with
+greedy decoding and reports:
+
+  tokens_per_s   : generated tokens / decode wall time
+  peak_rss_mb    : process peak RSS (model weights + runtime)
+  exact_match    : share of prompts whose token ids equal the baseline's
+  token_agreement: mean length of the common prefix with the baseline,
+                   relative to the longer of the two outputs
+  text_match     : share of prompts whose cleaned completion is identical
+
+The first variant is the baseline; variants without an .xml are skipped.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Same val.jsonl prompts as verify_kv_parity.py
+from verify_kv_parity import load_prompts
+
+
+def worker(args):
+    import ov_diabetes_service as svc
+
+    if not (svc.OV_DIR / svc.MODEL_XML).exists():
+        print("SKIP " + str(svc.OV_DIR / svc.MODEL_XML), flush=True)
+        return
+    svc.load_model()
+    svc.warm_up()
+
+    outputs, completions = [], []
+    tokens, t0 = 0, time.perf_counter()
+    for prompt in load_prompts(args.n):
+        ids = np.array([svc.encode_prompt(prompt)], dtype=np.int64)
+        new_ids = svc.lm.generate(ids, np.ones_like(ids), args.max_new_tokens)
+        outputs.append(new_ids)
+        completions.append(svc.clean_completion(
+            svc.tokenizer.decode(new_ids, skip_special_tokens=True).strip()
+        ))
+        tokens += len(new_ids)
+    wall = time.perf_counter() - t0
+
+    print("RESULT " + json.dumps({
+        "model_xml": svc.MODEL_XML,
+        "load_s": svc.startup["load_s"],
+        "tokens": tokens,
+        "tokens_per_s": round(tokens / wall, 2),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "outputs": outputs,
+        "completions": completions,
+    }), flush=True)
+
+
+def agreement(base: dict, other: dict) -> dict:
+    exact, prefix, text = 0, [], 0
+    for a, b, ta, tb in zip(base["outputs"], other["outputs"],
+                            base["completions"], other["completions"]):
+        exact += a == b
+        text += ta == tb
+        common = 0
+        for x, y in zip(a, b):
+            if x != y:
+                break
+            common += 1
+        prefix.append(common / max(len(a), len(b), 1))
+    n = max(len(prefix), 1)
+    return {
+        "exact_match": round(exact / n, 3),
+        "token_agreement": round(sum(prefix) / n, 3),
+        "text_match": round(text / n, 3),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--variants", nargs="+", default=["fp16", "int8", "int4"])
+    ap.add_argument("--n", type=int, default=20)
+    ap.add_argument("--max-new-tokens", type=int, default=64)
+    ap.add_argument("--out", default=None, help="write the full report (incl. outputs) here")
+    ap.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.worker:
+        worker(args)
+        return
+
+    results = {}
+    for variant in args.variants:
+        env = dict(os.environ, OV_MODEL_VARIANT=variant)
+        env.pop("MODEL_XML", None)
+        out = subprocess.run(
+            [sys.executable, __file__, "--worker"] + sys.argv[1:],
+            env=env, capture_output=True, text=True, cwd=Path(__file__).parent,
+        )
+        if any(l.startswith("SKIP ") for l in out.stdout.splitlines()):
+            print(f"⚠️ {variant}: no model file, skipped")
+            continue
+        lines = [l for l in out.stdout.splitlines() if l.startswith("RESULT ")]
+        if out.returncode != 0 or not lines:
+            print(f"❌ {variant} run failed:\n{out.stderr[-2000:]}")
+            sys.exit(1)
+        results[variant] = json.loads(lines[-1][len("RESULT "):])
+
+    if not results:
+        print("❌ No variant could be run")
+        sys.exit(1)
+
+    baseline = next(iter(results))
+    report = {}
+    for variant, res in results.items():
+        report[variant] = {
+            k: res[k] for k in ("model_xml", "load_s", "tokens", "tokens_per_s", "peak_rss_mb")
+        }
+        report[variant].update(agreement(results[baseline], res))
+        print(f"{variant:>5}: {report[variant]}")
+    print(f"🔹 agreement is measured against {baseline}")
+
+    if args.out:
+        full = {v: {**report[v], "completions": results[v]["completions"]} for v in results}
+        Path(args.out).write_text(json.dumps(full, indent=2, ensure_ascii=False))
+        print("🔹 Report written to", args.out)
+
+
+if __name__ == "__main__":
+    main()
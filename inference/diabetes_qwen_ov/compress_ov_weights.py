@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Write weight-compressed variants of an exported OpenVINO model.
+
+    python compress_ov_weights.py --ov-dir /models/diabetes_qwen_ov [--variants int8 int4]
+
+Reads <ov-dir>/model_fp16.xml and writes model_int8.xml / model_int4.xml
+next to it (tokenizer and config files are shared). Only weights are
+compressed; activations still run in the device precision (bf16 hint),
+so no calibration data is needed. Select a variant in the service with
+OV_MODEL_VARIANT=int8|int4, and check it with compare_ov_variants.py.
+
+Needs nncf (pip install nncf).
+"""
+import argparse
+import time
+from pathlib import Path
+
+# int4: groups of `group_size` input channels share a scale; `ratio` of the
+# layers go to int4, the rest (most sensitive by nncf's metric) stay int8
+VARIANTS = {
+    "int8": {"mode": "INT8_ASYM"},
+    "int4": {"mode": "INT4_ASYM", "group_size": 128, "ratio": 0.8},
+}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--ov-dir", required=True)
+    ap.add_argument("--source", default="model_fp16.xml")
+    ap.add_argument("--variants", nargs="+", default=list(VARIANTS), choices=list(VARIANTS))
+    ap.add_argument("--group-size", type=int, default=None, help="override int4 group size")
+    ap.add_argument("--ratio", type=float, default=None, help="override int4 ratio")
+    args = ap.parse_args()
+
+    import nncf
+    from openvino import Core, save_model
+
+    ov_dir = Path(args.ov_dir)
+    source = ov_dir / args.source
+    core = Core()
+
+    for variant in args.variants:
+        params = dict(VARIANTS[variant])
+        if variant == "int4":
+            if args.group_size is not None:
+                params["group_size"] = args.group_size
+            if args.ratio is not None:
+                params["ratio"] = args.ratio
+        params["mode"] = getattr(nncf.CompressWeightsMode, params["mode"])
+
+        t0 = time.perf_counter()
+        model = core.read_model(str(source))
+        compressed = nncf.compress_weights(model, **params)
+        out = ov_dir / f"model_{variant}.xml"
+        save_model(compressed, str(out))
+
+        src_mb = source.with_suffix(".bin").stat().st_size / 2**20
+        out_mb = out.with_suffix(".bin").stat().st_size / 2**20
+        print(
+            f"✅ {variant}: {out} ({out_mb:.0f} MB vs {src_mb:.0f} MB fp16, "
+            f"{time.perf_counter() - t0:.1f}s)"
+        )
+
+
+if __name__ == "__main__":
+    main()
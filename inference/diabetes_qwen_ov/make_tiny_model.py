@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Build a tiny random stand-in for the exported Qwen model.
+
+    python make_tiny_model.py [--out /tmp/tiny_qwen_ov] [--layers 2] [--hidden 32]
+
+Writes model_fp16.xml/.bin with the same I/O as an optimum export "with
+past" (input_ids, attention_mask, position_ids, past_key_values.N.key/value
+-> logits, present.N.key/value), plus a word-level tokenizer built from the
+curated JSONL files and a config.json. The output is gibberish, but the
+services, scripts and bench_load.py run against it end to end:
+
+    MODEL_BASE_DIR=/tmp/tiny_qwen_ov uvicorn ov_diabetes_service:app --port 8080
+"""
+import argparse
+import json
+import re
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+# This file lives at: inference/diabetes_qwen_ov/make_tiny_model.py
+ROOT = Path(__file__).resolve().parents[2]
+CURATED_DIR = ROOT / "data/hypertension/curated"
+SPECIAL_TOKENS = ["<unk>", "<|endoftext|>"]
+
+
+def build_vocab(size: int):
+    counts = Counter()
+    for path in sorted(CURATED_DIR.glob("*.jsonl")):
+        with path.open() as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                for m in json.loads(line).get("messages", []):
+                    counts.update(re.findall(r"\w+|[^\w\s]", m.get("content", "")))
+    words = [w for w, _ in counts.most_common(size - len(SPECIAL_TOKENS))]
+    return SPECIAL_TOKENS + words
+
+
+def save_tokenizer(vocab, out: Path):
+    from tokenizers import Tokenizer, models, pre_tokenizers
+    from transformers import PreTrainedTokenizerFast
+
+    tok = Tokenizer(models.WordLevel({w: i for i, w in enumerate(vocab)}, unk_token="<unk>"))
+    tok.pre_tokenizer = pre_tokenizers.Whitespace()
+    fast = PreTrainedTokenizerFast(
+        tokenizer_object=tok, unk_token="<unk>", eos_token="<|endoftext|>",
+    )
+    fast.save_pretrained(str(out))
+
+
+def save_config(args, vocab_size: int, out: Path):
+    config = {
+        "architectures": ["Qwen2ForCausalLM"],
+        "model_type": "qwen2",
+        "vocab_size": vocab_size,
+        "hidden_size": args.hidden,
+        "intermediate_size": args.hidden * 2,
+        "num_hidden_layers": args.layers,
+        "num_attention_heads": 1,
+        "num_key_value_heads": 1,
+        "max_position_embeddings": 4096,
+        "eos_token_id": SPECIAL_TOKENS.index("<|endoftext|>"),
+        "bos_token_id": SPECIAL_TOKENS.index("<|endoftext|>"),
+        "torch_dtype": "float32",
+    }
+    (out / "config.json").write_text(json.dumps(config, indent=2))
+
+
+def build_model(vocab_size: int, hidden: int, layers: int, seed: int):
+    import openvino as ov
+    import openvino.opset13 as ops
+
+    rng = np.random.default_rng(seed)
+    emb_w = rng.standard_normal((vocab_size, hidden)).astype(np.float32)
+    out_w = rng.standard_normal((hidden, vocab_size)).astype(np.float32)
+    # Never predict the special tokens, so replies run to max_new_tokens
+    out_b = np.zeros(vocab_size, dtype=np.float32)
+    out_b[:len(SPECIAL_TOKENS)] = -1e4
+
+    def i64(v):
+        return ops.constant(np.array(v, dtype=np.int64))
+
+    input_ids = ops.parameter([-1, -1], ov.Type.i64, name="input_ids")
+    attention_mask = ops.parameter([-1, -1], ov.Type.i64, name="attention_mask")
+    position_ids = ops.parameter([-1, -1], ov.Type.i64, name="position_ids")
+    params = [input_ids, attention_mask, position_ids]
+
+    # (B, T, H) embeddings, scaled by position so order matters
+    x = ops.gather(ops.constant(emb_w), input_ids, i64(0))
+    scale = ops.add(ops.constant(np.float32(1.0)),
+                    ops.multiply(ops.convert(position_ids, "f32"), ops.constant(np.float32(0.01))))
+    x = ops.multiply(x, ops.unsqueeze(scale, i64(-1)))
+    mask = ops.unsqueeze(ops.convert(attention_mask, "f32"), i64([1, 3]))  # (B, 1, Tk, 1)
+    seq_len = ops.gather(ops.shape_of(input_ids), i64([1]), i64(0))
+
+    hidden_state = None
+    presents = []
+    for layer in range(layers):
+        past_k = ops.parameter([-1, 1, -1, hidden], ov.Type.f32,
+                               name=f"past_key_values.{layer}.key")
+        past_v = ops.parameter([-1, 1, -1, hidden], ov.Type.f32,
+                               name=f"past_key_values.{layer}.value")
+        params += [past_k, past_v]
+        new = ops.unsqueeze(ops.multiply(x, ops.constant(np.float32(layer + 1))), i64(1))
+        keys = ops.concat([past_k, new], 2)
+        values = ops.concat([past_v, new], 2)
+        presents += [(f"present.{layer}.key", keys), (f"present.{layer}.value", values)]
+
+        # "Attention": masked running sum over the sequence, last T rows
+        summed = ops.cumsum(ops.multiply(values, mask), i64(2))
+        summed = ops.squeeze(summed, i64([1]))
+        rows = ops.slice(summed, ops.negative(seq_len), i64([np.iinfo(np.int64).max]),
+                         i64([1]), i64([1]))
+        hidden_state = rows if hidden_state is None else ops.add(hidden_state, rows)
+
+    # The current token dominates, so replies wander through the vocabulary
+    hidden_state = ops.add(hidden_state, ops.multiply(x, ops.constant(np.float32(3.0))))
+    logits = ops.matmul(ops.tanh(hidden_state), ops.constant(out_w), False, False)
+    logits = ops.add(logits, ops.constant(out_b))
+    logits.output(0).get_tensor().set_names({"logits"})
+    results = [ops.result(logits)]
+    for name, node in presents:
+        node.output(0).get_tensor().set_names({name})
+        results.append(ops.result(node))
+    return ov.Model(results, params, "tiny_qwen")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--out", default="/tmp/tiny_qwen_ov")
+    ap.add_argument("--vocab-size", type=int, default=2048)
+    ap.add_argument("--hidden", type=int, default=32)
+    ap.add_argument("--layers", type=int, default=2)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    import openvino as ov
+
+    out = Path(args.out)
+    out.mkdir(parents=True, exist_ok=True)
+    vocab = build_vocab(args.vocab_size)
+    save_tokenizer(vocab, out)
+    save_config(args, len(vocab), out)
+    model = build_model(len(vocab), args.hidden, args.layers, args.seed)
+    ov.save_model(model, str(out / "model_fp16.xml"), compress_to_fp16=False)
+    print(f"✅ Tiny model ({len(vocab)} tokens, {args.layers} layers) written to {out}")
+
+
+if __name__ == "__main__":
+    main()
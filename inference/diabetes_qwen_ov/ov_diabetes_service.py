@@ -1,25 +1,83 @@
 #!/usr/bin/env python3
+import asyncio
+import json
 import os
-import re
+import time
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
 
 import numpy as np
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
 from openvino import Core
 from transformers import AutoTokenizer, AutoConfig
 
+from ov_engine import OVCausalLM, StopCriteria, add_logits_window, clean_completion
+from ov_metrics import RESULT_CACHE, install, observe_stages
+from ov_prefix_cache import PrefixCache
+from ov_result_cache import ResultCache, model_fingerprint
+from ov_scheduler import BatcherPool, SpeculativeRunner
+
 # -------------------------------------------------------------------
 # Paths (inside container: /models is volume)
 # -------------------------------------------------------------------
 
 BASE_DIR = Path(os.getenv("MODEL_BASE_DIR", "/home/agenticai/models/diabetes_qwen_ov"))
-MERGED = Path(os.getenv("MERGED_DIR", str(BASE_DIR)))
+MERGED_DIR = Path(os.getenv("MERGED_DIR", str(BASE_DIR)))
 OV_DIR = Path(os.getenv("OV_DIR", str(BASE_DIR)))
+# Weight variant to serve: fp16 (baseline), or int8/int4 written by
+# compress_ov_weights.py; MODEL_XML overrides the file name entirely
+OV_MODEL_VARIANT = os.getenv("OV_MODEL_VARIANT", "fp16").lower()
+MODEL_XML = os.getenv("MODEL_XML", f"model_{OV_MODEL_VARIANT}.xml")
 # Keep replies short by default
 MAX_NEW_TOKENS_DEFAULT = int(os.getenv("MAX_NEW_TOKENS", "64"))
+# Incremental decoding with past key/values (needs a model exported "with past");
+# KV_CACHE=0 falls back to recomputing the full sequence every step
+KV_CACHE = os.getenv("KV_CACHE", "1").lower() not in ("0", "false", "no")
+# Continuous batching: rows per compiled_model call, and how long an idle
+# scheduler waits for more requests before starting a new batch
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "8"))
+MAX_WAIT_MS = float(os.getenv("MAX_WAIT_MS", "10"))
+# In-loop stopping: token n-gram loops, repeated sentences, and the same
+# sentence cap clean_completion() applies afterwards
+STOP_NGRAM = int(os.getenv("STOP_NGRAM", "12"))
+STOP_NGRAM_REPEATS = int(os.getenv("STOP_NGRAM_REPEATS", "3"))
+STOP_MAX_SENTENCES = int(os.getenv("STOP_MAX_SENTENCES", "6"))
+STOP_ON_REPEATED_SENTENCE = os.getenv("STOP_ON_REPEATED_SENTENCE", "1").lower() not in ("0", "false", "no")
+# Rewrite the graph at load time to return only last-position logits
+LOGITS_LAST_ONLY = os.getenv("LOGITS_LAST_ONLY", "1").lower() not in ("0", "false", "no")
+# Execution mode: "sync" = one implicit infer request (latency hint);
+# "async" = AsyncInferQueue over NUM_INFER_REQUESTS requests with the
+# THROUGHPUT hint and NUM_STREAMS CPU streams, one batching lane per request
+INFER_MODE = os.getenv("INFER_MODE", "sync").lower()
+NUM_STREAMS = os.getenv("NUM_STREAMS", "AUTO")
+NUM_INFER_REQUESTS = int(os.getenv("NUM_INFER_REQUESTS", "0"))  # 0 = OV optimal
+# Optional speculative decoding: a small draft model (OpenVINO IR with past,
+# same tokenizer) proposes SPECULATIVE_K (>= 1) tokens per target forward pass
+DRAFT_OV_DIR = os.getenv("DRAFT_OV_DIR")
+DRAFT_MODEL_XML = os.getenv("DRAFT_MODEL_XML", "model_fp16.xml")
+SPECULATIVE_K = int(os.getenv("SPECULATIVE_K", "4"))
+# Shared system-prompt KV cache: memory budget (0 disables) and the text
+# markers that end the shared prefix ("|"-separated)
+PREFIX_CACHE_MB = float(os.getenv("PREFIX_CACHE_MB", "256"))
+PREFIX_CACHE_MARKERS = os.getenv("PREFIX_CACHE_MARKERS", "Patient request:").split("|")
+# Persistent compiled-model cache (empty disables); later starts skip compilation
+CACHE_DIR = os.getenv("CACHE_DIR", "")
+# Warm-up generation run at startup before /ready succeeds
+WARMUP_TOKENS = int(os.getenv("WARMUP_TOKENS", "4"))
+WARMUP_PROMPT = "Suggest a healthy breakfast."
+
+# Greedy replies are deterministic: cache them per (model files, prompt,
+# max_new_tokens, decoding params). Size 0 disables; TTL 0 = no expiry;
+# RESULT_CACHE_DB adds a SQLite tier that survives restarts, pruned to the
+# newest RESULT_CACHE_DB_MAX_ROWS rows (0 = unbounded)
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "1024"))
+RESULT_CACHE_TTL_S = float(os.getenv("RESULT_CACHE_TTL_S", "0"))
+RESULT_CACHE_DB = os.getenv("RESULT_CACHE_DB", "")
+RESULT_CACHE_DB_MAX_ROWS = int(os.getenv("RESULT_CACHE_DB_MAX_ROWS", "100000"))
 
 # Soft style hint to reduce rambling
 ANSWER_SUFFIX = (
@@ -27,26 +85,115 @@ ANSWER_SUFFIX = (
     "Avoid repeating the same phrase multiple times."
 )
 
-print("🔹 Loading tokenizer & config from:", MERGED_DIR)
-tokenizer = AutoTokenizer.from_pretrained(
-    str(MERGED_DIR),
-    use_fast=True,
-    local_files_only=True,
-    trust_remote_code=True,
-)
-config = AutoConfig.from_pretrained(
-    str(MERGED_DIR),
-    local_files_only=True,
-    trust_remote_code=True,
-)
-EOS_ID = config.eos_token_id or tokenizer.eos_token_id
+# Filled in by load_model() (service lifespan, or scripts call it directly)
+tokenizer = config = EOS_ID = None
+lm: Optional[OVCausalLM] = None
+draft_lm: Optional[OVCausalLM] = None
+prefix_cache: Optional[PrefixCache] = None
+result_cache: Optional[ResultCache] = None
+batcher = None
+# Startup timings (seconds) and readiness, reported by /ready
+startup = {"ready": False, "model_xml": MODEL_XML, "cache_dir": CACHE_DIR or None, "error": None}
+
+
+def load_model():
+    global tokenizer, config, EOS_ID, lm, draft_lm, prefix_cache, result_cache, batcher
+    t_start = time.perf_counter()
+
+    print("🔹 Loading tokenizer & config from:", MERGED_DIR)
+    tokenizer = AutoTokenizer.from_pretrained(
+        str(MERGED_DIR),
+        use_fast=True,
+        local_files_only=True,
+        trust_remote_code=True,
+    )
+    config = AutoConfig.from_pretrained(
+        str(MERGED_DIR),
+        local_files_only=True,
+        trust_remote_code=True,
+    )
+    EOS_ID = config.eos_token_id or tokenizer.eos_token_id
+    startup["tokenizer_s"] = round(time.perf_counter() - t_start, 3)
+
+    print("🔹 Loading OpenVINO model from:", OV_DIR / MODEL_XML)
+    core = Core()
+    core.set_property("CPU", {"INFERENCE_PRECISION_HINT": "bf16"})
+    if CACHE_DIR:
+        # Compiled blobs are keyed by model + device config; later starts
+        # import the blob instead of compiling
+        core.set_property({"CACHE_DIR": CACHE_DIR})
+
+    compile_config = {}
+    if INFER_MODE == "async":
+        compile_config = {"PERFORMANCE_HINT": "THROUGHPUT", "NUM_STREAMS": NUM_STREAMS}
+    t0 = time.perf_counter()
+    ov_model = core.read_model(str(OV_DIR / MODEL_XML))
+    if LOGITS_LAST_ONLY:
+        ov_model = add_logits_window(ov_model)
+    compiled_model = core.compile_model(ov_model, "CPU", compile_config)
+    startup["compile_s"] = round(time.perf_counter() - t0, 3)
+
+    infer_requests = 0
+    if INFER_MODE == "async":
+        infer_requests = NUM_INFER_REQUESTS or int(
+            compiled_model.get_property("OPTIMAL_NUMBER_OF_INFER_REQUESTS")
+        )
+        print(f"🔹 Async inference: {infer_requests} infer requests, streams={NUM_STREAMS}")
+    lm = OVCausalLM(
+        compiled_model, config=config, eos_id=EOS_ID, kv_cache=KV_CACHE,
+        infer_requests=infer_requests,
+    )
+    print("🔹 KV cache decoding:", "on" if lm.kv_cache else "off")
+    prefix_cache = (
+        PrefixCache(int(PREFIX_CACHE_MB * 1024 * 1024), markers=PREFIX_CACHE_MARKERS)
+        if PREFIX_CACHE_MB > 0 and lm.kv_cache else None
+    )
+    batcher = BatcherPool(
+        lm, lanes=max(1, infer_requests),
+        max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS, prefix_cache=prefix_cache,
+    )
+
+    if DRAFT_OV_DIR:
+        print("🔹 Loading draft model from:", DRAFT_OV_DIR)
+        t0 = time.perf_counter()
+        draft_model = core.read_model(str(Path(DRAFT_OV_DIR) / DRAFT_MODEL_XML))
+        if LOGITS_LAST_ONLY:
+            draft_model = add_logits_window(draft_model)
+        draft_compiled = core.compile_model(draft_model, "CPU")
+        startup["draft_compile_s"] = round(time.perf_counter() - t0, 3)
+        draft_lm = OVCausalLM(draft_compiled, eos_id=EOS_ID)
+        if SPECULATIVE_K < 1:
+            print(f"⚠️ SPECULATIVE_K={SPECULATIVE_K} proposes no draft tokens; using the batcher")
+        elif lm.kv_cache and draft_lm.kv_cache:
+            batcher = SpeculativeRunner(lm, draft_lm, k=SPECULATIVE_K)
+            print(f"🔹 Speculative decoding: k={SPECULATIVE_K}")
+        else:
+            print("⚠️ Speculative decoding needs KV I/O on both models; using the batcher")
+
+    if RESULT_CACHE_SIZE > 0:
+        model_files = [OV_DIR / MODEL_XML, (OV_DIR / MODEL_XML).with_suffix(".bin")]
+        if draft_lm is not None:
+            draft_xml = Path(DRAFT_OV_DIR) / DRAFT_MODEL_XML
+            model_files += [draft_xml, draft_xml.with_suffix(".bin")]
+        result_cache = ResultCache(
+            model_fingerprint(model_files), max_entries=RESULT_CACHE_SIZE,
+            ttl_s=RESULT_CACHE_TTL_S, db_path=RESULT_CACHE_DB or None,
+            max_disk_entries=RESULT_CACHE_DB_MAX_ROWS,
+        )
+
+    startup["load_s"] = round(time.perf_counter() - t_start, 3)
+
 
-print("🔹 Loading OpenVINO model from:", OV_DIR)
-core = Core()
-core.set_property("CPU", {"INFERENCE_PRECISION_HINT": "bf16"})
+def warm_up():
+    """One short generation so the first real request does not pay for
+    lazy allocations and kernel selection."""
+    t0 = time.perf_counter()
+    input_ids = np.array([encode_prompt(WARMUP_PROMPT)], dtype=np.int64)
+    lm.generate(input_ids, np.ones_like(input_ids), max_new_tokens=WARMUP_TOKENS)
+    if draft_lm is not None:
+        draft_lm.generate(input_ids, np.ones_like(input_ids), max_new_tokens=WARMUP_TOKENS)
+    startup["warmup_s"] = round(time.perf_counter() - t0, 3)
 
-compiled_model = core.compile_model(str(OV_DIR / "model_fp16.xml"), "CPU")
-OUTPUT_PORT = compiled_model.output(0)
 
 # -------------------------------------------------------------------
 # Schemas
@@ -54,72 +201,131 @@ OUTPUT_PORT = compiled_model.output(0)
 class GenerateRequest(BaseModel):
     prompt: str
     max_new_tokens: Optional[int] = None
+    # End the reply as soon as any of these strings is generated (excluded)
+    stop: Optional[List[str]] = None
+    # After any of these markers, end the reply at the next blank line
+    stop_after: Optional[List[str]] = None
 
 
 class GenerateResponse(BaseModel):
     prompt: str
     completion: str
     num_tokens: int
-
-
-# -------------------------------------------------------------------
-# Helper: simple sentence de-dup and trimming
-# -------------------------------------------------------------------
-def clean_completion(completion: str, max_sentences: int = 6) -> str:
-    # Split on sentence boundaries
-    parts = re.split(r'(?<=[.!?])\s+', completion.strip())
-    seen = set()
-    out = []
-    for s in parts:
-        s_norm = s.strip().lower()
-        if not s_norm:
-            continue
-        if s_norm in seen:
-            continue  # drop exact repeats
-        seen.add(s_norm)
-        out.append(s.strip())
-        if len(out) >= max_sentences:
-            break
-    return " ".join(out)
+    stop_reason: Optional[str] = None
+    cached: bool = False
 
 
 # -------------------------------------------------------------------
 # Simple greedy generation
 # -------------------------------------------------------------------
-def greedy_generate_ov(prompt: str, max_new_tokens: int) -> str:
+def encode_prompt(prompt: str) -> list:
     # Add style hint for conciseness
     full_prompt = prompt + ANSWER_SUFFIX
+    return tokenizer.encode(full_prompt)
 
-    enc = tokenizer(full_prompt, return_tensors="np")
-    input_ids = enc["input_ids"]
-    attention_mask = enc["attention_mask"]
 
-    for _ in range(max_new_tokens):
-        res = compiled_model(
-            {
-                "input_ids": input_ids,
-                "attention_mask": attention_mask,
-            }
-        )
-        logits = res[OUTPUT_PORT]  # (1, seq_len, vocab_size)
-        next_id = int(logits[0, -1].argmax())
+def prefix_length(prompt: str, input_ids: list) -> int:
+    """Number of leading ids covered by the shared-prefix cache (0 = none)."""
+    if prefix_cache is None:
+        return 0
+    return prefix_cache.match(prompt, input_ids, tokenizer.encode)
+
 
-        input_ids = np.concatenate([input_ids, [[next_id]]], axis=1)
-        attention_mask = np.concatenate([attention_mask, [[1]]], axis=1)
+def make_stopper(stop: Optional[List[str]] = None,
+                 stop_after: Optional[List[str]] = None) -> StopCriteria:
+    return StopCriteria(
+        tokenizer,
+        stop=stop or (),
+        stop_after=stop_after or (),
+        ngram=STOP_NGRAM,
+        max_ngram_repeats=STOP_NGRAM_REPEATS,
+        max_sentences=STOP_MAX_SENTENCES,
+        stop_on_repeated_sentence=STOP_ON_REPEATED_SENTENCE,
+    )
 
-        if EOS_ID is not None and next_id == EOS_ID:
-            break
 
-    full_text = tokenizer.decode(input_ids[0], skip_special_tokens=True)
-    raw_completion = full_text[len(full_prompt):].strip()
-    cleaned = clean_completion(raw_completion)
-    return cleaned
+def result_key(req: "GenerateRequest", max_new_tokens: int) -> Optional[str]:
+    if result_cache is None:
+        return None
+    params = {
+        "stop": req.stop or [],
+        "stop_after": req.stop_after or [],
+        "answer_suffix": ANSWER_SUFFIX,
+        "stop_ngram": [STOP_NGRAM, STOP_NGRAM_REPEATS],
+        "stop_max_sentences": STOP_MAX_SENTENCES,
+        "stop_on_repeated_sentence": STOP_ON_REPEATED_SENTENCE,
+    }
+    return result_cache.make_key(req.prompt, max_new_tokens, params)
+
+
+def greedy_generate_ov(prompt: str, max_new_tokens: int,
+                       stop: Optional[List[str]] = None) -> str:
+    """Single-request path (no batching); used by scripts and checks."""
+    t0 = time.perf_counter()
+    input_ids = np.array([encode_prompt(prompt)], dtype=np.int64)
+    t_tok = time.perf_counter()
+    stopper = make_stopper(stop)
+    first = []
+
+    def on_token(token_id: int) -> bool:
+        if not first:
+            first.append(time.perf_counter())
+        return not stopper.push(token_id)
+
+    lm.generate(input_ids, np.ones_like(input_ids), max_new_tokens=max_new_tokens,
+                on_token=on_token)
+    t_gen = time.perf_counter()
+    completion = clean_completion(stopper.finish().strip())
+    timings = {"tokenize": t_tok - t0, "detokenize": stopper.detok.seconds,
+               "postprocess": time.perf_counter() - t_gen}
+    if first:
+        timings.update(prefill=first[0] - t_tok, ttft=first[0] - t_tok,
+                       decode=t_gen - first[0])
+    observe_stages(timings, tokens=len(stopper.detok.ids))
+    return completion
+
+
+async def cache_lookup(key: Optional[str]) -> Optional[dict]:
+    if not key:
+        return None
+    hit = await result_cache.aget(key)
+    RESULT_CACHE.labels("hit" if hit is not None else "miss").inc()
+    return hit
 
 
 # -------------------------------------------------------------------
 # FastAPI app
 # -------------------------------------------------------------------
-app = FastAPI(title="Diabetes Qwen OpenVINO Service (Greedy + Clean)")
+async def _startup():
+    t0 = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(None, load_model)
+        await loop.run_in_executor(None, warm_up)
+    except Exception as e:
+        startup["error"] = repr(e)
+        print("❌ Model startup failed:", e)
+        return
+    startup["total_s"] = round(time.perf_counter() - t0, 3)
+    startup["ready"] = True
+    print(f"🔹 Ready in {startup['total_s']:.2f}s", {k: v for k, v in startup.items() if k.endswith("_s")})
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load in the background: "/" answers (liveness) while "/ready" waits
+    task = asyncio.create_task(_startup())
+    yield
+    task.cancel()
+
+
+app = FastAPI(title="Diabetes Qwen OpenVINO Service (Greedy + Clean)", lifespan=lifespan)
+install(app)
+
+
+def _require_ready():
+    if not startup["ready"]:
+        raise HTTPException(status_code=503, detail="Model is loading")
 
 
 @app.get("/")
@@ -127,14 +333,125 @@ def root():
     return {"status": "ok", "model": "diabetes_qwen_ov_bf16_greedy_clean"}
 
 
+@app.get("/ready")
+def ready():
+    """Succeeds only once the model is compiled and warmed up."""
+    if not startup["ready"]:
+        raise HTTPException(status_code=503, detail=startup)
+    return startup
+
+
+@app.get("/stats")
+def stats():
+    _require_ready()
+    mode = "speculative" if isinstance(batcher, SpeculativeRunner) else "batching"
+    return {
+        mode: batcher.snapshot(),
+        "prefix_cache": prefix_cache.snapshot() if prefix_cache else None,
+        "result_cache": result_cache.snapshot() if result_cache else None,
+    }
+
+
 @app.post("/generate", response_model=GenerateResponse)
-def generate(req: GenerateRequest):
+async def generate(req: GenerateRequest):
+    _require_ready()
     max_new = req.max_new_tokens or MAX_NEW_TOKENS_DEFAULT
-    completion = greedy_generate_ov(req.prompt, max_new_tokens=max_new)
+    key = result_key(req, max_new)
+    hit = await cache_lookup(key)
+    if hit is not None:
+        return GenerateResponse(
+            prompt=req.prompt,
+            completion=hit["completion"],
+            num_tokens=hit["num_tokens"],
+            stop_reason=hit["stop_reason"],
+            cached=True,
+        )
+
+    t0 = time.perf_counter()
+    input_ids = encode_prompt(req.prompt)
+    timings = {"tokenize": time.perf_counter() - t0}
+    stopper = make_stopper(req.stop, req.stop_after)
+    await batcher.submit(
+        input_ids, max_new_tokens=max_new, prefix_len=prefix_length(req.prompt, input_ids),
+        stopper=stopper, timings=timings,
+    )
+    t0 = time.perf_counter()
+    text = stopper.finish()
+    completion = clean_completion(text.strip())
     num_tokens = len(tokenizer.encode(completion))
+    timings.update(detokenize=stopper.detok.seconds, postprocess=time.perf_counter() - t0)
+    observe_stages(timings, tokens=len(stopper.detok.ids))
+    if key:
+        await result_cache.aput(key, {"text": text, "completion": completion,
+                                      "num_tokens": num_tokens, "stop_reason": stopper.reason})
 
     return GenerateResponse(
         prompt=req.prompt,
         completion=completion,
         num_tokens=num_tokens,
+        stop_reason=stopper.reason,
     )
+
+
+@app.post("/generate/stream")
+async def generate_stream(req: GenerateRequest):
+    """
+    NDJSON stream: one {"text": ...} line per decoded chunk, then a final
+    {"done": true, "completion": ..., "num_tokens": ...} with the cleaned reply.
+    Text that could still turn into a stop string is held back until decided.
+    """
+    _require_ready()
+    max_new = req.max_new_tokens or MAX_NEW_TOKENS_DEFAULT
+    key = result_key(req, max_new)
+    hit = await cache_lookup(key)
+    if hit is not None:
+        async def replay():
+            if hit["text"]:
+                yield json.dumps({"text": hit["text"]}) + "\n"
+            yield json.dumps({
+                "done": True,
+                "completion": hit["completion"],
+                "num_tokens": hit["num_tokens"],
+                "stop_reason": hit["stop_reason"],
+                "cached": True,
+            }) + "\n"
+
+        return StreamingResponse(replay(), media_type="application/x-ndjson")
+
+    t0 = time.perf_counter()
+    input_ids = encode_prompt(req.prompt)
+    timings = {"tokenize": time.perf_counter() - t0}
+    prefix_len = prefix_length(req.prompt, input_ids)
+    stopper = make_stopper(req.stop, req.stop_after)
+
+    async def events():
+        sent = 0
+        async for _ in batcher.stream(input_ids, max_new_tokens=max_new,
+                                      prefix_len=prefix_len, stopper=stopper,
+                                      timings=timings):
+            safe = stopper.safe_len  # read before text: text only grows past it
+            if safe > sent:
+                yield json.dumps({"text": stopper.text[sent:safe]}) + "\n"
+                sent = safe
+        text = stopper.finish()
+        if len(text) > sent:
+            yield json.dumps({"text": text[sent:]}) + "\n"
+
+        t0 = time.perf_counter()
+        completion = clean_completion(text.strip())
+        num_tokens = len(tokenizer.encode(completion))
+        timings.update(detokenize=stopper.detok.seconds, postprocess=time.perf_counter() - t0)
+        observe_stages(timings, tokens=len(stopper.detok.ids))
+        if key:
+            # Only complete replies get here (a disconnect ends the generator)
+            await result_cache.aput(key, {"text": text, "completion": completion,
+                                          "num_tokens": num_tokens,
+                                          "stop_reason": stopper.reason})
+        yield json.dumps({
+            "done": True,
+            "completion": completion,
+            "num_tokens": num_tokens,
+            "stop_reason": stopper.reason,
+        }) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
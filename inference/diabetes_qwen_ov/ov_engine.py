@@ -0,0 +1,514 @@
+#!/usr/bin/env python3
+"""
+OpenVINO causal-LM runtime used by the specialty inference services.
+
+Models exported *with past* (optimum-cli export openvino
+--task text-generation-with-past --disable-stateful) expose
+`past_key_values.N.key/value` inputs and `present.N.key/value` outputs.
+For those we run prefill once and then feed one token per step.
+Anything else (or KV_CACHE=0) uses the original full-recompute loop.
+"""
+import re
+import time
+from collections import defaultdict
+from concurrent.futures import Future
+from typing import Callable, Iterable, List, Optional, Sequence
+
+import numpy as np
+import openvino.opset13 as ops
+from openvino import AsyncInferQueue, Model, Type
+
+_LAYER_RE = re.compile(r"\.(\d+)\.(key|value)$")
+
+
+def add_logits_window(model: Model) -> Model:
+    """
+    Rewrite the graph so output 0 holds logits for only the last
+    `num_logits` positions (new int64 input of shape [1]).
+
+    Decoding reads one row per step, so the full (batch, seq_len, vocab)
+    tensor was pure memory traffic; speculative verification asks for k+1.
+    """
+    result = model.output(0).get_node()
+    logits = result.input_value(0)
+    num_logits = ops.parameter([1], Type.i64, name="num_logits")
+    num_logits.output(0).get_tensor().set_names({"num_logits"})
+    window = ops.slice(
+        logits,
+        ops.negative(num_logits),
+        ops.constant(np.array([np.iinfo(np.int64).max], dtype=np.int64)),
+        ops.constant(np.array([1], dtype=np.int64)),
+        ops.constant(np.array([1], dtype=np.int64)),
+    )
+    # Keep the output tensor name ("logits") on the new producer
+    names = logits.get_names()
+    logits.get_tensor().set_names(set())
+    window.output(0).get_tensor().set_names(names)
+    result.input(0).replace_source_output(window.output(0))
+    model.add_parameters([num_logits])
+    model.validate_nodes_and_infer_types()
+    return model
+
+
+def _layer_sorted(names) -> List[str]:
+    """Sort past/present port names by (layer index, key before value)."""
+    def key(name):
+        m = _LAYER_RE.search(name)
+        if not m:
+            return (1 << 30, name)
+        return (int(m.group(1)), 0 if m.group(2) == "key" else 1)
+    return sorted(names, key=key)
+
+
+class OVCausalLM:
+    """
+    Thin wrapper around a compiled OpenVINO text-generation model.
+
+    Holds the port layout (logits, past/present KV, optional position_ids)
+    and implements greedy decoding in two modes:
+      - kv_cache=True : prefill once, then one token per step using KV state
+      - kv_cache=False: re-run the whole growing sequence every step
+    Both modes produce token-identical greedy output.
+
+    With infer_requests > 0, forwards go through an AsyncInferQueue of that
+    many infer requests, so that many threads can run inferences at once
+    (one per throughput stream); otherwise compiled_model() is used directly
+    and callers must serialize.
+    """
+
+    def __init__(self, compiled_model, config=None, eos_id: Optional[int] = None,
+                 kv_cache: bool = True, infer_requests: int = 0):
+        self.compiled_model = compiled_model
+        self.eos_id = eos_id
+        self.output_port = compiled_model.output(0)
+
+        self.infer_requests = infer_requests
+        self._infer_queue = None
+        if infer_requests > 0:
+            self._infer_queue = AsyncInferQueue(compiled_model, infer_requests)
+            self._infer_queue.set_callback(self._on_done)
+
+        input_ports = {}
+        for port in compiled_model.inputs:
+            for name in port.get_names():
+                input_ports[name] = port
+        self.has_position_ids = "position_ids" in input_ports
+        # Set when the graph was rewritten by add_logits_window()
+        self.has_logits_window = "num_logits" in input_ports
+
+        self.past_names = _layer_sorted(
+            n for n in input_ports if n.startswith("past_key_values")
+        )
+        self.present_ports = [
+            compiled_model.output(n.replace("past_key_values", "present"))
+            for n in self.past_names
+        ]
+        self.supports_kv = bool(self.past_names)
+        self.kv_cache = kv_cache and self.supports_kv
+
+        # Shape/dtype of an empty past: (batch, kv_heads, 0, head_dim)
+        self._kv_heads = self._kv_head_dim = None
+        self._kv_dtype = np.float32
+        if self.past_names:
+            port = input_ports[self.past_names[0]]
+            pshape = port.get_partial_shape()
+            if pshape[1].is_static and pshape[3].is_static:
+                self._kv_heads = pshape[1].get_length()
+                self._kv_head_dim = pshape[3].get_length()
+            elif config is not None:
+                self._kv_heads = getattr(config, "num_key_value_heads", None) \
+                    or config.num_attention_heads
+                self._kv_head_dim = config.hidden_size // config.num_attention_heads
+            self._kv_dtype = port.get_element_type().to_dtype()
+
+    # ---------------------------------------------------------------
+    # Single forward pass
+    # ---------------------------------------------------------------
+    def empty_past(self, batch: int = 1) -> List[np.ndarray]:
+        shape = (batch, self._kv_heads, 0, self._kv_head_dim)
+        return [np.zeros(shape, dtype=self._kv_dtype) for _ in self.past_names]
+
+    def forward(self, input_ids: np.ndarray, attention_mask: np.ndarray,
+                past: Optional[Sequence[np.ndarray]] = None, num_logits: int = 1):
+        """
+        Run one inference.
+
+        `attention_mask` covers past + current tokens.
+        Returns (logits, present); present is None for models without KV I/O.
+        Logits always hold at least the last `num_logits` positions
+        (exactly that many when the graph has a logits window).
+        """
+        inputs = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if self.has_logits_window:
+            inputs["num_logits"] = np.array([num_logits], dtype=np.int64)
+        if self.has_position_ids:
+            positions = np.cumsum(attention_mask, axis=1) - 1
+            np.maximum(positions, 0, out=positions)
+            inputs["position_ids"] = positions[:, -input_ids.shape[1]:]
+        if self.past_names:
+            if past is None:
+                past = self.empty_past(input_ids.shape[0])
+            inputs.update(zip(self.past_names, past))
+
+        if self._infer_queue is None:
+            res = self.compiled_model(inputs)
+        else:
+            done = Future()
+            self._infer_queue.start_async(inputs, done)  # waits for an idle request
+            res = done.result()
+        logits = res[self.output_port]  # (batch, seq_len, vocab_size)
+        present = [res[p] for p in self.present_ports] if self.past_names else None
+        return logits, present
+
+    def _on_done(self, request, done: Future):
+        # The request is recycled for the next job: copy outputs out first
+        try:
+            ports = [self.output_port] + self.present_ports
+            done.set_result({p: request.get_tensor(p).data.copy() for p in ports})
+        except Exception as e:
+            done.set_exception(e)
+
+    # ---------------------------------------------------------------
+    # Greedy decoding
+    # ---------------------------------------------------------------
+    def generate(self, input_ids: np.ndarray, attention_mask: np.ndarray,
+                 max_new_tokens: int,
+                 on_token: Optional[Callable[[int], bool]] = None) -> List[int]:
+        """
+        Greedy-decode up to `max_new_tokens`; returns only the new token ids.
+        `on_token` sees each token and may return False to stop early.
+        """
+        if self.kv_cache:
+            return self._generate_kv(input_ids, attention_mask, max_new_tokens, on_token)
+        return self._generate_full(input_ids, attention_mask, max_new_tokens, on_token)
+
+    def _done(self, token_id: int, on_token) -> bool:
+        if on_token is not None and on_token(token_id) is False:
+            return True
+        return self.eos_id is not None and token_id == self.eos_id
+
+    def _generate_full(self, input_ids, attention_mask, max_new_tokens,
+                       on_token=None) -> List[int]:
+        # Fixed-capacity buffers; each step passes a growing view, no reallocation
+        prompt_len = input_ids.shape[1]
+        ids_buf = np.zeros((1, prompt_len + max_new_tokens), dtype=input_ids.dtype)
+        mask_buf = np.ones((1, prompt_len + max_new_tokens), dtype=attention_mask.dtype)
+        ids_buf[:, :prompt_len] = input_ids
+        mask_buf[:, :prompt_len] = attention_mask
+
+        new_ids: List[int] = []
+        for step in range(max_new_tokens):
+            cur = prompt_len + step
+            logits, _ = self.forward(ids_buf[:, :cur], mask_buf[:, :cur])
+            next_id = int(logits[0, -1].argmax())
+            new_ids.append(next_id)
+            ids_buf[0, cur] = next_id
+
+            if self._done(next_id, on_token):
+                break
+        return new_ids
+
+    def _generate_kv(self, input_ids, attention_mask, max_new_tokens,
+                     on_token=None) -> List[int]:
+        new_ids: List[int] = []
+        if max_new_tokens <= 0:
+            return new_ids
+
+        # Fixed-capacity mask and a reusable one-token input
+        prompt_len = input_ids.shape[1]
+        mask_buf = np.ones((1, prompt_len + max_new_tokens), dtype=attention_mask.dtype)
+        mask_buf[:, :prompt_len] = attention_mask
+        token_buf = np.zeros((1, 1), dtype=input_ids.dtype)
+
+        # Prefill: whole prompt once
+        logits, past = self.forward(input_ids, attention_mask)
+        next_id = int(logits[0, -1].argmax())
+
+        for step in range(max_new_tokens):
+            new_ids.append(next_id)
+            if self._done(next_id, on_token):
+                break
+            if step == max_new_tokens - 1:
+                break
+
+            # Decode: feed only the newest token, reuse past key/values
+            token_buf[0, 0] = next_id
+            logits, past = self.forward(token_buf, mask_buf[:, :prompt_len + step + 1], past)
+            next_id = int(logits[0, -1].argmax())
+        return new_ids
+
+
+def _truncate_past(past: List[np.ndarray], length: int) -> List[np.ndarray]:
+    """Drop KV entries beyond `length` tokens (they belong to rejected drafts)."""
+    return [p[:, :, :length] for p in past]
+
+
+def speculative_generate(target: OVCausalLM, draft: OVCausalLM, input_ids: Sequence[int],
+                         max_new_tokens: int, k: int = 4, stats: Optional[dict] = None,
+                         on_token: Optional[Callable[[int], bool]] = None) -> List[int]:
+    """
+    Greedy speculative decoding: `draft` proposes k tokens, `target` checks
+    them in one forward pass. A proposal is kept only while it equals the
+    target's own argmax, and the target's token is appended at the first
+    mismatch, so the output is identical to target.generate().
+
+    Both models need KV I/O and the same tokenizer. `stats` (if given) is
+    updated with forward counts and proposal/acceptance totals; `on_token`
+    sees each committed token and may return False to stop early.
+    """
+    if k < 1:
+        raise ValueError(f"speculative decoding needs k >= 1, got {k}")
+    stats = stats if stats is not None else {}
+    for key in ("target_forwards", "draft_forwards", "proposed", "accepted", "tokens"):
+        stats.setdefault(key, 0)
+
+    seq = list(input_ids)
+    new_ids: List[int] = []
+    if max_new_tokens <= 0:
+        return new_ids
+
+    def commit(token_id: int) -> bool:
+        """Append a token; returns False when generation must stop."""
+        seq.append(token_id)
+        new_ids.append(token_id)
+        stats["tokens"] += 1
+        keep_going = on_token(token_id) if on_token else True
+        if target.eos_id is not None and token_id == target.eos_id:
+            return False
+        return keep_going is not False and len(new_ids) < max_new_tokens
+
+    # Prefill the target; its first token is always kept
+    ids = np.array([seq], dtype=np.int64)
+    logits, target_past = target.forward(ids, np.ones_like(ids))
+    stats["target_forwards"] += 1
+    target_len = len(seq)
+    draft_past, draft_len = None, 0
+    if not commit(int(logits[0, -1].argmax())):
+        return new_ids
+
+    while True:
+        # Draft proposes up to k tokens (never past max_new_tokens)
+        n_prop = min(k, max_new_tokens - len(new_ids))
+        proposals: List[int] = []
+        feed = seq[draft_len:]
+        for _ in range(n_prop):
+            ids = np.array([feed], dtype=np.int64)
+            mask = np.ones((1, draft_len + len(feed)), dtype=np.int64)
+            d_logits, draft_past = draft.forward(ids, mask, draft_past)
+            stats["draft_forwards"] += 1
+            draft_len += len(feed)
+            proposals.append(int(d_logits[0, -1].argmax()))
+            feed = proposals[-1:]
+
+        # Target verifies all proposals in one pass
+        feed = seq[target_len:] + proposals
+        ids = np.array([feed], dtype=np.int64)
+        mask = np.ones((1, target_len + len(feed)), dtype=np.int64)
+        logits, target_past = target.forward(
+            ids, mask, target_past, num_logits=len(proposals) + 1
+        )
+        stats["target_forwards"] += 1
+        greedy = logits[0, -(len(proposals) + 1):].argmax(axis=-1)
+
+        accepted = 0
+        while accepted < len(proposals) and proposals[accepted] == int(greedy[accepted]):
+            accepted += 1
+        stats["proposed"] += len(proposals)
+        stats["accepted"] += accepted
+
+        # Roll both caches back to the committed prefix
+        committed = len(seq) + accepted
+        target_len = committed
+        target_past = _truncate_past(target_past, target_len)
+        draft_len = min(draft_len, committed)
+        draft_past = _truncate_past(draft_past, draft_len)
+
+        for token_id in proposals[:accepted] + [int(greedy[accepted])]:
+            if not commit(token_id):
+                return new_ids
+
+
+class IncrementalDetokenizer:
+    """
+    Turn a growing list of token ids into text deltas.
+
+    Only the last few tokens are re-decoded per step (prefix/read offsets),
+    and nothing is emitted while the tail is an incomplete UTF-8 sequence.
+    `seconds` is the time spent in tokenizer.decode (the "detokenize" stage).
+    """
+
+    def __init__(self, tokenizer, skip_special_tokens: bool = True):
+        self.tokenizer = tokenizer
+        self.skip_special_tokens = skip_special_tokens
+        self.ids: List[int] = []
+        self.text = ""
+        self.seconds = 0.0
+        self._prefix_offset = 0
+        self._read_offset = 0
+
+    def _decode(self, ids) -> str:
+        t0 = time.perf_counter()
+        text = self.tokenizer.decode(ids, skip_special_tokens=self.skip_special_tokens)
+        self.seconds += time.perf_counter() - t0
+        return text
+
+    def push(self, token_id: int) -> str:
+        """Add one token; returns the newly completed text (may be empty)."""
+        self.ids.append(token_id)
+        prefix_text = self._decode(self.ids[self._prefix_offset:self._read_offset])
+        new_text = self._decode(self.ids[self._prefix_offset:])
+        if len(new_text) <= len(prefix_text) or new_text.endswith("\ufffd"):
+            return ""
+        delta = new_text[len(prefix_text):]
+        self._prefix_offset = self._read_offset
+        self._read_offset = len(self.ids)
+        self.text += delta
+        return delta
+
+    def flush(self) -> str:
+        """Emit whatever is still held back at the end of generation."""
+        if self._read_offset >= len(self.ids):
+            return ""
+        prefix_text = self._decode(self.ids[self._prefix_offset:self._read_offset])
+        new_text = self._decode(self.ids[self._prefix_offset:])
+        delta = new_text[len(prefix_text):]
+        self._prefix_offset = self._read_offset = len(self.ids)
+        self.text += delta
+        return delta
+
+
+_SENTENCE_END = re.compile(r"[.!?]\s+")
+
+
+# Simple sentence de-dup and trimming
+def clean_completion(completion: str, max_sentences: int = 6) -> str:
+    # Split on sentence boundaries
+    parts = re.split(r'(?<=[.!?])\s+', completion.strip())
+    seen = set()
+    out = []
+    for s in parts:
+        s_norm = s.strip().lower()
+        if not s_norm:
+            continue
+        if s_norm in seen:
+            continue  # drop exact repeats
+        seen.add(s_norm)
+        out.append(s.strip())
+        if len(out) >= max_sentences:
+            break
+    return " ".join(out)
+
+
+class StopCriteria:
+    """
+    Decides *during* decoding that a reply is finished, instead of trimming
+    the text after all max_new_tokens were spent:
+
+      - stop        : any of these strings appears (text is cut before it)
+      - stop_after  : once one of these markers was generated, the next
+                      blank line ends the reply (e.g. "General Guidelines:")
+      - ngram       : the last `ngram` token ids already occurred
+                      `max_ngram_repeats` times
+      - sentences   : a completed sentence repeats an earlier one (the model
+                      is looping), or
+                      `max_sentences` distinct ones are complete (the same
+                      split clean_completion() uses, so nothing it keeps is lost)
+
+    Text comes from an IncrementalDetokenizer, so each step only decodes the
+    newest tokens. `safe_len` is the prefix of `text` that can be streamed
+    without ever exposing part of a stop string.
+    """
+
+    def __init__(self, tokenizer, stop: Iterable[str] = (), stop_after: Iterable[str] = (),
+                 ngram: int = 12, max_ngram_repeats: int = 3,
+                 max_sentences: Optional[int] = 6, stop_on_repeated_sentence: bool = True):
+        self.detok = IncrementalDetokenizer(tokenizer)
+        self.stop = [s for s in stop if s]
+        self.stop_after = [s for s in stop_after if s]
+        self.ngram = ngram
+        self.max_ngram_repeats = max_ngram_repeats
+        self.max_sentences = max_sentences
+        self.stop_on_repeated_sentence = stop_on_repeated_sentence
+
+        self.text = ""
+        self.safe_len = 0
+        self.reason: Optional[str] = None
+        self._holdback = max((len(s) for s in self.stop + ["\n\n"]), default=1) - 1
+        self._ngrams = defaultdict(int)
+        self._sentences = set()
+        self._sentence_start = 0
+        self._block_from: Optional[int] = None
+
+    def push(self, token_id: int) -> bool:
+        """Feed one token; returns True when generation should stop."""
+        if self.reason:
+            return True
+        delta = self.detok.push(token_id)
+        if self._check_ngram():
+            return self._finish("repetition")
+        if delta:
+            return self._check_text(len(self.text), self.text + delta)
+        return False
+
+    def finish(self) -> str:
+        """Flush held-back text at the end; returns the final reply text."""
+        if not self.reason:
+            tail = self.detok.flush()
+            if tail:
+                self._check_text(len(self.text), self.text + tail)
+        self.safe_len = len(self.text)
+        return self.text
+
+    # ---------------------------------------------------------------
+    def _check_ngram(self) -> bool:
+        ids = self.detok.ids
+        if self.ngram <= 0 or len(ids) < self.ngram:
+            return False
+        key = tuple(ids[-self.ngram:])
+        self._ngrams[key] += 1
+        return self._ngrams[key] >= self.max_ngram_repeats
+
+    def _check_text(self, old_len: int, text: str) -> bool:
+        # Stop strings: only look where a match could newly end
+        window = max(0, old_len - self._holdback)
+        for s in self.stop:
+            idx = text.find(s, window)
+            if idx >= 0:
+                return self._finish("stop", text[:idx])
+
+        if self.stop_after:
+            if self._block_from is None:
+                hits = [text.find(m) for m in self.stop_after]
+                hits = [i for i in hits if i >= 0]
+                if hits:
+                    self._block_from = min(hits)
+            if self._block_from is not None:
+                idx = text.find("\n\n", max(self._block_from, window))
+                if idx >= 0:
+                    return self._finish("stop_after", text[:idx])
+
+        # Sentences completed by this delta
+        for m in _SENTENCE_END.finditer(text, self._sentence_start):
+            sentence = text[self._sentence_start:m.end()].strip().lower()
+            self._sentence_start = m.end()
+            if not sentence:
+                continue
+            if sentence in self._sentences:
+                if self.stop_on_repeated_sentence:
+                    # clean_completion() drops the repeat; keep text as is
+                    return self._finish("repetition", text)
+                continue
+            self._sentences.add(sentence)
+            if self.max_sentences and len(self._sentences) >= self.max_sentences:
+                return self._finish("max_sentences", text[:m.end()])
+
+        self.text = text
+        self.safe_len = max(self.safe_len, len(text) - self._holdback)
+        return False
+
+    def _finish(self, reason: str, text: Optional[str] = None) -> bool:
+        self.reason = reason
+        if text is not None:
+            self.text = text
+        self.safe_len = len(self.text)
+        return True
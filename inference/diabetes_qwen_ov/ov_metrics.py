@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Prometheus metrics and request IDs for the OV services.
+
+install(app) adds GET /metrics and a middleware that times every request
+and tags it with X-Request-ID (taken from the caller, or generated), so
+the same ID links Gateway, Orchestrator and model-service log lines.
+The scheduler and generate paths observe the per-stage histograms below.
+"""
+import contextvars
+import logging
+import time
+import uuid
+from typing import Optional
+
+from fastapi import FastAPI, Request, Response
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+
+log = logging.getLogger("uvicorn")
+
+# Model calls run from milliseconds (cache hits) to a minute (long replies)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+STEP_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+REQUEST_SECONDS = Histogram(
+    "ov_http_request_seconds", "HTTP request time until response headers",
+    ["method", "path", "status"], buckets=LATENCY_BUCKETS,
+)
+STAGE_SECONDS = Histogram(
+    "ov_stage_seconds",
+    "Per-request generation stages: tokenize, queue, prefill, decode, detokenize "
+    "(tokenizer.decode time, part of decode), postprocess (clean-up and token count)",
+    ["stage"], buckets=LATENCY_BUCKETS,
+)
+TTFT_SECONDS = Histogram(
+    "ov_time_to_first_token_seconds", "Enqueue to first generated token",
+    buckets=LATENCY_BUCKETS,
+)
+DECODE_STEP_SECONDS = Histogram(
+    "ov_decode_step_seconds", "One batched decode forward pass", buckets=STEP_BUCKETS,
+)
+BATCH_ROWS = Histogram(
+    "ov_decode_batch_rows", "Rows per batched decode step",
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+TOKENS = Counter("ov_generated_tokens_total", "Generated tokens")
+RESULT_CACHE = Counter("ov_result_cache_lookups_total", "Result cache lookups", ["outcome"])
+
+REQUEST_ID: contextvars.ContextVar[str] = contextvars.ContextVar("request_id", default="")
+
+
+def observe_stages(timings: dict, tokens: Optional[int] = None):
+    """
+    Record a request's stage timings (seconds only) and log them with its
+    ID and, if given, the number of generated tokens.
+    """
+    for stage in ("tokenize", "queue", "prefill", "decode", "detokenize", "postprocess"):
+        if stage in timings:
+            STAGE_SECONDS.labels(stage).observe(timings[stage])
+    if "ttft" in timings:
+        TTFT_SECONDS.observe(timings["ttft"])
+    fields = [f"{k}_ms={v * 1000:.1f}" for k, v in timings.items()]
+    if tokens is not None:
+        fields.append(f"tokens={tokens}")
+    log.info("request_id=%s %s", REQUEST_ID.get() or "-", " ".join(fields))
+
+
+def install(app: FastAPI):
+    """
+    Add GET /metrics and the request middleware: the caller's X-Request-ID
+    (or a new one) is kept for observe_stages(), echoed in the response,
+    and logged with the request's time, which is observed in
+    ov_http_request_seconds.
+    """
+    @app.middleware("http")
+    async def _timing(request: Request, call_next):
+        rid = request.headers.get("x-request-id") or uuid.uuid4().hex
+        token = REQUEST_ID.set(rid)
+        t0 = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+        finally:
+            REQUEST_ID.reset(token)
+            route = request.scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            elapsed = time.perf_counter() - t0
+            REQUEST_SECONDS.labels(request.method, path, str(status)).observe(elapsed)
+        if path != "/metrics":
+            log.info("request_id=%s %s %s %s %.1fms", rid, request.method, path, status,
+                     elapsed * 1000)
+        response.headers["X-Request-ID"] = rid
+        return response
+
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
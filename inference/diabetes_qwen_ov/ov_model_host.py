@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+"""
+Multi-model OpenVINO inference host.
+
+One process serves several specialty models (same request/response shape
+as ov_diabetes_service.py) at:
+
+    POST /models/{name}/generate
+    POST /models/{name}/generate/stream
+
+    uvicorn ov_model_host:app --host 0.0.0.0 --port 8090
+
+Models come from MODELS_CONFIG: a JSON file path, or inline JSON, mapping
+name -> spec:
+
+    {
+      "diabetes":     {"ov_dir": "/models/diabetes_qwen_ov",
+                       "tokenizer_dir": "/models/qwen_base"},
+      "hypertension": {"ov_dir": "/models/hypertension_qwen_ov",
+                       "tokenizer_dir": "/models/qwen_base",
+                       "variant": "int8", "memory_mb": 2048}
+    }
+
+Optional spec keys: tokenizer_dir (default ov_dir), variant or model_xml, memory_mb
+(budget charge; default = size of the weights .bin), answer_suffix,
+max_new_tokens. Without MODELS_CONFIG the four specialties are expected
+under MODEL_ROOT as <name>_qwen_ov.
+
+- Tokenizer and config are loaded once per tokenizer_dir, so fine-tunes of
+  the same base share them.
+- Weights are memory-mapped (ENABLE_MMAP) and a model is only read and
+  compiled on its first request.
+- MODEL_MEMORY_MB bounds the weights of compiled models; loading one past
+  the budget unloads the least-recently-used idle model first.
+
+Orchestrator tools that post to "<url>/generate" reach a hosted model by
+pointing their URL at it, e.g. DIABETES_OV_URL=http://<host>:8090/models/diabetes.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from openvino import Core
+from transformers import AutoTokenizer, AutoConfig
+
+from ov_engine import OVCausalLM, StopCriteria, add_logits_window, clean_completion
+from ov_metrics import install, observe_stages
+from ov_prefix_cache import PrefixCache
+from ov_scheduler import BatcherPool
+
+log = logging.getLogger("uvicorn")
+
+# -------------------------------------------------------------------
+# Config
+# -------------------------------------------------------------------
+MODELS_CONFIG = os.getenv("MODELS_CONFIG")
+MODEL_ROOT = Path(os.getenv("MODEL_ROOT", "/home/agenticai/models"))
+DEFAULT_MODELS = ("diabetes", "hypertension", "lipids", "kidney")
+# Default weight variant (fp16 | int8 | int4, see compress_ov_weights.py);
+# a spec's "variant" or "model_xml" overrides it per model
+OV_MODEL_VARIANT = os.getenv("OV_MODEL_VARIANT", "fp16").lower()
+MODEL_XML = os.getenv("MODEL_XML", f"model_{OV_MODEL_VARIANT}.xml")
+# Budget for compiled model weights (0 = unlimited)
+MODEL_MEMORY_MB = float(os.getenv("MODEL_MEMORY_MB", "0"))
+# Persistent compiled-model cache (empty disables): lazy loads import the
+# blob instead of compiling
+CACHE_DIR = os.getenv("CACHE_DIR", "")
+# Map weight files instead of reading them into memory
+ENABLE_MMAP = os.getenv("ENABLE_MMAP", "1").lower() not in ("0", "false", "no")
+# Per-model settings, same meaning as in ov_diabetes_service.py
+MAX_NEW_TOKENS_DEFAULT = int(os.getenv("MAX_NEW_TOKENS", "64"))
+KV_CACHE = os.getenv("KV_CACHE", "1").lower() not in ("0", "false", "no")
+LOGITS_LAST_ONLY = os.getenv("LOGITS_LAST_ONLY", "1").lower() not in ("0", "false", "no")
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "8"))
+MAX_WAIT_MS = float(os.getenv("MAX_WAIT_MS", "10"))
+PREFIX_CACHE_MB = float(os.getenv("PREFIX_CACHE_MB", "256"))
+PREFIX_CACHE_MARKERS = os.getenv("PREFIX_CACHE_MARKERS", "Patient request:").split("|")
+STOP_NGRAM = int(os.getenv("STOP_NGRAM", "12"))
+STOP_NGRAM_REPEATS = int(os.getenv("STOP_NGRAM_REPEATS", "3"))
+STOP_MAX_SENTENCES = int(os.getenv("STOP_MAX_SENTENCES", "6"))
+STOP_ON_REPEATED_SENTENCE = os.getenv("STOP_ON_REPEATED_SENTENCE", "1").lower() not in ("0", "false", "no")
+
+ANSWER_SUFFIX = (
+    "\n\nAnswer in 4–6 concise bullet points. "
+    "Avoid repeating the same phrase multiple times."
+)
+
+
+def load_model_specs() -> Dict[str, dict]:
+    if not MODELS_CONFIG:
+        return {name: {"ov_dir": str(MODEL_ROOT / f"{name}_qwen_ov")} for name in DEFAULT_MODELS}
+    text = MODELS_CONFIG
+    if not text.lstrip().startswith("{"):
+        text = Path(MODELS_CONFIG).read_text()
+    return json.loads(text)
+
+
+# -------------------------------------------------------------------
+# Hosted models
+# -------------------------------------------------------------------
+class HostedModel:
+    """One named model: spec, plus its runtime objects while loaded."""
+
+    def __init__(self, name: str, spec: dict):
+        self.name = name
+        self.ov_dir = Path(spec["ov_dir"])
+        self.tokenizer_dir = Path(spec.get("tokenizer_dir", spec["ov_dir"]))
+        self.model_xml = spec.get("model_xml") or (
+            f"model_{spec['variant']}.xml" if "variant" in spec else MODEL_XML
+        )
+        self.memory_mb = spec.get("memory_mb")
+        self.answer_suffix = spec.get("answer_suffix", ANSWER_SUFFIX)
+        self.max_new_tokens = int(spec.get("max_new_tokens", MAX_NEW_TOKENS_DEFAULT))
+
+        self.tokenizer = None
+        self.lm: Optional[OVCausalLM] = None
+        self.batcher: Optional[BatcherPool] = None
+        self.prefix_cache: Optional[PrefixCache] = None
+        self.bytes = 0
+
+        self.active = 0  # requests holding the model (never evicted while > 0)
+        self.last_used = 0.0
+        self.stats = {"requests": 0, "loads": 0, "evictions": 0, "load_s": 0.0}
+
+    @property
+    def loaded(self) -> bool:
+        return self.lm is not None
+
+    def weights_bytes(self) -> int:
+        if self.memory_mb is not None:
+            return int(float(self.memory_mb) * 1024 * 1024)
+        weights = (self.ov_dir / self.model_xml).with_suffix(".bin")
+        return weights.stat().st_size if weights.exists() else 0
+
+    def unload(self):
+        if self.batcher is not None:
+            self.batcher.close()
+        self.lm = self.batcher = self.prefix_cache = None
+        self.bytes = 0
+
+    # ---------------------------------------------------------------
+    # Request helpers
+    # ---------------------------------------------------------------
+    def encode_prompt(self, prompt: str) -> list:
+        return self.tokenizer.encode(prompt + self.answer_suffix)
+
+    def prefix_length(self, prompt: str, input_ids: list) -> int:
+        if self.prefix_cache is None:
+            return 0
+        return self.prefix_cache.match(prompt, input_ids, self.tokenizer.encode)
+
+    def make_stopper(self, stop: Optional[List[str]] = None,
+                     stop_after: Optional[List[str]] = None) -> StopCriteria:
+        return StopCriteria(
+            self.tokenizer,
+            stop=stop or (),
+            stop_after=stop_after or (),
+            ngram=STOP_NGRAM,
+            max_ngram_repeats=STOP_NGRAM_REPEATS,
+            max_sentences=STOP_MAX_SENTENCES,
+            stop_on_repeated_sentence=STOP_ON_REPEATED_SENTENCE,
+        )
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats,
+            "model_xml": self.model_xml,
+            "loaded": self.loaded,
+            "active": self.active,
+            "bytes": self.bytes,
+            "idle_s": round(time.monotonic() - self.last_used, 1) if self.last_used else None,
+            "batching": self.batcher.snapshot() if self.batcher else None,
+            "prefix_cache": self.prefix_cache.snapshot() if self.prefix_cache else None,
+        }
+
+
+class ModelHost:
+    """
+    Lazily compiles models on first use and keeps the compiled weights
+    under `memory_budget` bytes by unloading least-recently-used idle models.
+    """
+
+    def __init__(self, specs: Dict[str, dict], memory_budget: int = 0):
+        self.models = {name: HostedModel(name, spec) for name, spec in specs.items()}
+        self.memory_budget = memory_budget
+
+        self.core = Core()
+        self.core.set_property("CPU", {"INFERENCE_PRECISION_HINT": "bf16"})
+        self.core.set_property({"ENABLE_MMAP": ENABLE_MMAP})
+        if CACHE_DIR:
+            self.core.set_property({"CACHE_DIR": CACHE_DIR})
+
+        # tokenizer_dir -> (tokenizer, config), shared by models of one base
+        self._tokenizers: Dict[str, tuple] = {}
+        # One load at a time, so eviction decisions see a consistent picture
+        self._load_lock = asyncio.Lock()
+        self.stats = {"loads": 0, "evictions": 0}
+
+    @property
+    def used_bytes(self) -> int:
+        return sum(m.bytes for m in self.models.values())
+
+    async def load(self, name: str) -> "HostedModel":
+        """Load model `name` if it is not loaded yet."""
+        model = self.models[name]
+        model.last_used = time.monotonic()
+        if not model.loaded:
+            async with self._load_lock:
+                if not model.loaded:
+                    self._make_room(model)
+                    loop = asyncio.get_running_loop()
+                    await loop.run_in_executor(None, self._load, model)
+        return model
+
+    @asynccontextmanager
+    async def use(self, name: str):
+        """Hold model `name` (loading it if needed) for one request."""
+        model = self.models[name]
+        model.active += 1
+        model.last_used = time.monotonic()
+        try:
+            await self.load(name)
+            model.stats["requests"] += 1
+            yield model
+        finally:
+            model.active -= 1
+            model.last_used = time.monotonic()
+
+    def _make_room(self, model: HostedModel):
+        if self.memory_budget <= 0:
+            return
+        need = model.weights_bytes()
+        while self.used_bytes + need > self.memory_budget:
+            idle = [m for m in self.models.values()
+                    if m.loaded and m is not model and m.active == 0]
+            if not idle:
+                log.warning("Model memory budget exceeded loading %s: all loaded models are busy",
+                            model.name)
+                return
+            victim = min(idle, key=lambda m: m.last_used)
+            log.info("Unloading model %s (least recently used)", victim.name)
+            victim.unload()
+            victim.stats["evictions"] += 1
+            self.stats["evictions"] += 1
+
+    def _tokenizer(self, path: Path) -> tuple:
+        key = str(path.resolve())
+        if key not in self._tokenizers:
+            tokenizer = AutoTokenizer.from_pretrained(
+                key, use_fast=True, local_files_only=True, trust_remote_code=True,
+            )
+            config = AutoConfig.from_pretrained(
+                key, local_files_only=True, trust_remote_code=True,
+            )
+            self._tokenizers[key] = (tokenizer, config)
+        return self._tokenizers[key]
+
+    def _load(self, model: HostedModel):
+        t0 = time.perf_counter()
+        tokenizer, config = self._tokenizer(model.tokenizer_dir)
+        eos_id = config.eos_token_id or tokenizer.eos_token_id
+
+        ov_model = self.core.read_model(str(model.ov_dir / model.model_xml))
+        if LOGITS_LAST_ONLY:
+            ov_model = add_logits_window(ov_model)
+        compiled = self.core.compile_model(ov_model, "CPU")
+
+        model.tokenizer = tokenizer
+        model.lm = OVCausalLM(compiled, config=config, eos_id=eos_id, kv_cache=KV_CACHE)
+        model.prefix_cache = (
+            PrefixCache(int(PREFIX_CACHE_MB * 1024 * 1024), markers=PREFIX_CACHE_MARKERS)
+            if PREFIX_CACHE_MB > 0 and model.lm.kv_cache else None
+        )
+        model.batcher = BatcherPool(
+            model.lm, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS,
+            prefix_cache=model.prefix_cache,
+        )
+        model.bytes = model.weights_bytes()
+
+        elapsed = time.perf_counter() - t0
+        model.stats["loads"] += 1
+        model.stats["load_s"] = round(elapsed, 2)
+        self.stats["loads"] += 1
+        log.info("Loaded model %s from %s in %.2fs", model.name, model.ov_dir, elapsed)
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats,
+            "used_bytes": self.used_bytes,
+            "memory_budget": self.memory_budget,
+            "shared_tokenizers": len(self._tokenizers),
+            "models": {name: m.snapshot() for name, m in self.models.items()},
+        }
+
+
+host = ModelHost(load_model_specs(), memory_budget=int(MODEL_MEMORY_MB * 1024 * 1024))
+print("🔹 Hosting models:", ", ".join(host.models))
+
+
+# -------------------------------------------------------------------
+# Schemas
+# -------------------------------------------------------------------
+class GenerateRequest(BaseModel):
+    prompt: str
+    max_new_tokens: Optional[int] = None
+    stop: Optional[List[str]] = None
+    stop_after: Optional[List[str]] = None
+
+
+class GenerateResponse(BaseModel):
+    model: str
+    prompt: str
+    completion: str
+    num_tokens: int
+    stop_reason: Optional[str] = None
+
+
+# -------------------------------------------------------------------
+# FastAPI app
+# -------------------------------------------------------------------
+app = FastAPI(title="OpenVINO Multi-Model Host")
+install(app)
+
+
+async def _ready(name: str):
+    """404 for an unknown model, 503 if it fails to load: before any response starts."""
+    if name not in host.models:
+        raise HTTPException(status_code=404, detail=f"Unknown model: {name}")
+    try:
+        await host.load(name)
+    except Exception as e:
+        log.exception("Loading model %s failed", name)
+        raise HTTPException(status_code=503, detail=f"Model {name} could not be loaded: {e}")
+
+
+@app.get("/")
+def root():
+    return {"status": "ok", "models": list(host.models)}
+
+
+@app.get("/models")
+def models():
+    return {name: {"loaded": m.loaded, "active": m.active, "bytes": m.bytes}
+            for name, m in host.models.items()}
+
+
+@app.get("/stats")
+def stats():
+    return host.snapshot()
+
+
+@app.post("/models/{name}/generate", response_model=GenerateResponse)
+async def generate(name: str, req: GenerateRequest):
+    await _ready(name)
+    async with host.use(name) as model:
+        max_new = req.max_new_tokens or model.max_new_tokens
+        t0 = time.perf_counter()
+        input_ids = model.encode_prompt(req.prompt)
+        timings = {"tokenize": time.perf_counter() - t0}
+        stopper = model.make_stopper(req.stop, req.stop_after)
+        await model.batcher.submit(
+            input_ids, max_new_tokens=max_new,
+            prefix_len=model.prefix_length(req.prompt, input_ids), stopper=stopper,
+            timings=timings,
+        )
+        t0 = time.perf_counter()
+        completion = clean_completion(stopper.finish().strip())
+        num_tokens = len(model.tokenizer.encode(completion))
+        timings.update(detokenize=stopper.detok.seconds, postprocess=time.perf_counter() - t0)
+        observe_stages(timings, tokens=len(stopper.detok.ids))
+
+    return GenerateResponse(
+        model=name,
+        prompt=req.prompt,
+        completion=completion,
+        num_tokens=num_tokens,
+        stop_reason=stopper.reason,
+    )
+
+
+@app.post("/models/{name}/generate/stream")
+async def generate_stream(name: str, req: GenerateRequest):
+    """NDJSON stream, same events as ov_diabetes_service.py /generate/stream."""
+    # Load now: once the stream starts, the 200 headers are already sent
+    await _ready(name)
+
+    async def events():
+        async with host.use(name) as model:
+            max_new = req.max_new_tokens or model.max_new_tokens
+            t0 = time.perf_counter()
+            input_ids = model.encode_prompt(req.prompt)
+            timings = {"tokenize": time.perf_counter() - t0}
+            prefix_len = model.prefix_length(req.prompt, input_ids)
+            stopper = model.make_stopper(req.stop, req.stop_after)
+
+            sent = 0
+            async for _ in model.batcher.stream(input_ids, max_new_tokens=max_new,
+                                                prefix_len=prefix_len, stopper=stopper,
+                                                timings=timings):
+                safe = stopper.safe_len  # read before text: text only grows past it
+                if safe > sent:
+                    yield json.dumps({"text": stopper.text[sent:safe]}) + "\n"
+                    sent = safe
+            text = stopper.finish()
+            if len(text) > sent:
+                yield json.dumps({"text": text[sent:]}) + "\n"
+
+            t0 = time.perf_counter()
+            completion = clean_completion(text.strip())
+            num_tokens = len(model.tokenizer.encode(completion))
+            timings.update(detokenize=stopper.detok.seconds,
+                           postprocess=time.perf_counter() - t0)
+            observe_stages(timings, tokens=len(stopper.detok.ids))
+            yield json.dumps({
+                "done": True,
+                "completion": completion,
+                "num_tokens": num_tokens,
+                "stop_reason": stopper.reason,
+            }) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Shared-prefix KV cache.
+
+The Orchestrator prompts all start with a large constant SYSTEM_PROMPT
+followed by "Patient request:". We keep the tokenized prefix and the
+past key/values computed for it, so a request with a known prefix only
+pays prefill for the patient-specific suffix.
+
+Memory is bounded (LRU by bytes of KV state); one cache per model.
+"""
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class PrefixCache:
+    def __init__(self, max_bytes: int, markers: Sequence[str] = ("Patient request:",)):
+        self.max_bytes = max_bytes
+        self.markers = [m for m in markers if m]
+        self._lock = threading.Lock()
+        # prefix token ids -> per-layer past (batch 1)
+        self._kv: "OrderedDict[Tuple[int, ...], List[np.ndarray]]" = OrderedDict()
+        # prefix text -> prefix token ids (tokenize each distinct prefix once)
+        self._ids: "OrderedDict[str, Tuple[int, ...]]" = OrderedDict()
+        self.bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "tokens_saved": 0}
+
+    # ---------------------------------------------------------------
+    # Prefix detection (event loop side)
+    # ---------------------------------------------------------------
+    def match(self, prompt: str, input_ids: Sequence[int],
+              encode: Callable[[str], List[int]]) -> int:
+        """
+        Return how many leading `input_ids` form the cacheable prefix (0 = none).
+
+        The prefix is the prompt text before the first marker; it only counts
+        if tokenizing it alone gives exactly the leading ids of the full prompt.
+        """
+        cut = -1
+        for marker in self.markers:
+            idx = prompt.find(marker)
+            if idx > 0 and (cut < 0 or idx < cut):
+                cut = idx
+        if cut <= 0:
+            return 0
+
+        text = prompt[:cut]
+        with self._lock:
+            prefix_ids = self._ids.get(text)
+            if prefix_ids is not None:
+                self._ids.move_to_end(text)
+        if prefix_ids is None:
+            prefix_ids = tuple(encode(text))
+            with self._lock:
+                self._ids[text] = prefix_ids
+                while len(self._ids) > 64:
+                    self._ids.popitem(last=False)
+
+        n = len(prefix_ids)
+        if n == 0 or n >= len(input_ids) or tuple(input_ids[:n]) != prefix_ids:
+            return 0
+        return n
+
+    # ---------------------------------------------------------------
+    # KV storage (scheduler thread side)
+    # ---------------------------------------------------------------
+    def get(self, prefix_ids: Tuple[int, ...]) -> Optional[List[np.ndarray]]:
+        with self._lock:
+            past = self._kv.get(prefix_ids)
+            if past is None:
+                self.stats["misses"] += 1
+                return None
+            self._kv.move_to_end(prefix_ids)
+            self.stats["hits"] += 1
+            self.stats["tokens_saved"] += len(prefix_ids)
+            return past
+
+    def put(self, prefix_ids: Tuple[int, ...], past: List[np.ndarray]):
+        size = sum(a.nbytes for a in past)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if prefix_ids in self._kv:
+                return
+            self._kv[prefix_ids] = past
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, old = self._kv.popitem(last=False)
+                self.bytes -= sum(a.nbytes for a in old)
+                self.stats["evictions"] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+                "entries": len(self._kv),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+            }
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Generation result cache.
+
+Decoding is greedy, so a (model, prompt, max_new_tokens, decoding params)
+tuple always produces the same reply. Replies are kept in an in-memory LRU
+and, optionally, a SQLite file that survives restarts.
+
+The model id in every key is a fingerprint of the model files (name, size,
+mtime), so replacing the weights or switching variant never serves stale
+replies; disk rows of other fingerprints are dropped when the cache opens.
+
+The disk tier is pruned when it opens and every PRUNE_EVERY puts: expired
+rows go, then the oldest rows beyond max_disk_entries. Async handlers use
+aget()/aput(), which answer memory hits inline and run the SQLite reads and
+writes in a worker thread, off the event loop. SQLite has a lock of its
+own, so memory hits never wait behind a disk write or prune.
+"""
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterable, Optional, Tuple
+
+PRUNE_EVERY = 64
+
+
+def model_fingerprint(paths: Iterable[Path]) -> str:
+    h = hashlib.sha256()
+    for path in paths:
+        path = Path(path)
+        if path.exists():
+            st = path.stat()
+            h.update(f"{path.name}:{st.st_size}:{st.st_mtime_ns};".encode())
+        else:
+            h.update(f"{path.name}:missing;".encode())
+    return h.hexdigest()[:16]
+
+
+class ResultCache:
+    def __init__(self, model_id: str, max_entries: int = 1024, ttl_s: float = 0.0,
+                 db_path: Optional[str] = None, max_disk_entries: int = 100_000):
+        self.model_id = model_id
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()     # _mem and stats
+        self._db_lock = threading.Lock()  # _db and _puts
+        # key -> (created, value)
+        self._mem: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+        self._puts = 0
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "expired": 0,
+                      "evictions": 0, "stale_dropped": 0, "disk_pruned": 0}
+
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path:
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, model_id TEXT, created REAL, value TEXT)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS results_created ON results (created)")
+            cur = self._db.execute("DELETE FROM results WHERE model_id != ?", (model_id,))
+            self.stats["stale_dropped"] = cur.rowcount
+            self._prune()
+            self._db.commit()
+
+    def make_key(self, prompt: str, max_new_tokens: int, params: dict) -> str:
+        payload = json.dumps(
+            [self.model_id, prompt, max_new_tokens, params], sort_keys=True, ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl_s > 0 and time.time() - created > self.ttl_s
+
+    def get(self, key: str) -> Optional[dict]:
+        value = self._get_mem(key)
+        if value is None and self._db is not None:
+            value = self._get_disk(key)
+        return self._counted(value)
+
+    async def aget(self, key: str) -> Optional[dict]:
+        value = self._get_mem(key)
+        if value is None and self._db is not None:
+            value = await asyncio.to_thread(self._get_disk, key)
+        return self._counted(value)
+
+    def put(self, key: str, value: dict):
+        created = time.time()
+        with self._lock:
+            self._remember(key, created, value)
+        if self._db is not None:
+            self._put_disk(key, created, value)
+
+    async def aput(self, key: str, value: dict):
+        created = time.time()
+        with self._lock:
+            self._remember(key, created, value)
+        if self._db is not None:
+            await asyncio.to_thread(self._put_disk, key, created, value)
+
+    def _counted(self, value: Optional[dict]) -> Optional[dict]:
+        if value is None:
+            with self._lock:
+                self.stats["misses"] += 1
+        return value
+
+    def _get_mem(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is None:
+                return None
+            if not self._expired(entry[0]):
+                self._mem.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry[1]
+            del self._mem[key]
+            self.stats["expired"] += 1
+            return None
+
+    def _get_disk(self, key: str) -> Optional[dict]:
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT created, value FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            expired = row is not None and self._expired(row[0])
+            if expired:
+                self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+                self._db.commit()
+        if row is None:
+            return None
+        with self._lock:
+            if expired:
+                self.stats["expired"] += 1
+                return None
+            value = json.loads(row[1])
+            self._remember(key, row[0], value)
+            self.stats["hits"] += 1
+            self.stats["disk_hits"] += 1
+            return value
+
+    def _put_disk(self, key: str, created: float, value: dict):
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO results (key, model_id, created, value) "
+                "VALUES (?, ?, ?, ?)",
+                (key, self.model_id, created, json.dumps(value, ensure_ascii=False)),
+            )
+            self._puts += 1
+            if self._puts % PRUNE_EVERY == 0:
+                self._prune()
+            self._db.commit()
+
+    def _prune(self):
+        """Drop expired rows, then the oldest beyond max_disk_entries (_db_lock held)."""
+        pruned = 0
+        if self.ttl_s > 0:
+            pruned += self._db.execute(
+                "DELETE FROM results WHERE created < ?", (time.time() - self.ttl_s,)
+            ).rowcount
+        if self.max_disk_entries > 0:
+            pruned += self._db.execute(
+                "DELETE FROM results WHERE created <= (SELECT created FROM results "
+                "ORDER BY created DESC LIMIT 1 OFFSET ?)", (self.max_disk_entries,)
+            ).rowcount
+        with self._lock:
+            self.stats["disk_pruned"] += pruned
+
+    def _remember(self, key: str, created: float, value: dict):
+        self._mem[key] = (created, value)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def snapshot(self) -> dict:
+        disk_entries = None
+        if self._db is not None:
+            with self._db_lock:
+                disk_entries = self._db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+                "entries": len(self._mem),
+                "max_entries": self.max_entries,
+                "disk_entries": disk_entries,
+                "max_disk_entries": self.max_disk_entries if self._db is not None else None,
+                "ttl_s": self.ttl_s,
+                "model_id": self.model_id,
+            }
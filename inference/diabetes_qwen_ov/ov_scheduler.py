@@ -0,0 +1,512 @@
+#!/usr/bin/env python3
+"""
+Continuous batching for OVCausalLM.
+
+Requests are queued from the event loop; a single scheduler task packs
+the in-flight ones into one left-padded batch per `compiled_model` call.
+New requests are prefilled and merged between decode steps, finished ones
+leave the batch immediately, so short replies never wait on long ones.
+"""
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, List, Optional
+
+import numpy as np
+
+from ov_engine import OVCausalLM, StopCriteria, speculative_generate
+from ov_metrics import BATCH_ROWS, DECODE_STEP_SECONDS, TOKENS
+from ov_prefix_cache import PrefixCache
+
+log = logging.getLogger("uvicorn")
+
+# Spare attention-mask columns kept after the current length; decode steps
+# only extend a view until the headroom is used up
+_MASK_HEADROOM = 64
+
+
+class GenerationJob:
+    """One /generate request while it is queued or in the running batch."""
+
+    def __init__(self, input_ids: List[int], max_new_tokens: int, future: asyncio.Future,
+                 stream: Optional[asyncio.Queue] = None, prefix_len: int = 0,
+                 stopper: Optional[StopCriteria] = None, timings: Optional[dict] = None):
+        self.input_ids = input_ids
+        self.max_new_tokens = max_new_tokens
+        # Leading input ids whose KV state may come from the prefix cache
+        self.prefix_len = prefix_len
+        # Stop strings / repetition checks, evaluated on every token
+        self.stopper = stopper
+        self.future = future
+        # Streaming jobs also get every token id pushed here (None = end)
+        self.stream = stream
+        # Set by the consumer when a streaming client goes away
+        self.cancelled = False
+        self.new_ids: List[int] = []
+        self.enqueued_at = time.perf_counter()
+        self.admitted_at: Optional[float] = None
+        self.first_token_at: Optional[float] = None
+        # Caller's dict, filled with queue/prefill/ttft/decode seconds on finish
+        self.timings = timings
+        self.prefill_s: Optional[float] = None
+
+    def add_token(self, token_id: int, eos_id: Optional[int]) -> bool:
+        """Record a generated token; returns True when the job is finished."""
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        self.new_ids.append(token_id)
+        self.emit(token_id)
+        if eos_id is not None and token_id == eos_id:
+            return True
+        if self.stopper is not None and self.stopper.push(token_id):
+            return True
+        return len(self.new_ids) >= self.max_new_tokens
+
+    def emit(self, item):
+        """Thread-safe push to the stream queue (no-op for plain requests)."""
+        if self.stream is not None:
+            self.future.get_loop().call_soon_threadsafe(self.stream.put_nowait, item)
+
+
+def _left_pad(arr: np.ndarray, length: int, axis: int) -> np.ndarray:
+    missing = length - arr.shape[axis]
+    if missing <= 0:
+        return arr
+    pad = [(0, 0)] * arr.ndim
+    pad[axis] = (missing, 0)
+    return np.pad(arr, pad)
+
+
+class ContinuousBatcher:
+    """
+    Scheduler that shares every forward pass between in-flight requests.
+
+    max_batch_size: upper bound on rows per `compiled_model` call
+    max_wait_ms   : when idle, how long to wait for company before prefill
+    prefix_cache  : optional shared-prefix KV cache consulted at prefill
+    """
+
+    def __init__(self, lm: OVCausalLM, max_batch_size: int = 8, max_wait_ms: float = 10.0,
+                 prefix_cache: Optional[PrefixCache] = None):
+        if max_batch_size > 1 and not lm.has_position_ids:
+            # Left padding shifts positions unless the model takes position_ids
+            log.warning("Model has no position_ids input; batching disabled")
+            max_batch_size = 1
+        self.lm = lm
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self.prefix_cache = prefix_cache if lm.kv_cache else None
+
+        self._queue: "asyncio.Queue[GenerationJob]" = None
+        self._task: Optional[asyncio.Task] = None
+        # compiled_model() is not re-entrant: all forwards go through one thread
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ov-batch")
+
+        # Running batch (row i belongs to self._jobs[i])
+        self._jobs: List[GenerationJob] = []
+        self._past: Optional[List[np.ndarray]] = None
+        self._mask: Optional[np.ndarray] = None
+        self._mask_buf: Optional[np.ndarray] = None
+
+        self.stats = {"requests": 0, "steps": 0, "batched_rows": 0, "tokens": 0}
+
+    # ---------------------------------------------------------------
+    # Public API
+    # ---------------------------------------------------------------
+    async def submit(self, input_ids: List[int], max_new_tokens: int,
+                     prefix_len: int = 0, stopper: Optional[StopCriteria] = None,
+                     timings: Optional[dict] = None) -> List[int]:
+        """Queue a prompt and wait for its generated token ids."""
+        if max_new_tokens <= 0:
+            return []
+        job = await self._enqueue(
+            input_ids, max_new_tokens, prefix_len=prefix_len, stopper=stopper, timings=timings
+        )
+        return await job.future
+
+    async def stream(self, input_ids: List[int], max_new_tokens: int,
+                     prefix_len: int = 0, stopper: Optional[StopCriteria] = None,
+                     timings: Optional[dict] = None) -> AsyncIterator[int]:
+        """Queue a prompt and yield token ids as soon as they are decoded."""
+        if max_new_tokens <= 0:
+            return
+        job = await self._enqueue(
+            input_ids, max_new_tokens, stream=asyncio.Queue(), prefix_len=prefix_len,
+            stopper=stopper, timings=timings,
+        )
+        try:
+            while True:
+                token_id = await job.stream.get()
+                if token_id is None:
+                    break
+                yield token_id
+            await job.future  # re-raise scheduler errors
+        finally:
+            # Client disconnected (or done): free the batch row at the next step
+            job.cancelled = True
+
+    async def _enqueue(self, input_ids, max_new_tokens, stream=None,
+                       prefix_len=0, stopper=None, timings=None) -> GenerationJob:
+        loop = asyncio.get_running_loop()
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = loop.create_task(self._run())
+        job = GenerationJob(
+            list(input_ids), max_new_tokens, loop.create_future(), stream, prefix_len, stopper,
+            timings,
+        )
+        self.stats["requests"] += 1
+        await self._queue.put(job)
+        return job
+
+    def load(self) -> int:
+        return len(self._jobs) + (self._queue.qsize() if self._queue else 0)
+
+    def close(self):
+        """Stop the scheduler task and release the batch (model unload)."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._executor.shutdown(wait=False)
+        self._reset_batch()
+
+    def snapshot(self) -> dict:
+        steps = self.stats["steps"] or 1
+        return {
+            **self.stats,
+            "active": len(self._jobs),
+            "queued": self._queue.qsize() if self._queue else 0,
+            "avg_batch_size": round(self.stats["batched_rows"] / steps, 2),
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+        }
+
+    # ---------------------------------------------------------------
+    # Scheduler loop
+    # ---------------------------------------------------------------
+    async def _run(self):
+        while True:
+            joiners = await self._collect_joiners()
+            try:
+                if joiners:
+                    await self._offload(self._admit, joiners)
+                if self._jobs:
+                    await self._offload(self._step)
+            except Exception as e:  # keep serving; fail only the affected jobs
+                log.exception("Batch step failed")
+                for job in self._jobs + joiners:
+                    if not job.future.done():
+                        job.future.set_exception(e)
+                        job.emit(None)
+                self._reset_batch()
+
+    async def _collect_joiners(self) -> List[GenerationJob]:
+        room = self.max_batch_size - len(self._jobs)
+        joiners: List[GenerationJob] = []
+        if room <= 0:
+            return joiners
+
+        if not self._jobs:
+            # Idle: block for the first request, then give others a short window
+            joiners.append(await self._queue.get())
+            deadline = time.perf_counter() + self.max_wait
+            while len(joiners) < room:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    joiners.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+        # Running: join whatever is already waiting, never stall the batch
+        while len(joiners) < room and not self._queue.empty():
+            joiners.append(self._queue.get_nowait())
+        return joiners
+
+    async def _offload(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    # ---------------------------------------------------------------
+    # Batch state (runs on the executor thread)
+    # ---------------------------------------------------------------
+    def _admit(self, joiners: List[GenerationJob]):
+        """Prefill new requests and merge them into the running batch."""
+        for job in joiners:
+            job.admitted_at = time.perf_counter()
+            if job.cancelled:
+                self._finish(job)
+                continue
+            if self.lm.kv_cache:
+                past, start = self._cached_prefix(job)
+                ids = np.array([job.input_ids[start:]], dtype=np.int64)
+                mask = np.ones((1, len(job.input_ids)), dtype=np.int64)
+                logits, past = self.lm.forward(ids, mask, past)
+                job.prefill_s = time.perf_counter() - job.admitted_at
+                self.stats["steps"] += 1
+                self.stats["batched_rows"] += 1
+                if job.add_token(int(logits[0, -1].argmax()), self.lm.eos_id):
+                    self._finish(job)
+                    continue
+                self._merge(job, past, mask)
+            else:
+                self._jobs.append(job)
+
+    def _cached_prefix(self, job: GenerationJob):
+        """Past KV for the job's known prefix (computing it on a miss)."""
+        if self.prefix_cache is None or not job.prefix_len:
+            return None, 0
+        key = tuple(job.input_ids[:job.prefix_len])
+        past = self.prefix_cache.get(key)
+        if past is None:
+            ids = np.array([key], dtype=np.int64)
+            _, past = self.lm.forward(ids, np.ones_like(ids), None)
+            self.prefix_cache.put(key, past)
+        return past, job.prefix_len
+
+    def _merge(self, job: GenerationJob, past: List[np.ndarray], mask: np.ndarray):
+        if not self._jobs:
+            self._jobs, self._past = [job], past
+            self._set_mask(mask)
+            return
+        length = max(self._mask.shape[1], mask.shape[1])
+        self._past = [
+            np.concatenate([_left_pad(a, length, 2), _left_pad(b, length, 2)], axis=0)
+            for a, b in zip(self._past, past)
+        ]
+        self._set_mask(np.concatenate(
+            [_left_pad(self._mask, length, 1), _left_pad(mask, length, 1)], axis=0
+        ))
+        self._jobs.append(job)
+
+    def _step(self):
+        """One decode step for every row in the batch."""
+        batch = len(self._jobs)
+        t0 = time.perf_counter()
+        if self.lm.kv_cache:
+            ids = np.array([[job.new_ids[-1]] for job in self._jobs], dtype=np.int64)
+            cols = self._mask.shape[1] + 1
+            if cols > self._mask_buf.shape[1]:
+                self._set_mask(self._mask)
+            self._mask = self._mask_buf[:, :cols]  # new column is already 1
+            logits, self._past = self.lm.forward(ids, self._mask, self._past)
+        else:
+            seqs = [job.input_ids + job.new_ids for job in self._jobs]
+            length = max(len(s) for s in seqs)
+            ids = np.zeros((batch, length), dtype=np.int64)
+            mask = np.zeros((batch, length), dtype=np.int64)
+            for row, seq in enumerate(seqs):
+                ids[row, length - len(seq):] = seq
+                mask[row, length - len(seq):] = 1
+            logits, _ = self.lm.forward(ids, mask)
+
+        next_ids = logits[:, -1].argmax(axis=-1)
+        DECODE_STEP_SECONDS.observe(time.perf_counter() - t0)
+        BATCH_ROWS.observe(batch)
+        self.stats["steps"] += 1
+        self.stats["batched_rows"] += batch
+
+        keep = []
+        for row, job in enumerate(self._jobs):
+            if job.cancelled or job.add_token(int(next_ids[row]), self.lm.eos_id):
+                self._finish(job)
+            else:
+                keep.append(row)
+        self._drop_rows(keep)
+
+    def _drop_rows(self, keep: List[int]):
+        if len(keep) == len(self._jobs):
+            return
+        self._jobs = [self._jobs[i] for i in keep]
+        if not self._jobs:
+            self._reset_batch()
+            return
+        if self.lm.kv_cache:
+            self._past = [p[keep] for p in self._past]
+            mask = self._mask[keep]
+            # Trim columns that are padding for every remaining row
+            start = int(mask.any(axis=0).argmax())
+            if start:
+                self._past = [p[:, :, start:] for p in self._past]
+                mask = mask[:, start:]
+            self._set_mask(mask)
+
+    def _finish(self, job: GenerationJob):
+        self.stats["tokens"] += len(job.new_ids)
+        TOKENS.inc(len(job.new_ids))
+        if job.timings is not None:
+            _fill_timings(job)
+        job.future.get_loop().call_soon_threadsafe(_resolve, job.future, job.new_ids)
+        job.emit(None)
+
+    def _set_mask(self, mask: np.ndarray):
+        """Copy `mask` into a fresh buffer of ones with spare columns."""
+        rows, cols = mask.shape
+        self._mask_buf = np.ones((rows, cols + _MASK_HEADROOM), dtype=mask.dtype)
+        self._mask_buf[:, :cols] = mask
+        self._mask = self._mask_buf[:, :cols]
+
+    def _reset_batch(self):
+        self._jobs, self._past, self._mask, self._mask_buf = [], None, None, None
+
+
+def _fill_timings(job: GenerationJob):
+    now = time.perf_counter()
+    timings = job.timings
+    if job.admitted_at is not None:
+        timings["queue"] = job.admitted_at - job.enqueued_at
+    if job.prefill_s is not None:
+        timings["prefill"] = job.prefill_s
+    if job.first_token_at is not None:
+        timings["ttft"] = job.first_token_at - job.enqueued_at
+        timings["decode"] = now - job.first_token_at
+
+
+def _resolve(future: asyncio.Future, value):
+    if not future.done():
+        future.set_result(value)
+
+
+class BatcherPool:
+    """
+    One ContinuousBatcher lane per infer request.
+
+    With an AsyncInferQueue-backed model each lane decodes its own batch on
+    its own thread, so `lanes` inferences (one per OpenVINO stream) run at
+    once. New requests go to the least-loaded lane. lanes=1 is the plain
+    single-batcher setup.
+    """
+
+    def __init__(self, lm: OVCausalLM, lanes: int = 1, **batcher_kwargs):
+        if lanes > 1 and lm.infer_requests < lanes:
+            log.warning("compiled_model() is not re-entrant; using a single lane")
+            lanes = 1
+        self.lanes = [ContinuousBatcher(lm, **batcher_kwargs) for _ in range(max(1, lanes))]
+
+    def _pick(self) -> ContinuousBatcher:
+        return min(self.lanes, key=lambda lane: lane.load())
+
+    def load(self) -> int:
+        return sum(lane.load() for lane in self.lanes)
+
+    def close(self):
+        for lane in self.lanes:
+            lane.close()
+
+    async def submit(self, input_ids: List[int], max_new_tokens: int,
+                     prefix_len: int = 0, stopper: Optional[StopCriteria] = None,
+                     timings: Optional[dict] = None) -> List[int]:
+        return await self._pick().submit(
+            input_ids, max_new_tokens, prefix_len=prefix_len, stopper=stopper, timings=timings
+        )
+
+    async def stream(self, input_ids: List[int], max_new_tokens: int,
+                     prefix_len: int = 0, stopper: Optional[StopCriteria] = None,
+                     timings: Optional[dict] = None) -> AsyncIterator[int]:
+        async for token_id in self._pick().stream(input_ids, max_new_tokens,
+                                                  prefix_len=prefix_len, stopper=stopper,
+                                                  timings=timings):
+            yield token_id
+
+    def snapshot(self) -> dict:
+        lanes = [lane.snapshot() for lane in self.lanes]
+        total = {k: sum(l[k] for l in lanes)
+                 for k in ("requests", "steps", "batched_rows", "tokens", "active", "queued")}
+        steps = total["steps"] or 1
+        return {
+            **total,
+            "avg_batch_size": round(total["batched_rows"] / steps, 2),
+            "lanes": len(lanes),
+            "max_batch_size": self.lanes[0].max_batch_size,
+            "max_wait_ms": self.lanes[0].max_wait * 1000.0,
+        }
+
+
+class SpeculativeRunner:
+    """
+    Serves requests one at a time with draft-model speculative decoding.
+
+    Same submit/stream/snapshot interface as BatcherPool; speculation trades
+    batch throughput for single-request latency, so requests are serialized.
+    """
+
+    def __init__(self, lm: OVCausalLM, draft: OVCausalLM, k: int = 4):
+        self.lm = lm
+        self.draft = draft
+        self.k = k
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ov-spec")
+        self.stats = {"requests": 0}
+
+    def _generate(self, input_ids, max_new_tokens, stopper=None, on_token=None,
+                  timings=None) -> List[int]:
+        t0 = time.perf_counter()
+        first = []
+
+        def check(token_id: int) -> bool:
+            if not first:
+                first.append(time.perf_counter())
+            if on_token is not None and on_token(token_id) is False:
+                return False
+            return not (stopper is not None and stopper.push(token_id))
+
+        ids = speculative_generate(
+            self.lm, self.draft, input_ids, max_new_tokens, k=self.k,
+            stats=self.stats, on_token=check,
+        )
+        TOKENS.inc(len(ids))
+        if timings is not None and first:
+            # Prefill here includes the first draft/verify round
+            timings.update(prefill=first[0] - t0, ttft=first[0] - t0,
+                           decode=time.perf_counter() - first[0])
+        return ids
+
+    async def submit(self, input_ids: List[int], max_new_tokens: int,
+                     prefix_len: int = 0, stopper: Optional[StopCriteria] = None,
+                     timings: Optional[dict] = None) -> List[int]:
+        self.stats["requests"] += 1
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, self._generate, list(input_ids), max_new_tokens, stopper, None,
+            timings,
+        )
+
+    async def stream(self, input_ids: List[int], max_new_tokens: int,
+                     prefix_len: int = 0, stopper: Optional[StopCriteria] = None,
+                     timings: Optional[dict] = None) -> AsyncIterator[int]:
+        self.stats["requests"] += 1
+        loop = asyncio.get_running_loop()
+        tokens: asyncio.Queue = asyncio.Queue()
+        cancelled = False
+
+        def on_token(token_id: int) -> bool:
+            loop.call_soon_threadsafe(tokens.put_nowait, token_id)
+            return not cancelled
+
+        done = loop.run_in_executor(
+            self._executor, self._generate, list(input_ids), max_new_tokens, stopper, on_token,
+            timings,
+        )
+        done.add_done_callback(lambda _: tokens.put_nowait(None))
+        try:
+            while True:
+                token_id = await tokens.get()
+                if token_id is None:
+                    break
+                yield token_id
+            await done  # re-raise decoding errors
+        finally:
+            cancelled = True
+
+    def snapshot(self) -> dict:
+        proposed = self.stats.get("proposed", 0)
+        target_forwards = self.stats.get("target_forwards", 0)
+        return {
+            **self.stats,
+            "k": self.k,
+            "acceptance_rate": round(self.stats.get("accepted", 0) / proposed, 3)
+            if proposed else 0.0,
+            "tokens_per_target_forward": round(self.stats.get("tokens", 0) / target_forwards, 2)
+            if target_forwards else 0.0,
+        }
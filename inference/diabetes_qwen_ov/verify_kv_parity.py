@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Check that KV-cache decoding and full recompute give token-identical
+greedy output on the loaded model.
+
+    python verify_kv_parity.py [--n 5] [--max-new-tokens 48]
+
+Prompts come from data/hypertension/curated/val.jsonl (user turns).
+Exits non-zero on the first mismatch.
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+# This file lives at: inference/diabetes_qwen_ov/verify_kv_parity.py
+ROOT = Path(__file__).resolve().parents[2]
+VAL_PATH = ROOT / "data/hypertension/curated/val.jsonl"
+
+
+def load_prompts(n: int, every_turn: bool = False, repeat: bool = False):
+    """
+    User prompts from VAL_PATH, shared by the bench_*/compare_* scripts.
+    Takes each record's first user turn (every user turn with every_turn)
+    and stops at n; with repeat, cycles the prompts to return exactly n.
+    """
+    prompts = []
+    with VAL_PATH.open() as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            rec = json.loads(line)
+            user = [m["content"] for m in rec["messages"] if m.get("role") == "user"]
+            prompts += user if every_turn else user[:1]
+            if len(prompts) >= n and not repeat:
+                break
+    if repeat:
+        return [prompts[i % len(prompts)] for i in range(n)]
+    return prompts[:n]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=5)
+    ap.add_argument("--max-new-tokens", type=int, default=48)
+    args = ap.parse_args()
+
+    import ov_diabetes_service as svc
+    svc.load_model()
+
+    if not svc.lm.supports_kv:
+        print("❌ Model has no past_key_values inputs; export it with past to use KV_CACHE")
+        sys.exit(1)
+
+    for i, prompt in enumerate(load_prompts(args.n)):
+        enc = svc.tokenizer(prompt + svc.ANSWER_SUFFIX, return_tensors="np")
+
+        svc.lm.kv_cache = False
+        t0 = time.perf_counter()
+        full_ids = svc.lm.generate(enc["input_ids"], enc["attention_mask"], args.max_new_tokens)
+        t_full = time.perf_counter() - t0
+
+        svc.lm.kv_cache = True
+        t0 = time.perf_counter()
+        kv_ids = svc.lm.generate(enc["input_ids"], enc["attention_mask"], args.max_new_tokens)
+        t_kv = time.perf_counter() - t0
+
+        if full_ids != kv_ids:
+            print(f"❌ prompt {i}: outputs differ\n  full: {full_ids}\n  kv:   {kv_ids}")
+            sys.exit(1)
+        print(
+            f"✅ prompt {i}: {len(kv_ids)} tokens identical "
+            f"(full {t_full:.2f}s, kv {t_kv:.2f}s)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Memoized /diet-rules responses.
+
+The resolved rules depend only on the profile's ICD set, culture and
+locale, so each distinct combination is resolved and serialized to JSON
+once. A request then only parses the profile and splices its patient_id
+into the cached bytes. Entries are kept in a bounded LRU
+(RULES_CACHE_SIZE, default 4096 combinations).
+"""
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Tuple
+
+from .rules_engine import normalize_culture, normalize_icd
+from .schemas import Profile
+
+RULES_CACHE_SIZE = int(os.getenv("RULES_CACHE_SIZE", "4096"))
+
+BundleKey = Tuple[Tuple[str, ...], str, str]
+
+
+def bundle_key(profile: Profile) -> BundleKey:
+    """(sorted distinct ICD codes, culture, locale), normalized."""
+    icds = tuple(sorted({normalize_icd(code) for code in profile.diagnoses_icd} - {""}))
+    return icds, normalize_culture(profile.culture), (profile.locale or "").strip()
+
+
+def _dumps(value) -> bytes:
+    # Same encoding as FastAPI's JSONResponse
+    return json.dumps(value, ensure_ascii=False, allow_nan=False,
+                      separators=(",", ":")).encode("utf-8")
+
+
+class BundleCache:
+    """LRU of serialized DietRules bodies, split around the patient_id."""
+
+    HEAD = b'{"version":"v1","patient_id":'
+
+    def __init__(self, resolve: Callable[[BundleKey], Dict], max_entries: int = RULES_CACHE_SIZE):
+        self.resolve = resolve
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[BundleKey, bytes]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def render(self, profile: Profile) -> Tuple[bytes, bool]:
+        """Response body for `profile`, and whether it came from the cache."""
+        key = bundle_key(profile)
+        with self._lock:
+            tail = self._entries.get(key)
+            if tail is not None:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+        hit = tail is not None
+        if not hit:
+            tail = b',"rules":' + _dumps(self.resolve(key)) + b"}"
+            with self._lock:
+                self.stats["misses"] += 1
+                self._entries[key] = tail
+                if len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.stats["evictions"] += 1
+        return self.HEAD + _dumps(profile.patient_id) + tail, hit
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {**self.stats, "entries": len(self._entries), "max_entries": self.max_entries}
@@ -1,46 +1,52 @@
-from fastapi import FastAPI, Request
-from .schemas import Profile, DietRules
+from fastapi import FastAPI, Request, Response
+from .schemas import Profile
 from pathlib import Path
+import time
 import yaml
 from .rag import query_hints
+from .metrics import RULES_CACHE, install, observe_stages
+from .bundles import BundleCache
+from .rules_engine import RulesEngine
 
 app = FastAPI(title="A1 Condition Diet Agent", version="0.1.0")
+install(app)
 
 RULES_DIR = Path(__file__).parent / "rules"
-DIAB = yaml.safe_load((RULES_DIR / "diabetes.yaml").read_text())
+# Every condition ruleset under rules/, indexed by ICD prefix (app/rules_engine.py)
+ENGINE = RulesEngine.load(RULES_DIR)
 COMMON = yaml.safe_load((RULES_DIR / "common_portions.yaml").read_text())
 
 @app.get("/health")
 def health():
-    return {"status":"ok","agent":"A1","rulesets":["diabetes"]}
+    return {"status":"ok","agent":"A1","rulesets":list(ENGINE.rulesets),
+            "engine":ENGINE.snapshot(),"bundles":BUNDLES.snapshot()}
 
-def _pick_rules(profile: Profile):
-    # naive selector: if any ICD contains E11.* → diabetes rules
-    icds = " ".join(profile.diagnoses_icd).lower()
-    if "e11" in icds:
-        return DIAB
-    return None
+def _resolve_rules(key):
+    # Everything here depends only on (ICD set, culture, locale): run once
+    # per combination by BUNDLES, never per request
+    icds, culture, _locale = key
+    merged = ENGINE.resolve(icds, culture)
+    if merged is None:
+        return {"allow":[],"limit":[],"avoid":[],"portions":{},"notes":["No matching ruleset"]}
+    # inject rag hints
+    return {
+        "allow": merged["allow"],
+        "limit": merged["limit"],
+        "avoid": merged["avoid"],
+        "portions": merged["portions"],
+        "notes": merged["notes"] + query_hints(merged["rag_keys"]),
+        "conditions": merged["conditions"],
+    }
+
+BUNDLES = BundleCache(_resolve_rules)
 
 @app.post("/diet-rules")
 async def diet_rules(req: Request):
-    data = await req.json()
-    profile = Profile(**data)
-    ruleset = _pick_rules(profile)
-    if not ruleset:
-        return {"version":"v1","patient_id":profile.patient_id,
-                "rules":{"allow":[],"limit":[],"avoid":[],"portions":{},"notes":["No matching ruleset"]}}
-    portions = ruleset.get("portions", {}).get("default", {}).copy()
-    # culture overrides
-    culture = (profile.culture or "").lower()
-    ov = ruleset.get("portions", {}).get("culture_overrides", {}).get(culture, {})
-    portions.update(ov)
-    # inject rag hints
-    hints = query_hints(["diabetes_gi","whole_grains","legumes","fruits","fats"])
-    out = {
-        "allow": ruleset.get("allow", []),
-        "limit": ruleset.get("limit", []),
-        "avoid": ruleset.get("avoid", []),
-        "portions": portions,
-        "notes": ruleset.get("notes", []) + hints
-    }
-    return DietRules(version="v1", patient_id=profile.patient_id, rules=out)
+    # Response: DietRules (version, patient_id, rules), pre-serialized
+    t0 = time.perf_counter()
+    profile = Profile.model_validate_json(await req.body())
+    t1 = time.perf_counter()
+    body, hit = BUNDLES.render(profile)
+    RULES_CACHE.labels("hit" if hit else "miss").inc()
+    observe_stages({"parse": t1 - t0, "resolve": time.perf_counter() - t1})
+    return Response(content=body, media_type="application/json")
@@ -0,0 +1,69 @@
+"""
+Prometheus metrics (GET /metrics) and X-Request-ID handling for A1.
+
+The Orchestrator sends its request ID with every pipeline call; A1 logs
+it with the stage timings and echoes it back.
+"""
+import contextvars
+import logging
+import time
+import uuid
+
+from fastapi import FastAPI, Request, Response
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+
+log = logging.getLogger("uvicorn")
+
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+
+REQUEST_SECONDS = Histogram(
+    "a1_http_request_seconds", "HTTP request time until response headers",
+    ["method", "path", "status"], buckets=BUCKETS,
+)
+STAGE_SECONDS = Histogram(
+    "a1_stage_seconds", "/diet-rules stages: parse, resolve",
+    ["stage"], buckets=BUCKETS,
+)
+RULES_CACHE = Counter("a1_rule_bundle_lookups_total", "Rule bundle cache lookups", ["outcome"])
+
+REQUEST_ID: contextvars.ContextVar[str] = contextvars.ContextVar("request_id", default="")
+
+
+def observe_stages(timings: dict):
+    for stage, seconds in timings.items():
+        STAGE_SECONDS.labels(stage).observe(seconds)
+    log.info("request_id=%s %s", REQUEST_ID.get() or "-",
+             " ".join(f"{k}_ms={v * 1000:.2f}" for k, v in timings.items()))
+
+
+def install(app: FastAPI):
+    """
+    Add GET /metrics and the request middleware: the X-Request-ID sent by
+    the Orchestrator (or a new one) is kept for observe_stages(), echoed in
+    the response, and logged with the request's time, which is observed in
+    a1_http_request_seconds.
+    """
+    @app.middleware("http")
+    async def _timing(request: Request, call_next):
+        rid = request.headers.get("x-request-id") or uuid.uuid4().hex
+        token = REQUEST_ID.set(rid)
+        t0 = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+        finally:
+            REQUEST_ID.reset(token)
+            route = request.scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            elapsed = time.perf_counter() - t0
+            REQUEST_SECONDS.labels(request.method, path, str(status)).observe(elapsed)
+        if path != "/metrics":
+            log.info("request_id=%s %s %s %s %.1fms", rid, request.method, path, status,
+                     elapsed * 1000)
+        response.headers["X-Request-ID"] = rid
+        return response
+
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
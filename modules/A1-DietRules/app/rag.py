@@ -5,6 +5,11 @@ RAG_DB = {
     "legumes": "Lentils/beans lower postprandial glucose; good fiber & protein.",
     "fruits": "Prefer low-GI fruits (berries, apple, pear); avoid juices; watch portions.",
     "fats": "Prefer unsaturated fats (olive oil, nuts); limit sat/trans fats.",
+    "sodium": "Keep sodium under ~2 g/day; limit pickles, papad, processed and restaurant foods.",
+    "dash": "DASH pattern: vegetables, fruits, legumes, low-fat dairy and whole grains daily.",
+    "fiber_lipids": "Soluble fiber (oats, barley, legumes) helps lower LDL cholesterol.",
+    "protein_ckd": "Moderate protein (~0.8 g/kg/day) unless the nephrologist advises otherwise.",
+    "potassium_ckd": "Potassium/phosphorus: follow lab-based limits; leach vegetables, skip colas.",
 }
 
 def query_hints(keys):
@@ -0,0 +1,172 @@
+"""
+Multi-condition diet rules, selected by ICD-10 prefix.
+
+Every YAML file under rules/ that declares `icd_prefixes` (or a single
+`diagnosis` code) is a condition ruleset. At load time:
+  - each prefix goes into a character trie (codes are compared upper-case
+    without dots, so "E11" matches E11, E11.9 and E11.65);
+  - each ruleset's item lists are de-duplicated and its portions resolved
+    for the default and every culture it overrides.
+A patient's codes are then matched in one walk per code, collecting every
+ruleset whose prefix lies on the path.
+
+Merging the matched rulesets (in `priority`, then name, order):
+  avoid > limit > allow   an item avoided by any ruleset is dropped from
+                          limit and allow; a limited one from allow
+                          (items compare case-insensitively)
+  portions                numeric values take the smallest (most
+                          restrictive) amount; others the first ruleset's
+  notes, rag_keys         concatenated, duplicates dropped
+Merged bundles are memoized per (rulesets, culture), so adding conditions
+adds trie nodes, not per-request work.
+
+Files without ICD codes (common_portions.yaml) are shared data, not
+conditions, and are skipped.
+"""
+import logging
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import yaml
+
+log = logging.getLogger("uvicorn")
+
+LISTS = ("allow", "limit", "avoid")
+
+
+def normalize_icd(code: str) -> str:
+    return code.strip().upper().replace(".", "")
+
+
+def normalize_culture(culture: str) -> str:
+    # "South Indian", "south_indian" and "south-indian" are the same culture
+    return "-".join((culture or "").strip().lower().replace("_", " ").split())
+
+
+def _unique(items: Iterable[str]) -> List[str]:
+    seen, out = set(), []
+    for item in items:
+        key = str(item).strip().casefold()
+        if key and key not in seen:
+            seen.add(key)
+            out.append(str(item).strip())
+    return out
+
+
+class Ruleset:
+    """One condition's rules, as loaded from rules/<name>.yaml."""
+
+    def __init__(self, name: str, data: dict):
+        self.name = name
+        prefixes = data.get("icd_prefixes") or ([data["diagnosis"]] if data.get("diagnosis") else [])
+        self.icd_prefixes = [normalize_icd(p) for p in prefixes]
+        if not all(self.icd_prefixes):
+            raise ValueError(f"rules/{name}.yaml: empty ICD prefix")
+        self.priority = int(data.get("priority", 100))
+        self.lists = {key: _unique(data.get(key) or []) for key in LISTS}
+        self.notes = _unique(data.get("notes") or [])
+        self.rag_keys = _unique(data.get("rag_keys") or [])
+
+        portions = data.get("portions") or {}
+        default = dict(portions.get("default") or {})
+        self.portions: Dict[str, dict] = {"": default}
+        for culture, override in (portions.get("culture_overrides") or {}).items():
+            self.portions[normalize_culture(culture)] = {**default, **(override or {})}
+
+    def portions_for(self, culture: str) -> dict:
+        return self.portions.get(culture, self.portions[""])
+
+
+class IcdTrie:
+    """Character trie of normalized ICD prefixes -> ruleset names."""
+
+    def __init__(self):
+        self._root: dict = {}
+
+    def insert(self, prefix: str, name: str):
+        node = self._root
+        for ch in prefix:
+            node = node.setdefault(ch, {})
+        node.setdefault(None, []).append(name)
+
+    def match(self, code: str) -> List[str]:
+        """Every ruleset with a prefix of `code` (normalized)."""
+        found, node = [], self._root
+        for ch in code:
+            node = node.get(ch)
+            if node is None:
+                break
+            found.extend(node.get(None, ()))
+        return found
+
+
+class RulesEngine:
+    def __init__(self, rulesets: Iterable[Ruleset]):
+        self.rulesets = {r.name: r for r in sorted(rulesets, key=lambda r: (r.priority, r.name))}
+        self._order = {name: i for i, name in enumerate(self.rulesets)}
+        self.trie = IcdTrie()
+        for ruleset in self.rulesets.values():
+            for prefix in ruleset.icd_prefixes:
+                self.trie.insert(prefix, ruleset.name)
+        self._merged = lru_cache(maxsize=1024)(self._merge)
+        # Single-condition bundles up front; combinations on first use
+        for ruleset in self.rulesets.values():
+            for culture in ruleset.portions:
+                self._merged((ruleset.name,), culture)
+
+    @classmethod
+    def load(cls, rules_dir: Path) -> "RulesEngine":
+        rulesets = []
+        for path in sorted(Path(rules_dir).glob("*.y*ml")):
+            data = yaml.safe_load(path.read_text(encoding="utf-8")) or {}
+            if not (data.get("icd_prefixes") or data.get("diagnosis")):
+                log.info(f"A1 rules: {path.name} has no ICD codes, not a condition ruleset")
+                continue
+            rulesets.append(Ruleset(path.stem, data))
+        return cls(rulesets)
+
+    def match(self, codes: Iterable[str]) -> Tuple[str, ...]:
+        """Names of all rulesets matching any of `codes`, in merge order."""
+        names = set()
+        for code in codes:
+            names.update(self.trie.match(normalize_icd(code)))
+        return tuple(sorted(names, key=self._order.__getitem__))
+
+    def resolve(self, codes: Iterable[str], culture: str = "") -> Optional[dict]:
+        """Merged rules for a patient, or None if no ruleset matches."""
+        names = self.match(codes)
+        if not names:
+            return None
+        return self._merged(names, normalize_culture(culture))
+
+    def _merge(self, names: Tuple[str, ...], culture: str) -> dict:
+        rulesets = [self.rulesets[name] for name in names]
+        lists = {key: _unique(item for r in rulesets for item in r.lists[key]) for key in LISTS}
+        # Precedence: avoid > limit > allow
+        taken = {item.casefold() for item in lists["avoid"]}
+        lists["limit"] = [item for item in lists["limit"] if item.casefold() not in taken]
+        taken.update(item.casefold() for item in lists["limit"])
+        lists["allow"] = [item for item in lists["allow"] if item.casefold() not in taken]
+
+        portions: dict = {}
+        for ruleset in rulesets:
+            for key, value in ruleset.portions_for(culture).items():
+                current = portions.get(key)
+                if key not in portions:
+                    portions[key] = value
+                elif isinstance(value, (int, float)) and isinstance(current, (int, float)):
+                    portions[key] = min(current, value)
+
+        return {
+            **lists,
+            "portions": portions,
+            "notes": _unique(note for r in rulesets for note in r.notes),
+            "rag_keys": _unique(key for r in rulesets for key in r.rag_keys),
+            "conditions": list(names),
+        }
+
+    def snapshot(self) -> dict:
+        info = self._merged.cache_info()
+        return {"rulesets": {name: r.icd_prefixes for name, r in self.rulesets.items()},
+                "merged_bundles": info.currsize, "merge_hits": info.hits}
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: memoized /diet-rules bundles vs per-request resolution.
+
+    cd modules/A1-DietRules && python bench_diet_rules.py [--profiles 5000] [--distinct 50]
+
+"per-request" is a copy of the handler before bundles: dict parse,
+Profile(**data), rule selection from the raw ICD codes and culture, RAG
+hints, DietRules model, JSON encode, for every profile. It calls the
+engine's unmemoized RulesEngine._merge and shares nothing with the bundled
+path (no bundle_key, _resolve_rules or merge LRU), so "same JSON" checks
+the memoized resolution, not just the patient_id splice. "bundled" is the
+current path (Profile.model_validate_json + BUNDLES.render). Profiles
+draw their (ICD set, culture, locale) from --distinct combinations, as a
+bulk re-planning run does.
+"""
+import argparse
+import json
+import random
+import time
+
+from fastapi.encoders import jsonable_encoder
+
+from app.main import BUNDLES, ENGINE, _resolve_rules
+from app.bundles import BundleCache
+from app.rag import query_hints
+from app.rules_engine import normalize_culture
+from app.schemas import DietRules, Profile
+
+ICDS = ["E11.9", "E11.65", "I10", "E78.5", "N18.3", "E66.9", "K21.9"]
+CULTURES = ["south-indian", "north-indian", "chinese", "malay", "western"]
+LOCALES = ["en-IN", "en-SG", "IN-TN", "SG"]
+
+
+def make_profiles(n: int, distinct: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    combos = [(rng.sample(ICDS, rng.randint(0, 3)), rng.choice(CULTURES), rng.choice(LOCALES))
+              for _ in range(distinct)]
+    bodies = []
+    for i in range(n):
+        icds, culture, locale = rng.choice(combos)
+        bodies.append(json.dumps({
+            "patient_id": f"p{i}", "age": rng.randint(20, 90), "sex": "female", "bmi": 27.5,
+            "diagnoses_icd": icds, "activity": "light", "culture": culture,
+            "locale": locale, "budget": 120.0,
+        }).encode())
+    return bodies
+
+
+def per_request(body: bytes) -> bytes:
+    profile = Profile(**json.loads(body))
+    names = ENGINE.match(profile.diagnoses_icd)
+    if not names:
+        rules = {"allow":[],"limit":[],"avoid":[],"portions":{},"notes":["No matching ruleset"]}
+    else:
+        merged = ENGINE._merge(names, normalize_culture(profile.culture))
+        rules = {
+            "allow": merged["allow"],
+            "limit": merged["limit"],
+            "avoid": merged["avoid"],
+            "portions": merged["portions"],
+            "notes": merged["notes"] + query_hints(merged["rag_keys"]),
+            "conditions": merged["conditions"],
+        }
+    model = DietRules(version="v1", patient_id=profile.patient_id, rules=rules)
+    return json.dumps(jsonable_encoder(model), ensure_ascii=False, allow_nan=False,
+                      separators=(",", ":")).encode("utf-8")
+
+
+def bundled(cache: BundleCache, body: bytes) -> bytes:
+    return cache.render(Profile.model_validate_json(body))[0]
+
+
+def timeit(fn, bodies) -> float:
+    t0 = time.perf_counter()
+    for body in bodies:
+        fn(body)
+    return (time.perf_counter() - t0) / len(bodies) * 1e6
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--profiles", type=int, default=5000)
+    ap.add_argument("--distinct", type=int, default=50)
+    args = ap.parse_args()
+
+    bodies = make_profiles(args.profiles, args.distinct)
+    mismatches = sum(per_request(b) != bundled(BUNDLES, b) for b in bodies[:500])
+    print(f"same JSON on 500 profiles: {'yes' if not mismatches else f'NO ({mismatches} differ)'}")
+
+    cold = BundleCache(_resolve_rules)
+    t_cold = timeit(lambda b: bundled(cold, b), bodies)
+    t_legacy = timeit(per_request, bodies)
+    t_warm = timeit(lambda b: bundled(BUNDLES, b), bodies)
+    print(f"{args.profiles} profiles, {args.distinct} distinct (ICD set, culture, locale)")
+    print(f"  per-request       {t_legacy:8.1f} µs/profile")
+    print(f"  bundled (cold)    {t_cold:8.1f} µs/profile  {cold.snapshot()}")
+    print(f"  bundled (warm)    {t_warm:8.1f} µs/profile  x{t_legacy / t_warm:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+Bulk case submission: POST /v1/cases/bulk relays an NDJSON stream of
+Profile.v1 records to the Orchestrator's /v1/cases/bulk and streams the
+per-case results back.
+
+Lines are validated as they arrive; invalid ones are answered here. Valid
+ones are forwarded in chunks of BULK_CHUNK_SIZE lines, with at most
+BULK_CHUNKS_IN_FLIGHT chunk requests open on one pooled client, so the
+next chunk is already running while the previous one drains. Each chunk
+is a complete request body: httpx sends the whole body before reading the
+response, so a single never-ending upload could deadlock against the
+Orchestrator's bounded result queue. Rejected lines are sent as blank
+lines so the Orchestrator's "line" numbers match the client's body.
+
+Memory is bounded by the chunks in flight plus one being filled; when the
+Orchestrator falls behind, the upload from the client stalls.
+
+When a chunk request fails, its cases that got no result line are answered
+with one {"lines": [first, last], "status": "failed", "cases", "error"}
+line and counted as failed in the summary.
+"""
+import asyncio
+import json
+import logging
+import time
+from typing import AsyncIterator, Optional, Set
+
+import httpx
+from pydantic import ValidationError
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from .config import BULK_CHUNK_SIZE, BULK_CHUNKS_IN_FLIGHT, ORCH_URL
+from .metrics import observe_upstream
+from .schemas import ProfileV1
+
+log = logging.getLogger("uvicorn")
+
+BULK_MAX_LINE_BYTES = 64 * 1024
+# Read timeout between result lines; a chunk's cases run concurrently
+TIMEOUT = httpx.Timeout(120.0, connect=5.0)
+
+
+async def read_lines(chunks: AsyncIterator[bytes],
+                     max_bytes: int = BULK_MAX_LINE_BYTES) -> AsyncIterator[Optional[bytes]]:
+    """Copy of the Orchestrator's read_lines() (modules/Orchestrator/app/bulk.py)."""
+    buf = b""
+    skipping = False
+    async for chunk in chunks:
+        buf += chunk
+        while True:
+            end = buf.find(b"\n")
+            if end < 0:
+                break
+            line, buf = buf[:end], buf[end + 1:]
+            if skipping or len(line) > max_bytes:
+                skipping = False
+                yield None
+            else:
+                yield line
+        if len(buf) > max_bytes:
+            buf, skipping = b"", True
+    if skipping:
+        yield None
+    elif buf.strip():
+        yield buf
+
+
+def _validation_error(e: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors()
+    )
+
+
+async def relay_bulk(chunks: AsyncIterator[bytes], headers: dict,
+                     max_line_bytes: int = BULK_MAX_LINE_BYTES) -> AsyncIterator[str]:
+    """Yield NDJSON result lines for the profile lines of `chunks`, then a summary line."""
+    out: "asyncio.Queue[Optional[str]]" = asyncio.Queue(maxsize=BULK_CHUNK_SIZE)
+    slots = asyncio.Semaphore(BULK_CHUNKS_IN_FLIGHT)
+    tasks: Set[asyncio.Task] = set()
+    counts = {"cases": 0, "done": 0, "failed": 0, "skipped": 0, "invalid": 0,
+              "chunks": 0, "chunk_errors": 0}
+    client = httpx.AsyncClient(
+        timeout=TIMEOUT, limits=httpx.Limits(max_connections=BULK_CHUNKS_IN_FLIGHT)
+    )
+    t_start = time.perf_counter()
+
+    async def send_chunk(first: int, last: int, cases: int, body: bytes):
+        t0 = time.perf_counter()
+        outcome = "ok"
+        answered = 0
+        request = client.build_request(
+            "POST", f"{ORCH_URL}/v1/cases/bulk", content=body, params={"line_offset": first - 1},
+            headers={**headers, "Content-Type": "application/x-ndjson"},
+        )
+        try:
+            r = await client.send(request, stream=True)
+            try:
+                if r.status_code >= 400:
+                    await r.aread()
+                    raise httpx.HTTPStatusError(f"Orchestrator {r.status_code}: {r.text[:200]}",
+                                                request=r.request, response=r)
+                async for line in r.aiter_lines():
+                    if not line:
+                        continue
+                    event = json.loads(line)
+                    if "summary" in event:
+                        continue
+                    if event.get("status") in counts:
+                        counts[event["status"]] += 1
+                    answered += "line" in event
+                    await out.put(line)
+            finally:
+                await r.aclose()
+        except (httpx.HTTPError, ValueError) as e:
+            outcome = "error" if isinstance(e, httpx.HTTPStatusError) else "unreachable"
+            counts["chunk_errors"] += 1
+            log.error(f"Bulk chunk lines {first}-{last} failed: {e}")
+            # Cases of this chunk without a result line were not (all) run
+            unanswered = max(cases - answered, 0)
+            counts["failed"] += unanswered
+            await out.put(json.dumps({"lines": [first, last], "status": "failed",
+                                      "cases": unanswered,
+                                      "error": f"Orchestrator chunk failed: {e}"}))
+        finally:
+            observe_upstream("/v1/cases/bulk", outcome, t0)
+            slots.release()
+
+    async def feed():
+        pending = []
+        n = 0
+
+        async def flush():
+            nonlocal pending
+            if any(pending):
+                await slots.acquire()
+                counts["chunks"] += 1
+                task = asyncio.create_task(send_chunk(
+                    n - len(pending) + 1, n, sum(1 for p in pending if p),
+                    b"\n".join(pending) + b"\n",
+                ))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            pending = []
+
+        try:
+            async for raw in read_lines(chunks, max_line_bytes):
+                n += 1
+                if raw is not None and not raw.strip():
+                    pending.append(b"")
+                    continue
+                counts["cases"] += 1
+                error = None
+                if raw is None:
+                    error = f"line longer than {max_line_bytes} bytes"
+                else:
+                    try:
+                        pending.append(ProfileV1.parse_raw(raw).json().encode())
+                    except ValidationError as e:
+                        error = _validation_error(e)
+                if error is not None:
+                    counts["invalid"] += 1
+                    pending.append(b"")
+                    await out.put(json.dumps({"line": n, "status": "invalid", "error": error}))
+                if len(pending) >= BULK_CHUNK_SIZE:
+                    await flush()
+            await flush()
+            await asyncio.gather(*tasks)
+        except Exception as e:
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await out.put(json.dumps({"status": "error", "error": f"bulk input aborted: {e!r}"}))
+        await out.put(None)
+
+    feeder = asyncio.create_task(feed())
+    try:
+        while True:
+            line = await out.get()
+            if line is None:
+                break
+            yield line + "\n"
+    finally:
+        feeder.cancel()
+        for task in list(tasks):
+            task.cancel()
+        await client.aclose()
+
+    elapsed = time.perf_counter() - t_start
+    summary = {**counts, "elapsed_s": round(elapsed, 3),
+               "cases_per_min": round(counts["cases"] * 60 / max(elapsed, 1e-9), 1)}
+    log.info(f"Bulk cases: {summary}")
+    yield json.dumps({"summary": summary}) + "\n"
+
+
+class NDJSONStream(StreamingResponse):
+    """Copy of the Orchestrator's NDJSONStream (modules/Orchestrator/app/bulk.py)."""
+    media_type = "application/x-ndjson"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
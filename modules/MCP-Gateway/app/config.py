@@ -3,3 +3,7 @@ import os
 ORCH_URL = os.getenv("ORCH_URL", "http://127.0.0.1:8081")  # orchestrator stub
 API_KEY = os.getenv("API_KEY", "dev-key")
 SERVICE_NAME = os.getenv("SERVICE_NAME", "mcp-gateway")
+
+# Bulk /v1/cases/bulk: profiles per Orchestrator request, and requests in flight
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "256"))
+BULK_CHUNKS_IN_FLIGHT = int(os.getenv("BULK_CHUNKS_IN_FLIGHT", "2"))
@@ -1,12 +1,16 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-import httpx, logging
+from fastapi.responses import JSONResponse, StreamingResponse
+import httpx, logging, time
+from typing import Dict, List, Literal
 
 from pydantic import BaseModel
 
+from .bulk import NDJSONStream, relay_bulk
 from .schemas import ProfileV1
 from .security import require_api_key
 from .config import ORCH_URL
+from .metrics import install, observe_upstream, request_headers
 from .utils import mask_phi
 
 app = FastAPI(title="MCP Gateway", version="0.1.0")
@@ -17,21 +21,38 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
     allow_credentials=True,
+    expose_headers=["X-Request-ID"],
 )
+install(app)
 
 log = logging.getLogger("uvicorn")
 log.setLevel(logging.INFO)
 
 
 # ---------- Chat models ----------
+# Mirror the Orchestrator's /chat models (modules/Orchestrator/app/main.py)
 class ChatRequest(BaseModel):
     message: str
+    # "best": best-matching specialty only; "all": every matched specialty
+    # concurrently, merged into one sectioned reply
+    mode: Literal["best", "all"] = "best"
+
+
+class ChatSection(BaseModel):
+    specialty: str
+    provider: str
+    reply: str
+    status: str  # ok | timeout | error
+    latency_ms: float
 
 
 class ChatResponse(BaseModel):
     reply: str
     provider: str
     specialized: bool
+    intents: Dict[str, float] = {}  # classifier probability, or keyword hits
+    intent_source: str = ""         # which of the two: "classifier" | "keywords"
+    sections: List[ChatSection] = []
 
 
 @app.get("/health")
@@ -46,12 +67,15 @@ async def chat(req: ChatRequest, _api=Depends(require_api_key)):
     Gateway -> Orchestrator /chat passthrough.
     """
     url = f"{ORCH_URL}/chat"
+    t0 = time.perf_counter()
     try:
         timeout = httpx.Timeout(60.0, connect=5.0)
         async with httpx.AsyncClient(timeout=timeout) as client:
-            resp = await client.post(url, json=req.dict())
+            resp = await client.post(url, json=req.dict(), headers=request_headers())
+        observe_upstream("/chat", "ok" if resp.status_code < 400 else "error", t0)
         resp.raise_for_status()
     except httpx.RequestError as e:
+        observe_upstream("/chat", "unreachable", t0)
         log.error(f"Orchestrator /chat unreachable: {e}")
         raise HTTPException(
             status_code=status.HTTP_502_BAD_GATEWAY,
@@ -62,6 +86,46 @@ async def chat(req: ChatRequest, _api=Depends(require_api_key)):
     return ChatResponse(**data)
 
 
+@app.post("/chat/stream")
+async def chat_stream(req: ChatRequest, _api=Depends(require_api_key)):
+    """
+    Gateway -> Orchestrator /chat/stream passthrough.
+    NDJSON chunks are relayed as they arrive, never buffered.
+    """
+    url = f"{ORCH_URL}/chat/stream"
+    client = httpx.AsyncClient(timeout=httpx.Timeout(60.0, connect=5.0))
+    t0 = time.perf_counter()
+    try:
+        resp = await client.send(
+            client.build_request("POST", url, json=req.dict(), headers=request_headers()),
+            stream=True,
+        )
+    except httpx.RequestError as e:
+        await client.aclose()
+        observe_upstream("/chat/stream", "unreachable", t0)
+        log.error(f"Orchestrator /chat/stream unreachable: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail="Orchestrator unreachable",
+        )
+    observe_upstream("/chat/stream", "ok" if resp.status_code < 400 else "error", t0)
+    if resp.status_code >= 400:
+        await resp.aclose()
+        await client.aclose()
+        log.error(f"Orchestrator /chat/stream error: {resp.status_code}")
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Orchestrator failed")
+
+    async def relay():
+        try:
+            async for chunk in resp.aiter_raw():
+                yield chunk
+        finally:
+            await resp.aclose()
+            await client.aclose()
+
+    return StreamingResponse(relay(), media_type="application/x-ndjson")
+
+
 # ---------- Existing profile-based pipeline ----------
 @app.post("/v1/cases", status_code=202)
 async def submit_case(profile: ProfileV1, _api=Depends(require_api_key)):
@@ -70,25 +134,56 @@ async def submit_case(profile: ProfileV1, _api=Depends(require_api_key)):
     log.info(f"Received case: {masked}")
 
     url = f"{ORCH_URL}/v1/route"
+    t0 = time.perf_counter()
     try:
         async with httpx.AsyncClient(timeout=10) as client:
-            resp = await client.post(url, json=profile.dict())
-        if resp.status_code >= 400:
-            log.error(f"Orchestrator error: {resp.text}")
-            raise HTTPException(status_code=502, detail="Orchestrator failed")
+            resp = await client.post(url, json=profile.dict(), headers=request_headers())
+        observe_upstream("/v1/route", "ok" if resp.status_code < 400 else "error", t0)
     except httpx.RequestError as e:
+        observe_upstream("/v1/route", "unreachable", t0)
         log.error(f"Orchestrator unreachable: {e}")
         raise HTTPException(status_code=502, detail="Orchestrator unreachable")
-
-    return {"status": "accepted", "schema": "Profile.v1"}
+    if resp.status_code == 503:
+        # Case queue full: let the client back off as the Orchestrator asks
+        raise HTTPException(status_code=503, detail="case queue full, retry later",
+                            headers={"Retry-After": resp.headers.get("Retry-After", "5")})
+    if resp.status_code >= 400:
+        log.error(f"Orchestrator error: {resp.text}")
+        raise HTTPException(status_code=502, detail="Orchestrator failed")
+
+    job = resp.json()
+    # Poll /v1/cases/{case_id}/plan: 202 while queued/running, 200 with the plan
+    return {"status": "accepted", "schema": "Profile.v1", "case_id": job["case_id"],
+            "case_status": job["status"], "plan_url": f"/v1/cases/{job['case_id']}/plan"}
+
+
+@app.post("/v1/cases/bulk")
+async def submit_cases_bulk(request: Request, _api=Depends(require_api_key)):
+    """
+    NDJSON Profile.v1 records in, one NDJSON result per case out as cases
+    finish (see app/bulk.py), then {"summary": ...}.
+    """
+    return NDJSONStream(relay_bulk(request.stream(), request_headers()))
 
 
 @app.get("/v1/cases/{case_id}/plan")
 async def get_plan(case_id: str, _api=Depends(require_api_key)):
+    """
+    The Orchestrator's answer as is: 202 {"case_id", "status"} while the case
+    is queued or running, 502 {"detail": {..., "status": "failed", "error"}}
+    if it failed, 200 with the plan once done.
+    """
     url = f"{ORCH_URL}/v1/cases/{case_id}/plan"
-    async with httpx.AsyncClient(timeout=10) as client:
-        r = await client.get(url)
+    t0 = time.perf_counter()
+    try:
+        async with httpx.AsyncClient(timeout=10) as client:
+            r = await client.get(url, headers=request_headers())
+    except httpx.RequestError as e:
+        observe_upstream("/v1/cases/{case_id}/plan", "unreachable", t0)
+        log.error(f"Orchestrator unreachable: {e}")
+        raise HTTPException(status_code=502, detail="Orchestrator unreachable")
+    observe_upstream("/v1/cases/{case_id}/plan", "ok" if r.status_code < 400 else "error", t0)
     if r.status_code == 404:
         raise HTTPException(status_code=404, detail="Plan not found")
-    return r.json()
+    return JSONResponse(status_code=r.status_code, content=r.json())
 
@@ -0,0 +1,73 @@
+"""
+Prometheus metrics (GET /metrics) and request IDs for the Gateway.
+
+Every request gets an X-Request-ID (the client's, or a new one) that is
+forwarded to the Orchestrator and echoed back, so a client-visible ID can
+be followed through Orchestrator, agent and model-service logs.
+"""
+import contextvars
+import logging
+import time
+import uuid
+from typing import Dict
+
+from fastapi import FastAPI, Request, Response
+from prometheus_client import CONTENT_TYPE_LATEST, Histogram, generate_latest
+
+log = logging.getLogger("uvicorn")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+REQUEST_SECONDS = Histogram(
+    "gateway_http_request_seconds", "HTTP request time until response headers",
+    ["method", "path", "status"], buckets=LATENCY_BUCKETS,
+)
+UPSTREAM_SECONDS = Histogram(
+    "gateway_upstream_seconds", "Gateway -> Orchestrator hop until response headers",
+    ["path", "outcome"], buckets=LATENCY_BUCKETS,
+)
+
+REQUEST_ID: contextvars.ContextVar[str] = contextvars.ContextVar("request_id", default="")
+
+
+def request_headers() -> Dict[str, str]:
+    """X-Request-ID header for an outgoing call, if a request is in progress."""
+    rid = REQUEST_ID.get()
+    return {"X-Request-ID": rid} if rid else {}
+
+
+def observe_upstream(path: str, outcome: str, t0: float):
+    UPSTREAM_SECONDS.labels(path, outcome).observe(time.perf_counter() - t0)
+
+
+def install(app: FastAPI):
+    """
+    Add GET /metrics and the request middleware: the client's X-Request-ID
+    (or a new one) is kept for request_headers() to forward to the
+    Orchestrator, echoed in the response, and logged with the request's
+    time, which is observed in gateway_http_request_seconds.
+    """
+    @app.middleware("http")
+    async def _timing(request: Request, call_next):
+        rid = request.headers.get("x-request-id") or uuid.uuid4().hex
+        token = REQUEST_ID.set(rid)
+        t0 = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+        finally:
+            REQUEST_ID.reset(token)
+            route = request.scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            elapsed = time.perf_counter() - t0
+            REQUEST_SECONDS.labels(request.method, path, str(status)).observe(elapsed)
+        if path != "/metrics":
+            log.info("request_id=%s %s %s %s %.1fms", rid, request.method, path, status,
+                     elapsed * 1000)
+        response.headers["X-Request-ID"] = rid
+        return response
+
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,209 @@
+# app/bulk.py
+"""
+Bulk case runs: POST /v1/cases/bulk takes an NDJSON stream of profiles and
+streams one result line per case back while the body is still arriving.
+
+Memory stays bounded however large the upload is:
+  - the body is read line by line, and a line is only read once the
+    stream has a free slot in its window (BULK_WINDOW cases between
+    "line read" and "result sent"), so a fast uploader is slowed to the
+    pipeline's pace by TCP backpressure;
+  - results wait in a bounded queue, so a client that stops reading the
+    response stops the upload too.
+BULK_CONCURRENCY caps pipeline runs across all bulk streams of this
+replica, so concurrent nightly jobs cannot overload A1–A5 between them.
+A run holds up to four "agents" connections at once (A1–A4), so keep
+4 x BULK_CONCURRENCY within AGENTS_MAX_CONNECTIONS (app/clients.py):
+time spent waiting for a pooled connection counts against the stage
+timeout and would trip the agents' breakers.
+
+Result lines (completion order; "line" is the 1-based line number in the
+body, shifted by ?line_offset=):
+  {"line", "case_id", "status": "done", "ms", "plan"}
+  {"line", "case_id", "status": "failed", "ms", "error"}
+  {"line", "case_id", "status": "skipped", "error"}  case already queued/running
+  {"line", "status": "invalid", "error"}     not a valid Profile
+  {"status": "error", "error"}               body read aborted
+and a final {"summary": {...}} with counts and throughput. Cases are stored
+like queued ones ("running", then "done"/"failed"), so /v1/cases/{case_id}/plan
+serves them and /v1/route does not enqueue a case a bulk run is working on.
+Like JobQueue.submit(), a bulk run never runs a case that is already queued
+or running; it answers "skipped" instead of overwriting that job's record.
+Store reads and writes run on the PlanStore's thread (app/jobs.py), so
+disk I/O overlaps with the pipeline runs instead of blocking the loop.
+
+read_lines() and NDJSONStream are also used by the Gateway, which keeps a
+copy of both (it is built from its own directory); change them together.
+"""
+import asyncio
+import os
+import time
+from typing import AsyncIterator, Awaitable, Callable, Optional, Set
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from starlette.types import Receive, Scope, Send
+
+from .jobs import PlanStore
+from .schemas import Profile, Plan
+
+BULK_CONCURRENCY = int(os.getenv("BULK_CONCURRENCY", "8"))
+BULK_WINDOW = int(os.getenv("BULK_WINDOW", str(2 * BULK_CONCURRENCY)))
+BULK_MAX_LINE_BYTES = int(os.getenv("BULK_MAX_LINE_BYTES", str(64 * 1024)))
+
+# Pipeline runs in flight across every bulk stream
+_SLOTS = asyncio.Semaphore(BULK_CONCURRENCY)
+
+
+async def read_lines(chunks: AsyncIterator[bytes],
+                     max_bytes: int = BULK_MAX_LINE_BYTES) -> AsyncIterator[Optional[bytes]]:
+    """
+    Split a byte stream into lines without holding more than one line.
+    A line longer than max_bytes is skipped and yielded as None.
+    """
+    buf = b""
+    skipping = False
+    async for chunk in chunks:
+        buf += chunk
+        while True:
+            end = buf.find(b"\n")
+            if end < 0:
+                break
+            line, buf = buf[:end], buf[end + 1:]
+            if skipping or len(line) > max_bytes:
+                skipping = False
+                yield None
+            else:
+                yield line
+        if len(buf) > max_bytes:
+            buf, skipping = b"", True
+    if skipping:
+        yield None
+    elif buf.strip():
+        yield buf
+
+
+def _validation_error(e: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(p) for p in err['loc']) or 'body'}: {err['msg']}" for err in e.errors()
+    )
+
+
+async def run_bulk(chunks: AsyncIterator[bytes],
+                   run: Callable[[Profile], Awaitable[Plan]], store: PlanStore, owner: str,
+                   line_offset: int = 0, window: int = BULK_WINDOW,
+                   max_line_bytes: int = BULK_MAX_LINE_BYTES) -> AsyncIterator[dict]:
+    """Validate and run each profile line of `chunks`; yield result dicts, then the summary."""
+    results: "asyncio.Queue[Optional[dict]]" = asyncio.Queue(maxsize=window)
+    free = asyncio.Semaphore(window)
+    tasks: Set[asyncio.Task] = set()
+    counts = {"cases": 0, "done": 0, "failed": 0, "skipped": 0, "invalid": 0}
+    t_start = time.perf_counter()
+
+    async def one(n: int, profile: Profile):
+        t0 = time.perf_counter()
+        case_id = profile.patient_id
+        record = {"case_id": case_id, "status": "running", "owner": owner,
+                  "submitted": time.time(), "started": None, "finished": None,
+                  "plan": None, "error": None}
+        claimed = False
+        try:
+            async with _SLOTS:
+                # Claim the case before running, as JobQueue.submit() does
+                record["started"] = time.time()
+                current = await store.claim(record)
+                if current is not None:
+                    record.update(status="skipped", started=None,
+                                  error=f"case already {current['status']}; "
+                                        f"poll /v1/cases/{case_id}/plan")
+                else:
+                    claimed = True
+                    plan = await run(profile)
+                    record.update(status="done", plan=plan.model_dump())
+        except asyncio.CancelledError:
+            # Client went away: release the claim so /v1/route can run the case
+            if claimed:
+                record.update(status="failed", error="bulk request cancelled",
+                              finished=time.time())
+                await store.put(record)
+            raise
+        except HTTPException as e:
+            record.update(status="failed", error=f"{e.status_code}: {e.detail}")
+        except Exception as e:
+            record.update(status="failed", error=repr(e))
+        if claimed:
+            record["finished"] = time.time()
+            await store.put(record)
+
+        result = {"line": n, "case_id": case_id, "status": record["status"],
+                  "ms": round((time.perf_counter() - t0) * 1000, 1)}
+        if record["plan"] is not None:
+            result["plan"] = record["plan"]
+        else:
+            result["error"] = record["error"]
+        await results.put(result)
+        free.release()
+
+    async def feed():
+        n = line_offset
+        try:
+            async for raw in read_lines(chunks, max_line_bytes):
+                n += 1
+                if raw is not None and not raw.strip():
+                    continue
+                counts["cases"] += 1
+                if raw is None:
+                    error = f"line longer than {max_line_bytes} bytes"
+                else:
+                    try:
+                        profile = Profile.model_validate_json(raw)
+                    except ValidationError as e:
+                        error = _validation_error(e)
+                    else:
+                        # Wait for a window slot before reading further
+                        await free.acquire()
+                        task = asyncio.create_task(one(n, profile))
+                        tasks.add(task)
+                        task.add_done_callback(tasks.discard)
+                        continue
+                await results.put({"line": n, "status": "invalid", "error": error})
+            await asyncio.gather(*tasks)
+        except Exception as e:
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await results.put({"status": "error", "error": f"bulk input aborted: {e!r}"})
+        await results.put(None)
+
+    feeder = asyncio.create_task(feed())
+    try:
+        while True:
+            item = await results.get()
+            if item is None:
+                break
+            if item["status"] in counts:
+                counts[item["status"]] += 1
+            yield item
+    finally:
+        # Client went away: stop reading and cancel the runs still in flight
+        feeder.cancel()
+        for task in list(tasks):
+            task.cancel()
+
+    elapsed = time.perf_counter() - t_start
+    yield {"summary": {**counts, "elapsed_s": round(elapsed, 3),
+                       "cases_per_min": round(counts["cases"] * 60 / max(elapsed, 1e-9), 1),
+                       "concurrency": BULK_CONCURRENCY}}
+
+
+class NDJSONStream(StreamingResponse):
+    """
+    StreamingResponse that lets the endpoint keep reading the request body
+    while it streams. The base class listens for a disconnect on receive()
+    on older ASGI servers, which would swallow the remaining body chunks.
+    """
+    media_type = "application/x-ndjson"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
@@ -0,0 +1,56 @@
+# app/clients.py
+"""
+Shared, connection-pooled HTTP clients for the specialty backends.
+
+One long-lived httpx.AsyncClient per backend, opened in the app lifespan
+and closed on shutdown, so tool calls reuse keep-alive connections instead
+of opening a TCP connection per chat. Each backend gets its own pool, so a
+slow backend cannot take every connection from the others.
+
+Pool sizes: MAX_CONNECTIONS_PER_BACKEND (default 32), or per backend with
+e.g. DIABETES_MAX_CONNECTIONS=64.
+"""
+import os
+from typing import Dict
+
+import httpx
+
+BACKENDS = ("diabetes", "hypertension", "lipids", "kidney", "agents")
+
+MAX_CONNECTIONS_PER_BACKEND = int(os.getenv("MAX_CONNECTIONS_PER_BACKEND", "32"))
+MAX_KEEPALIVE_PER_BACKEND = int(os.getenv("MAX_KEEPALIVE_PER_BACKEND", "16"))
+
+# Default timeout; tools pass their own per request
+DEFAULT_TIMEOUT = httpx.Timeout(60.0, connect=5.0)
+
+_clients: Dict[str, httpx.AsyncClient] = {}
+
+
+def _limits(backend: str) -> httpx.Limits:
+    max_connections = int(
+        os.getenv(f"{backend.upper()}_MAX_CONNECTIONS", MAX_CONNECTIONS_PER_BACKEND)
+    )
+    return httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=min(MAX_KEEPALIVE_PER_BACKEND, max_connections),
+    )
+
+
+def get_client(backend: str) -> httpx.AsyncClient:
+    """Pooled client for `backend` (created on first use outside the lifespan)."""
+    client = _clients.get(backend)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(timeout=DEFAULT_TIMEOUT, limits=_limits(backend))
+        _clients[backend] = client
+    return client
+
+
+async def open_clients():
+    for backend in BACKENDS:
+        get_client(backend)
+
+
+async def close_clients():
+    for client in list(_clients.values()):
+        await client.aclose()
+    _clients.clear()
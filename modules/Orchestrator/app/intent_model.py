@@ -0,0 +1,157 @@
+# app/intent_model.py
+"""
+Hashed character n-gram intent classifier (NumPy only).
+
+Messages are lowercased, reduced to letters/digits/spaces and padded with
+spaces; every character 3-, 4- and 5-gram is hashed into DIM buckets (the
+hashing trick, so there is no vocabulary to ship). A one-vs-rest logistic
+model on top gives an independent probability per specialty, so comorbid
+messages can score high on several and "none of them" is just every
+probability being low. Callers may add a few dense features per message
+(the router passes keyword hit counts), which the model learns to weigh
+against the n-gram context.
+
+Featurizing is vectorized over a whole batch: all messages are joined into
+one byte array and each n-gram order is one rolling-hash pass over it.
+Weights live in a small .npz written by train_intent_classifier.py.
+"""
+from pathlib import Path
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+NGRAMS = (3, 4, 5)
+DIM = 1 << 15
+
+# Keep a-z, 0-9 and non-ASCII bytes; everything else becomes a space.
+# \x00 is reserved as the separator between messages in a batch.
+_KEEP = set(b"abcdefghijklmnopqrstuvwxyz0123456789") | set(range(128, 256))
+_TABLE = bytes(b if b in _KEEP else 0x20 for b in range(256))
+
+_MULT = np.uint64(0x100000001B3)
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _normalize(text: str) -> bytes:
+    return b" " + (text or "").lower().encode("utf-8", "ignore").translate(_TABLE) + b" "
+
+
+def featurize(texts: Sequence[str], dim: int = DIM) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Sparse features for a batch as COO triplets (rows, cols, vals).
+    Counts are scaled by 1/sqrt(n-grams in the message) so long and short
+    messages land on a similar scale.
+    """
+    buf = np.frombuffer(b"\x00" + b"\x00".join(_normalize(t) for t in texts) + b"\x00",
+                        dtype=np.uint8)
+    sep = buf == 0
+    row_at = np.cumsum(sep) - 1     # message index of every byte
+    seps_before = np.cumsum(sep)    # for "window contains a separator" checks
+    codes = buf.astype(np.uint64)
+
+    rows, cols = [], []
+    with np.errstate(over="ignore"):
+        for n in NGRAMS:
+            m = len(buf) - n + 1
+            h = np.full(m, np.uint64(n) * _MIX, dtype=np.uint64)
+            for k in range(n):
+                h = (h ^ codes[k:k + m]) * _MULT
+            # Drop windows that cross a message boundary
+            start_seps = seps_before[:m] - sep[:m]
+            ok = seps_before[n - 1:n - 1 + m] == start_seps
+            h = h[ok]
+            h ^= h >> np.uint64(29)
+            rows.append(row_at[:m][ok])
+            cols.append((h % np.uint64(dim)).astype(np.int64))
+
+    rows = np.concatenate(rows)
+    cols = np.concatenate(cols)
+    per_row = np.bincount(rows, minlength=len(texts)).astype(np.float32)
+    vals = 1.0 / np.sqrt(np.maximum(per_row, 1.0))[rows]
+    return rows, cols, vals.astype(np.float32)
+
+
+def _sigmoid(z: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-np.clip(z, -30, 30)))
+
+
+class IntentClassifier:
+    def __init__(self, labels: Sequence[str], weights: np.ndarray, bias: np.ndarray,
+                 dense: Optional[np.ndarray] = None):
+        self.labels = list(labels)
+        # (n_labels, DIM): one contiguous row per label is ~2x faster to gather
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.bias = np.asarray(bias, dtype=np.float32)
+        # (n_dense, n_labels) weights for the caller's dense features
+        self.dense = np.zeros((0, len(self.labels)), np.float32) if dense is None \
+            else np.asarray(dense, dtype=np.float32)
+        self.dim = self.weights.shape[1]
+
+    def logits(self, rows: np.ndarray, cols: np.ndarray, vals: np.ndarray,
+               extra: np.ndarray) -> np.ndarray:
+        n = len(extra)
+        out = np.empty((n, len(self.labels)), dtype=np.float32)
+        for j, w in enumerate(self.weights):
+            out[:, j] = np.bincount(rows, weights=w[cols] * vals, minlength=n)
+        return out + extra @ self.dense + self.bias
+
+    def predict_proba(self, texts: Sequence[str], extra: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        (len(texts), len(labels)) independent probabilities per label.
+        extra: (len(texts), n_dense) features, as used in training.
+        """
+        if not texts:
+            return np.zeros((0, len(self.labels)), dtype=np.float32)
+        if extra is None:
+            extra = np.zeros((len(texts), len(self.dense)), np.float32)
+        rows, cols, vals = featurize(texts, self.dim)
+        return _sigmoid(self.logits(rows, cols, vals, np.asarray(extra, dtype=np.float32)))
+
+    @classmethod
+    def train(cls, texts: Sequence[str], targets: np.ndarray, labels: Sequence[str],
+              extra: Optional[np.ndarray] = None, sample_weight: Optional[np.ndarray] = None,
+              dim: int = DIM, epochs: int = 300, lr: float = 0.05,
+              l2: float = 1e-4) -> "IntentClassifier":
+        """
+        Full-batch Adam on the one-vs-rest logistic loss.
+        targets: (N, L) 0/1 matrix; extra: optional (N, n_dense) features;
+        sample_weight: optional (N,) weights.
+        """
+        n, n_labels = targets.shape
+        rows, cols, vals = featurize(texts, dim)
+        extra = np.zeros((n, 0), np.float32) if extra is None else extra.astype(np.float32)
+        sw = np.ones(n, np.float32) if sample_weight is None else sample_weight.astype(np.float32)
+        sw = sw / sw.sum()
+        model = cls(labels, np.zeros((n_labels, dim), np.float32), np.zeros(n_labels, np.float32),
+                    np.zeros((extra.shape[1], n_labels), np.float32))
+
+        params = [model.weights, model.dense, model.bias]
+        moments = [(np.zeros_like(p), np.zeros_like(p)) for p in params]
+        b1, b2, eps = 0.9, 0.999, 1e-8
+        for step in range(1, epochs + 1):
+            err = (_sigmoid(model.logits(rows, cols, vals, extra)) - targets) * sw[:, None]
+            g_w = np.empty_like(model.weights)
+            for j in range(n_labels):
+                g_w[j] = np.bincount(cols, weights=vals * err[rows, j], minlength=dim)
+            grads = [g_w + l2 * model.weights, extra.T @ err, err.sum(axis=0)]
+
+            scale = lr * np.sqrt(1 - b2 ** step) / (1 - b1 ** step)
+            for p, g, (m, v) in zip(params, grads, moments):
+                m *= b1
+                m += (1 - b1) * g
+                v *= b2
+                v += (1 - b2) * g * g
+                p -= scale * m / (np.sqrt(v) + eps)
+        return model
+
+    def save(self, path: Path):
+        # float16 n-gram weights keep the file small; scoring upcasts to float32
+        np.savez_compressed(path, labels=np.array(self.labels),
+                            weights=self.weights.astype(np.float16),
+                            dense=self.dense, bias=self.bias)
+
+    @classmethod
+    def load(cls, path: Path) -> "IntentClassifier":
+        with np.load(path) as data:
+            return cls([str(x) for x in data["labels"]], data["weights"], data["bias"],
+                       data["dense"])
@@ -0,0 +1,223 @@
+# app/intents.py
+"""
+Single-pass specialty intent matcher.
+
+All specialty vocabularies below are compiled into one regex whose
+alternation is factored as a trie ("diabet(?:es|ic)|..."), so the message is
+lowercased once and scanned once, and at every position the regex engine
+only follows the branch of the next character instead of trying each
+keyword in turn. Every matched specialty is returned with a score (number
+of keyword hits), so mixed questions are visible to the router.
+
+To add a specialty, add an entry to SPECIALTIES; no new scan is needed.
+  keywords  : lowercase phrases
+  whole_word: only match at word boundaries ("bp" must not match "bpm")
+
+match_intents() first asks the learned classifier (app/intent_model.py,
+weights in app/intent_classifier.npz). Each specialty probability must be
+either >= INTENT_ACCEPT (matched) or <= INTENT_REJECT (not matched); if any
+falls in between, the classifier is unsure and the keyword rules decide.
+Without a weights file, the keyword rules are used for everything.
+Scores are therefore probabilities or hit counts; match_intents() says
+which ("classifier" or "keywords").
+
+Accepted specialties whose probabilities are within INTENT_TIE_MARGIN of
+the best one count as tied, and the SPECIALTIES order breaks the tie, as
+it does for equal keyword counts: near-certain probabilities differ by
+noise (0.983 vs 0.979), which should not decide the primary route.
+"""
+import os
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .intent_model import IntentClassifier
+
+# Order = priority when scores tie
+SPECIALTIES: List[Dict] = [
+    {
+        "name": "diabetes",
+        "provider": "diabetes_qwen_ov",
+        "whole_word": False,
+        "keywords": [
+            "diabetes", "diabetic", "blood sugar", "glucose", "hba1c",
+            "t2dm", "type 2", "type-2", "insulin", "metformin",
+        ],
+    },
+    {
+        "name": "hypertension",
+        "provider": "hypertension_qwen_ov",
+        "whole_word": False,
+        "keywords": [
+            "hypertension", "high blood pressure", "blood pressure", "high bp",
+            "htn", "systolic", "diastolic", "dash diet", "dash-style",
+        ],
+    },
+    {
+        # "bp" on its own (the old " bp"/"bp " checks) needs word boundaries
+        "name": "hypertension",
+        "provider": "hypertension_qwen_ov",
+        "whole_word": True,
+        "keywords": ["bp"],
+    },
+    {
+        "name": "lipids",
+        "provider": "lipids_qwen_ov",
+        "whole_word": True,
+        "keywords": [
+            "ldl", "hdl", "triglyceride", "triglycerides", "cholesterol",
+            "lipid profile", "dyslipidemia", "hyperlipidemia",
+        ],
+    },
+    {
+        "name": "kidney",
+        "provider": "kidney_qwen_ov",
+        "whole_word": True,
+        "keywords": [
+            "ckd", "chronic kidney", "kidney disease", "kidney", "renal", "egfr",
+            "creatinine", "dialysis", "nephro", "proteinuria", "potassium",
+            "phosphorus", "fluid restriction",
+        ],
+    },
+]
+
+
+def _trie_regex(words: Sequence[str]) -> str:
+    """Regex matching exactly `words`, with shared prefixes factored out."""
+    trie: Dict = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def emit(node: Dict) -> str:
+        # A word that is a prefix of another becomes a greedy optional tail,
+        # e.g. triglyceride(?:s)?, so the longer keyword wins
+        branches = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+        optional = "" in node
+        if not branches:
+            return ""
+        if len(branches) == 1 and not optional:
+            return branches[0]
+        body = "(?:" + "|".join(branches) + ")"
+        return body + "?" if optional else body
+
+    return emit(trie)
+
+
+class IntentMatcher:
+    def __init__(self, specialties: Sequence[Dict] = SPECIALTIES):
+        self.priority: Dict[str, int] = {}
+        self.providers: Dict[str, str] = {}
+        self._owner: Dict[Tuple[str, bool], str] = {}
+        groups = {True: [], False: []}
+        for spec in specialties:
+            self.priority.setdefault(spec["name"], len(self.priority))
+            self.providers[spec["name"]] = spec["provider"]
+            for kw in spec["keywords"]:
+                kw = kw.lower()
+                self._owner[(kw, spec["whole_word"])] = spec["name"]
+                groups[spec["whole_word"]].append(kw)
+
+        parts = []
+        if groups[True]:
+            parts.append(r"(?<!\w)(?P<w>" + _trie_regex(groups[True]) + r")(?!\w)")
+        if groups[False]:
+            parts.append("(?P<s>" + _trie_regex(groups[False]) + ")")
+        self._pattern = re.compile("|".join(parts)) if parts else None
+
+    def match(self, text: Optional[str]) -> List[Tuple[str, int]]:
+        """All matched specialties as (name, score), best first."""
+        if not text or self._pattern is None:
+            return []
+        scores: Dict[str, int] = {}
+        for m in self._pattern.finditer(text.lower()):
+            whole = m.lastgroup == "w"
+            name = self._owner[(m.group(m.lastgroup), whole)]
+            scores[name] = scores.get(name, 0) + 1
+        return sorted(scores.items(), key=lambda kv: (-kv[1], self.priority[kv[0]]))
+
+    def hit_counts(self, texts: Sequence[str]) -> np.ndarray:
+        """(len(texts), specialties) keyword hit counts, in priority order."""
+        out = np.zeros((len(texts), len(self.priority)), np.float32)
+        for i, text in enumerate(texts):
+            for name, hits in self.match(text):
+                out[i, self.priority[name]] = hits
+        return out
+
+    def best(self, text: Optional[str]) -> Optional[str]:
+        matches = self.match(text)
+        return matches[0][0] if matches else None
+
+    def matches(self, text: Optional[str], name: str) -> bool:
+        return any(n == name for n, _ in self.match(text))
+
+
+MATCHER = IntentMatcher()
+SPECIALTY_NAMES = list(MATCHER.priority)
+
+INTENT_MODEL = os.getenv("INTENT_MODEL", str(Path(__file__).with_name("intent_classifier.npz")))
+INTENT_ACCEPT = float(os.getenv("INTENT_ACCEPT", "0.6"))
+INTENT_REJECT = float(os.getenv("INTENT_REJECT", "0.35"))
+INTENT_TIE_MARGIN = float(os.getenv("INTENT_TIE_MARGIN", "0.05"))
+
+
+def load_classifier(path: str = INTENT_MODEL) -> Optional[IntentClassifier]:
+    if not path or not Path(path).is_file():
+        return None
+    return IntentClassifier.load(Path(path))
+
+
+CLASSIFIER = load_classifier()
+
+
+def keyword_features(texts: Sequence[str]) -> np.ndarray:
+    """Dense classifier features: log(1 + keyword hits) per specialty."""
+    return np.log1p(MATCHER.hit_counts(texts))
+
+
+def _decide(text: Optional[str], probs: np.ndarray, labels: Sequence[str],
+            fallback: bool) -> Tuple[List[Tuple[str, float]], str]:
+    if fallback and ((probs > INTENT_REJECT) & (probs < INTENT_ACCEPT)).any():
+        return MATCHER.match(text), "keywords"
+    hits = [(label, round(float(p), 3)) for label, p in zip(labels, probs) if p >= INTENT_ACCEPT]
+    ranked = sorted(hits, key=lambda kv: (-kv[1], MATCHER.priority[kv[0]]))
+    # Near-ties with the best go to the front in priority order
+    tied = [kv for kv in ranked if ranked[0][1] - kv[1] <= INTENT_TIE_MARGIN]
+    tied.sort(key=lambda kv: MATCHER.priority[kv[0]])
+    return tied + ranked[len(tied):], "classifier"
+
+
+def classify(text: Optional[str], model: Optional[IntentClassifier] = CLASSIFIER,
+             fallback: bool = True) -> Tuple[List[Tuple[str, float]], str]:
+    """
+    Matched specialties, best first, and the source of their scores:
+    (name, probability) with "classifier", or (name, keyword hits) with
+    "keywords" when the classifier is unsure or there is no model.
+    """
+    if model is None or not text:
+        return MATCHER.match(text), "keywords"
+    probs = model.predict_proba([text], keyword_features([text]))[0]
+    return _decide(text, probs, model.labels, fallback)
+
+
+def resolve_intents(text: Optional[str], model: Optional[IntentClassifier] = CLASSIFIER,
+                    fallback: bool = True) -> List[Tuple[str, float]]:
+    """Matched specialties, best first (classify() without the source)."""
+    return classify(text, model, fallback)[0]
+
+
+def resolve_intents_batch(texts: Sequence[str],
+                          model: Optional[IntentClassifier] = CLASSIFIER) -> List[List[Tuple[str, float]]]:
+    """resolve_intents for many messages with one vectorized classifier pass."""
+    if model is None:
+        return [MATCHER.match(t) for t in texts]
+    probs = model.predict_proba(texts, keyword_features(texts))
+    return [_decide(t, p, model.labels, True)[0] if t else [] for t, p in zip(texts, probs)]
+
+
+def match_intents(text: Optional[str]) -> Tuple[List[Tuple[str, float]], str]:
+    return classify(text, CLASSIFIER)
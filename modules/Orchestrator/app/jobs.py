@@ -0,0 +1,291 @@
+# app/jobs.py
+"""
+Case jobs: /v1/route enqueues, a worker pool runs the A1–A5 pipeline.
+
+Job records (status queued -> running -> done | failed, plus the plan or
+the error) go to a PlanStore: a bounded in-memory LRU in front of a SQLite
+file. Finished records are served from memory; pending ones are always
+read from SQLite, so replicas sharing the file (and a restarted process)
+see the same status and plans. SQLite runs on the store's own thread,
+never on the event loop.
+
+A job keeps the X-Request-ID of the /v1/route call that submitted it: the
+worker runs the pipeline under that ID, and plan.trace["job"] records it
+with the time the job spent queued.
+
+Env:
+  CASE_WORKERS     concurrent pipeline runs per replica (default 4)
+  CASE_QUEUE_SIZE  queued jobs before /v1/route answers 503 (default 256)
+  PLAN_CACHE_SIZE  records kept in memory (default 1024)
+  PLAN_DB          SQLite path (default plans.sqlite3; "" = memory only)
+  REPLICA_ID       owner tag for jobs (default hostname)
+"""
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from .metrics import CASE_QUEUE_SECONDS, REQUEST_ID
+from .schemas import Profile, Plan
+
+CASE_WORKERS = int(os.getenv("CASE_WORKERS", "4"))
+CASE_QUEUE_SIZE = int(os.getenv("CASE_QUEUE_SIZE", "256"))
+PLAN_CACHE_SIZE = int(os.getenv("PLAN_CACHE_SIZE", "1024"))
+PLAN_DB = os.getenv("PLAN_DB", "plans.sqlite3")
+REPLICA_ID = os.getenv("REPLICA_ID", socket.gethostname())
+
+PENDING = ("queued", "running")
+FIELDS = ("case_id", "status", "owner", "submitted", "started", "finished", "plan", "error")
+
+
+class PlanStore:
+    """
+    Job records by case_id. SQLite calls run on one thread of their own, in
+    submission order: the event loop never waits on disk, and the writes
+    for one record land in the order they were made.
+    """
+
+    def __init__(self, max_entries: int = 1024, db_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()  # guards _mem and stats
+        self._mem: "OrderedDict[str, dict]" = OrderedDict()
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+        self._io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="plan-store")
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path:
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = self._io.submit(self._connect, db_path).result()
+
+    @staticmethod
+    def _connect(db_path: str) -> sqlite3.Connection:
+        db = sqlite3.connect(db_path, timeout=10, check_same_thread=False)
+        # WAL: readers in other replicas do not block this writer
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS cases ("
+            "case_id TEXT PRIMARY KEY, status TEXT, owner TEXT, submitted REAL, "
+            "started REAL, finished REAL, plan TEXT, error TEXT)"
+        )
+        db.commit()
+        return db
+
+    async def _disk(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._io, fn, *args)
+
+    async def get(self, case_id: str) -> Optional[dict]:
+        with self._lock:
+            record = self._mem.get(case_id)
+            # Without a DB, memory is the source of truth; with one, pending
+            # records may be advanced by another replica, so re-read them
+            if record is not None and (self._db is None or record["status"] not in PENDING):
+                self._mem.move_to_end(case_id)
+                self.stats["hits"] += 1
+                return dict(record)
+
+        if self._db is not None:
+            record = await self._disk(self._select, case_id)
+            if record is not None:
+                with self._lock:
+                    self._remember(record)
+                    self.stats["disk_hits"] += 1
+                return dict(record)
+
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    async def put(self, record: dict):
+        record = dict(record)
+        with self._lock:
+            self._remember(record)
+        if self._db is not None:
+            await self._disk(self._upsert, record, True)
+
+    async def claim(self, record: dict) -> Optional[dict]:
+        """
+        Store `record` unless its case is already queued/running; return
+        that pending record instead (and store nothing). With a DB the check
+        and the write are one transaction, so replicas cannot both claim.
+        """
+        record = dict(record)
+        if self._db is None:
+            with self._lock:
+                current = self._mem.get(record["case_id"])
+                if current is not None and current["status"] in PENDING:
+                    return dict(current)
+                self._remember(record)
+                return None
+        current = await self._disk(self._claim, record)
+        with self._lock:
+            self._remember(current or record)
+        return dict(current) if current is not None else None
+
+    async def fail_interrupted(self, owner: str) -> int:
+        """Mark `owner`'s queued/running jobs from a previous run as failed."""
+        if self._db is None:
+            return 0
+        return await self._disk(self._fail_interrupted, owner)
+
+    # ---- SQLite, on the store's thread only ----
+    def _select(self, case_id: str) -> Optional[dict]:
+        row = self._db.execute(
+            f"SELECT {', '.join(FIELDS)} FROM cases WHERE case_id = ?", (case_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        record = dict(zip(FIELDS, row))
+        record["plan"] = json.loads(record["plan"]) if record["plan"] else None
+        return record
+
+    def _upsert(self, record: dict, commit: bool):
+        values = [record.get(f) for f in FIELDS]
+        values[FIELDS.index("plan")] = (
+            json.dumps(record["plan"], ensure_ascii=False) if record.get("plan") else None
+        )
+        self._db.execute(
+            f"INSERT OR REPLACE INTO cases ({', '.join(FIELDS)}) "
+            f"VALUES ({', '.join('?' * len(FIELDS))})",
+            values,
+        )
+        if commit:
+            self._db.commit()
+
+    def _claim(self, record: dict) -> Optional[dict]:
+        # IMMEDIATE: take the write lock before reading, across replicas
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            current = self._select(record["case_id"])
+            if current is None or current["status"] not in PENDING:
+                self._upsert(record, False)
+                current = None
+            self._db.commit()
+        except BaseException:
+            self._db.rollback()
+            raise
+        return current
+
+    def _fail_interrupted(self, owner: str) -> int:
+        cur = self._db.execute(
+            "UPDATE cases SET status = 'failed', error = 'interrupted by restart', "
+            "finished = ? WHERE owner = ? AND status IN ('queued', 'running')",
+            (time.time(), owner),
+        )
+        self._db.commit()
+        return cur.rowcount
+
+    def _remember(self, record: dict):
+        self._mem[record["case_id"]] = record
+        self._mem.move_to_end(record["case_id"])
+        if len(self._mem) <= self.max_entries:
+            return
+        # Evict the oldest finished record; pending ones stay until they finish
+        for case_id, old in self._mem.items():
+            if old["status"] not in PENDING or self._db is not None:
+                del self._mem[case_id]
+                self.stats["evictions"] += 1
+                break
+
+    def snapshot(self) -> dict:
+        # Called from the sync /health handler, i.e. off the event loop
+        disk_entries = (
+            self._io.submit(
+                lambda: self._db.execute("SELECT COUNT(*) FROM cases").fetchone()[0]
+            ).result()
+            if self._db is not None else None
+        )
+        with self._lock:
+            return {**self.stats, "entries": len(self._mem),
+                    "max_entries": self.max_entries, "disk_entries": disk_entries}
+
+
+class JobQueue:
+    """Bounded queue of case jobs drained by `workers` pipeline runners."""
+
+    def __init__(self, store: PlanStore, run: Callable[[Profile], Awaitable[Plan]],
+                 workers: int = 4, maxsize: int = 256, owner: str = REPLICA_ID):
+        self.store = store
+        self.run = run
+        self.workers = workers
+        self.owner = owner
+        # (profile, request ID, perf_counter at submit)
+        self._queue: "asyncio.Queue[Tuple[Profile, str, float]]" = asyncio.Queue(maxsize=maxsize)
+        self._tasks: List[asyncio.Task] = []
+        # Makes the queue-full check and the enqueue one step
+        self._submit_lock = asyncio.Lock()
+        self.stats = {"submitted": 0, "done": 0, "failed": 0, "rejected": 0,
+                      "interrupted": 0}
+
+    async def start(self):
+        self.stats["interrupted"] += await self.store.fail_interrupted(self.owner)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, profile: Profile) -> dict:
+        """
+        Enqueue a pipeline run for profile.patient_id and return its record.
+        A case that is already queued/running is not enqueued twice.
+        Raises asyncio.QueueFull when the queue is at capacity.
+        """
+        record = {"case_id": profile.patient_id, "status": "queued", "owner": self.owner,
+                  "submitted": time.time(), "started": None, "finished": None,
+                  "plan": None, "error": None}
+        async with self._submit_lock:
+            if self._queue.full():
+                self.stats["rejected"] += 1
+                raise asyncio.QueueFull
+            current = await self.store.claim(record)
+            if current is not None:
+                return current
+            # Only submit() adds to the queue, so it cannot have filled up
+            self._queue.put_nowait((profile, REQUEST_ID.get(), time.perf_counter()))
+        self.stats["submitted"] += 1
+        return record
+
+    async def _worker(self):
+        while True:
+            profile, request_id, enqueued = await self._queue.get()
+            queue_s = time.perf_counter() - enqueued
+            CASE_QUEUE_SECONDS.observe(queue_s)
+            REQUEST_ID.set(request_id)
+            record = await self.store.get(profile.patient_id) or {
+                "case_id": profile.patient_id, "owner": self.owner,
+                "submitted": time.time(), "plan": None, "error": None,
+            }
+            record.update(status="running", started=time.time())
+            await self.store.put(record)
+            try:
+                plan = await self.run(profile)
+                plan.trace = {**plan.trace, "job": {"request_id": request_id or None,
+                                                   "queue_ms": round(queue_s * 1000, 1)}}
+                record.update(status="done", plan=plan.model_dump(), error=None)
+                self.stats["done"] += 1
+            except HTTPException as e:
+                record.update(status="failed", error=f"{e.status_code}: {e.detail}")
+                self.stats["failed"] += 1
+            except Exception as e:
+                record.update(status="failed", error=repr(e))
+                self.stats["failed"] += 1
+            # On shutdown (CancelledError) the record stays "running" and is
+            # marked interrupted by the next start()
+            record["finished"] = time.time()
+            await self.store.put(record)
+            self._queue.task_done()
+
+    def snapshot(self) -> Dict:
+        return {**self.stats, "queued": self._queue.qsize(), "max_queued": self._queue.maxsize,
+                "workers": self.workers, "owner": self.owner, "store": self.store.snapshot()}
@@ -1,40 +1,125 @@
-from fastapi import FastAPI, HTTPException
-from typing import Dict
+import json
+from contextlib import asynccontextmanager
+import asyncio
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import Dict, List, Literal
 from .schemas import Profile, Plan
 from .registry import list_schemas
+from .pipeline import PIPELINE, describe_pipeline
 from .router import run_pipeline
 from pydantic import BaseModel
-from .router import route_user_message  # import the new router
-app = FastAPI(title="MCP Orchestrator", version="0.1.0")
+from .router import route_user_message, stream_user_message  # import the new router
+from .router import fan_out_user_message, stream_fan_out, SPECIALTY_TOOLS, CHAT_COALESCER
+from . import resilience
+from .metrics import install as install_metrics
+from .clients import open_clients, close_clients
+from .bulk import NDJSONStream, run_bulk
+from .jobs import (JobQueue, PlanStore, CASE_QUEUE_SIZE, CASE_WORKERS, PLAN_CACHE_SIZE,
+                   PLAN_DB, PENDING)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled HTTP client per backend for the whole process
+    await open_clients()
+    await JOBS.start()
+    yield
+    await JOBS.stop()
+    await close_clients()
+
+app = FastAPI(title="MCP Orchestrator", version="0.1.0", lifespan=lifespan)
+# GET /metrics, per-request timing and X-Request-ID propagation
+install_metrics(app)
 
 class ChatRequest(BaseModel):
     message: str
+    # "best": best-matching specialty only; "all": every matched specialty
+    # concurrently, merged into one sectioned reply
+    mode: Literal["best", "all"] = "best"
+
+class ChatSection(BaseModel):
+    specialty: str
+    provider: str
+    reply: str
+    status: str  # ok | timeout | error
+    latency_ms: float
 
 class ChatResponse(BaseModel):
     reply: str
     provider: str
     specialized: bool
+    intents: Dict[str, float] = {}  # classifier probability, or keyword hits
+    intent_source: str = ""         # which of the two: "classifier" | "keywords"
+    sections: List[ChatSection] = []
 
 @app.post("/chat", response_model=ChatResponse)
-def chat(req: ChatRequest):
-    result = route_user_message(req.message)
+async def chat(req: ChatRequest):
+    if req.mode == "all":
+        result = await fan_out_user_message(req.message)
+    else:
+        result = await route_user_message(req.message)
     return ChatResponse(**result)
 
-# Simple in-memory store (OK for dev/tests)
-PLANS: Dict[str, Plan] = {}
+@app.post("/chat/stream")
+async def chat_stream(req: ChatRequest):
+    # NDJSON: {"provider","specialized","intents","intent_source"} → {"delta"}... → {"completion"} → {"done": true}
+    # ({"completion"} is the cleaned reply, sent by streaming backends; it replaces the deltas)
+    # mode "all": {"section"} per specialty instead of {"delta"}, in completion order
+    events = stream_fan_out if req.mode == "all" else stream_user_message
+    async def lines():
+        async for event in events(req.message):
+            yield json.dumps(event) + "\n"
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+# Plans: bounded LRU over SQLite (PLAN_DB), filled by the case worker pool
+JOBS = JobQueue(PlanStore(PLAN_CACHE_SIZE, PLAN_DB), run_pipeline,
+                workers=CASE_WORKERS, maxsize=CASE_QUEUE_SIZE)
 
 @app.get("/health")
 def health():
-    return {"status": "ok", "service": "mcp-orchestrator", "schemas": list_schemas()}
+    return {"status": "ok", "service": "mcp-orchestrator", "schemas": list_schemas(),
+            "pipeline": describe_pipeline(), "jobs": JOBS.snapshot(),
+            "chat_coalescing": CHAT_COALESCER.snapshot()}
 
-@app.post("/v1/route")
+@app.get("/health/backends")
+def health_backends():
+    # Breaker state, latency percentiles and current timeout per backend
+    for name in [*SPECIALTY_TOOLS, *(stage.name for stage in PIPELINE)]:
+        resilience.backend(name)
+    backends = resilience.snapshot()
+    degraded = any(b["state"] != "closed" for b in backends.values())
+    return {"status": "degraded" if degraded else "ok", "backends": backends}
+
+@app.post("/v1/route", status_code=202)
 async def route_case(profile: Profile):
-    plan = await run_pipeline(profile)
-    PLANS[profile.patient_id] = plan
-    return {"accepted": True, "case_id": profile.patient_id}
+    # Enqueue only; poll /v1/cases/{case_id}/plan for the result
+    try:
+        record = await JOBS.submit(profile)
+    except asyncio.QueueFull:
+        raise HTTPException(status_code=503, detail="case queue full, retry later",
+                            headers={"Retry-After": "5"})
+    return {"accepted": True, "case_id": record["case_id"], "status": record["status"]}
+
+@app.post("/v1/cases/bulk")
+async def route_cases_bulk(request: Request, line_offset: int = 0):
+    # NDJSON profiles in, NDJSON results out as cases finish (see app/bulk.py)
+    events = run_bulk(request.stream(), run_pipeline, JOBS.store,
+                      owner=JOBS.owner, line_offset=line_offset)
+    async def lines():
+        async for event in events:
+            yield json.dumps(event, ensure_ascii=False) + "\n"
+    return NDJSONStream(lines())
 
 @app.get("/v1/cases/{case_id}/plan")
-def get_plan(case_id: str):
-    if case_id not in PLANS:
+async def get_plan(case_id: str):
+    record = await JOBS.store.get(case_id)
+    if record is None:
         raise HTTPException(status_code=404, detail="not found")
-    return PLANS[case_id]
+    if record["status"] in PENDING:
+        return JSONResponse(status_code=202, content={"case_id": case_id,
+                                                      "status": record["status"]})
+    if record["status"] == "failed":
+        raise HTTPException(status_code=502, detail={"case_id": case_id, "status": "failed",
+                                                     "error": record["error"]})
+    return Plan(**record["plan"])
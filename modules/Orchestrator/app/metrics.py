@@ -0,0 +1,101 @@
+# app/metrics.py
+"""
+Prometheus metrics (GET /metrics) and request IDs.
+
+install(app) adds a middleware that times every request and tags it with
+X-Request-ID: the caller's (the Gateway forwards its own) or a new one.
+The ID is kept in REQUEST_ID for the rest of the request, sent on every
+backend call by resilience.post()/stream(), and echoed in the response,
+so one ID links the Gateway, Orchestrator, agent and model-service logs.
+
+Each service is built from its own directory, so the Gateway and A1
+(app/metrics.py) and the OV services (ov_metrics.py) have their own
+install() with the same middleware, and the Gateway its own
+request_headers(). A change to the middleware belongs in all four.
+
+Histograms:
+  orchestrator_http_request_seconds   per route template and status
+  orchestrator_chat_stage_seconds     intent (classifier/keywords) and backend
+                                      (specialty call) per chat route
+  orchestrator_backend_call_seconds   every breaker-wrapped HTTP hop, by
+                                      backend and outcome
+  orchestrator_pipeline_stage_seconds A1–A5 stages of a case run
+  orchestrator_case_queue_seconds     /v1/route submit to worker pickup
+"""
+import contextvars
+import logging
+import time
+import uuid
+from typing import Dict
+
+from fastapi import FastAPI, Request, Response
+from prometheus_client import CONTENT_TYPE_LATEST, Histogram, generate_latest
+
+log = logging.getLogger("uvicorn")
+
+# From sub-millisecond intent matching up to minute-long LLM replies
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1, 2.5, 5, 10, 20, 30, 60, 120)
+
+REQUEST_SECONDS = Histogram(
+    "orchestrator_http_request_seconds", "HTTP request time until response headers",
+    ["method", "path", "status"], buckets=LATENCY_BUCKETS,
+)
+CHAT_STAGE_SECONDS = Histogram(
+    "orchestrator_chat_stage_seconds", "Chat stages: intent resolution, backend call",
+    ["stage", "route"], buckets=LATENCY_BUCKETS,
+)
+BACKEND_SECONDS = Histogram(
+    "orchestrator_backend_call_seconds", "Breaker-wrapped backend HTTP calls",
+    ["backend", "outcome"], buckets=LATENCY_BUCKETS,
+)
+PIPELINE_STAGE_SECONDS = Histogram(
+    "orchestrator_pipeline_stage_seconds", "A1–A5 pipeline stage duration",
+    ["stage"], buckets=LATENCY_BUCKETS,
+)
+CASE_QUEUE_SECONDS = Histogram(
+    "orchestrator_case_queue_seconds", "Case job wait between submit and worker pickup",
+    buckets=LATENCY_BUCKETS,
+)
+
+REQUEST_ID: contextvars.ContextVar[str] = contextvars.ContextVar("request_id", default="")
+
+
+def request_headers() -> Dict[str, str]:
+    """X-Request-ID header for an outgoing call, if a request is in progress."""
+    rid = REQUEST_ID.get()
+    return {"X-Request-ID": rid} if rid else {}
+
+
+def install(app: FastAPI):
+    """
+    Add GET /metrics and the request middleware: the caller's X-Request-ID
+    (or a new one) is kept in REQUEST_ID for the backend calls, echoed in
+    the response, and logged with the request's time, which is observed in
+    orchestrator_http_request_seconds.
+    """
+    @app.middleware("http")
+    async def _timing(request: Request, call_next):
+        rid = request.headers.get("x-request-id") or uuid.uuid4().hex
+        token = REQUEST_ID.set(rid)
+        t0 = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+        finally:
+            REQUEST_ID.reset(token)
+            # Route template, not the raw path, keeps label cardinality bounded
+            route = request.scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            elapsed = time.perf_counter() - t0
+            REQUEST_SECONDS.labels(request.method, path, str(status)).observe(elapsed)
+        if path != "/metrics":
+            log.info("request_id=%s %s %s %s %.1fms", rid, request.method, path, status,
+                     elapsed * 1000)
+        response.headers["X-Request-ID"] = rid
+        return response
+
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
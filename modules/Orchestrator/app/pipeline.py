@@ -0,0 +1,132 @@
+# app/pipeline.py
+"""
+A1–A5 pipeline as a dependency graph.
+
+Each stage names the stages whose results it needs; the executor starts a
+stage as soon as those are done, so independent stages (A1–A4 only need
+the profile) run concurrently and end-to-end latency follows the critical
+path instead of the sum of all hops. Per-stage timings go into Plan.trace.
+"""
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Sequence, Tuple, Type
+
+from pydantic import BaseModel
+
+from .metrics import PIPELINE_STAGE_SECONDS
+from .schemas import Profile, DietRules, Gaps, Targets, Conflicts, Plan
+
+A1_URL = os.getenv("A1_URL", "http://a1:9001")
+A2_URL = os.getenv("A2_URL", "http://a2:9002")
+A3_URL = os.getenv("A3_URL", "http://a3:9003")
+A4_URL = os.getenv("A4_URL", "http://a4:9004")
+A5_URL = os.getenv("A5_URL", "http://a5:9005")
+
+
+class Stage:
+    """One agent call: POST `payload(profile, deps)` to `url`, parse as `model`."""
+
+    def __init__(self, name: str, url: str, model: Type[BaseModel],
+                 payload: Callable[[Profile, Dict[str, BaseModel]], dict],
+                 needs: Sequence[str] = ()):
+        self.name = name
+        self.url = url
+        self.model = model
+        self.payload = payload
+        self.needs = tuple(needs)
+
+
+def _patient(profile: Profile, deps: Dict[str, BaseModel]) -> dict:
+    return {"patient_id": profile.patient_id}
+
+
+def _plan_payload(profile: Profile, deps: Dict[str, BaseModel]) -> dict:
+    return {
+        "patient_id": profile.patient_id,
+        "diet_rules": deps["diet_rules"].model_dump(),
+        "gaps": deps["gaps"].model_dump(),
+        "targets": deps["targets"].model_dump(),
+        "conflicts": deps["conflicts"].model_dump(),
+    }
+
+
+PIPELINE: List[Stage] = [
+    Stage("diet_rules", f"{A1_URL}/diet-rules", DietRules, lambda p, _: p.model_dump()),
+    Stage("gaps", f"{A2_URL}/gaps", Gaps, _patient),
+    Stage("targets", f"{A3_URL}/targets", Targets, _patient),
+    Stage("conflicts", f"{A4_URL}/conflicts", Conflicts, _patient),
+    Stage("plan", f"{A5_URL}/plan", Plan, _plan_payload,
+          needs=("diet_rules", "gaps", "targets", "conflicts")),
+]
+
+
+def topo_order(stages: Sequence[Stage]) -> List[Stage]:
+    """Stages in dependency order; raises ValueError on unknown deps or cycles."""
+    by_name = {s.name: s for s in stages}
+    order, state = [], {}
+
+    def visit(stage: Stage):
+        if state.get(stage.name) == "done":
+            return
+        if state.get(stage.name) == "visiting":
+            raise ValueError(f"Pipeline cycle at stage {stage.name!r}")
+        state[stage.name] = "visiting"
+        for dep in stage.needs:
+            if dep not in by_name:
+                raise ValueError(f"Stage {stage.name!r} needs unknown stage {dep!r}")
+            visit(by_name[dep])
+        state[stage.name] = "done"
+        order.append(stage)
+
+    for stage in stages:
+        visit(stage)
+    return order
+
+
+def describe_pipeline(stages: Sequence[Stage] = PIPELINE) -> Dict[str, List[str]]:
+    return {s.name: list(s.needs) for s in topo_order(stages)}
+
+
+async def execute(stages: Sequence[Stage], profile: Profile,
+                  call: Callable[[str, dict, str], Awaitable[dict]]) -> Tuple[Dict[str, Any], dict]:
+    """
+    Run `stages` with maximum concurrency; `call(url, payload, stage_name)`
+    does the HTTP hop (the stage name keys its circuit breaker). Returns (results by stage name,
+    trace with start/end/duration per stage in ms from pipeline start).
+    The first failing stage cancels the rest and its error propagates.
+    """
+    order = topo_order(stages)
+    tasks: Dict[str, asyncio.Task] = {}
+    timings: Dict[str, dict] = {}
+    t_start = time.perf_counter()
+
+    def ms(t: float) -> float:
+        return round((t - t_start) * 1000, 1)
+
+    async def run(stage: Stage):
+        deps = {name: await tasks[name] for name in stage.needs}
+        t0 = time.perf_counter()
+        data = await call(stage.url, stage.payload(profile, deps), stage.name)
+        t1 = time.perf_counter()
+        PIPELINE_STAGE_SECONDS.labels(stage.name).observe(t1 - t0)
+        timings[stage.name] = {"start_ms": ms(t0), "end_ms": ms(t1),
+                               "duration_ms": round((t1 - t0) * 1000, 1)}
+        return stage.model(**data)
+
+    for stage in order:
+        tasks[stage.name] = asyncio.create_task(run(stage))
+    try:
+        await asyncio.gather(*tasks.values())
+    except BaseException:
+        for task in tasks.values():
+            task.cancel()
+        raise
+
+    total_ms = round((time.perf_counter() - t_start) * 1000, 1)
+    trace = {
+        "stages": {s.name: timings[s.name] for s in order},
+        "total_ms": total_ms,
+        "sum_of_stages_ms": round(sum(t["duration_ms"] for t in timings.values()), 1),
+    }
+    return {name: task.result() for name, task in tasks.items()}, trace
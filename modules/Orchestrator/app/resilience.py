@@ -0,0 +1,273 @@
+# app/resilience.py
+"""
+Backend resilience: circuit breakers, adaptive timeouts and hedged requests
+for the specialty model backends and the A1–A5 agents.
+
+Every call goes through post() / stream() with a backend name:
+
+  circuit breaker  BREAKER_FAILURES consecutive failures (timeouts,
+                   connection errors, 5xx) open the breaker; calls then fail
+                   fast with BackendUnavailable for BREAKER_COOLDOWN_S, after
+                   which one probe is let through (half-open) and its result
+                   closes or re-opens the breaker.
+  adaptive timeout once ADAPTIVE_MIN_SAMPLES successes are recorded, the
+                   timeout is ADAPTIVE_TIMEOUT_MULT x observed p99 latency,
+                   at least ADAPTIVE_TIMEOUT_MIN_S and never more than the
+                   caller's timeout (which stays the cap).
+  hedging          if <BACKEND>_HEDGE_URL is set (base URL of a second
+                   replica, e.g. DIABETES_HEDGE_URL=http://10.0.0.7:8081),
+                   a request still running after the p95 latency (or
+                   HEDGE_DELAY_S before enough samples) is also sent to the
+                   replica; the first good answer wins, the other is cancelled.
+
+State is per process and reported by snapshot() (GET /health/backends).
+Each call carries the current X-Request-ID and is timed in
+orchestrator_backend_call_seconds{backend, outcome} (see app/metrics.py).
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+
+import httpx
+
+from .clients import get_client
+from .metrics import BACKEND_SECONDS, request_headers
+
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN_S = float(os.getenv("BREAKER_COOLDOWN_S", "30"))
+ADAPTIVE_MIN_SAMPLES = int(os.getenv("ADAPTIVE_MIN_SAMPLES", "20"))
+ADAPTIVE_TIMEOUT_MULT = float(os.getenv("ADAPTIVE_TIMEOUT_MULT", "3.0"))
+ADAPTIVE_TIMEOUT_MIN_S = float(os.getenv("ADAPTIVE_TIMEOUT_MIN_S", "2.0"))
+HEDGE_DELAY_S = float(os.getenv("HEDGE_DELAY_S", "2.0"))
+LATENCY_WINDOW = int(os.getenv("LATENCY_WINDOW", "200"))
+
+
+class BackendUnavailable(Exception):
+    """Breaker open, or the backend timed out / failed to connect."""
+
+    def __init__(self, backend: str, reason: str, timed_out: bool = False):
+        super().__init__(f"{backend}: {reason}")
+        self.backend = backend
+        self.reason = reason
+        self.timed_out = timed_out
+
+
+class BackendState:
+    def __init__(self, name: str):
+        self.name = name
+        self.hedge_url = os.getenv(f"{name.upper()}_HEDGE_URL", "")
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.state = "closed"           # closed | open | half_open
+        self.failures = 0               # consecutive
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.cap = 60.0                 # last caller timeout, for snapshot()
+        self.stats = {"requests": 0, "successes": 0, "failures": 0, "timeouts": 0,
+                      "rejected": 0, "hedged": 0, "hedge_wins": 0}
+
+    # ---------------- latency ----------------
+    def percentile(self, pct: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+    def timeout(self, cap: float) -> float:
+        if len(self.latencies) < ADAPTIVE_MIN_SAMPLES:
+            return cap
+        adaptive = self.percentile(99) * ADAPTIVE_TIMEOUT_MULT
+        return min(cap, max(ADAPTIVE_TIMEOUT_MIN_S, adaptive))
+
+    def hedge_delay(self) -> float:
+        if len(self.latencies) < ADAPTIVE_MIN_SAMPLES:
+            return HEDGE_DELAY_S
+        return self.percentile(95)
+
+    # ---------------- breaker ----------------
+    def acquire(self):
+        """Raise BackendUnavailable if the breaker does not allow a call now."""
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < BREAKER_COOLDOWN_S:
+                self.stats["rejected"] += 1
+                raise BackendUnavailable(self.name, "circuit open")
+            self.state = "half_open"
+        if self.state == "half_open":
+            if self.probe_in_flight:
+                self.stats["rejected"] += 1
+                raise BackendUnavailable(self.name, "circuit half-open, probe in flight")
+            self.probe_in_flight = True
+        self.stats["requests"] += 1
+
+    def success(self, latency_s: float):
+        self.latencies.append(latency_s)
+        self.stats["successes"] += 1
+        self.failures = 0
+        self.state = "closed"
+        self.probe_in_flight = False
+
+    def failure(self, timed_out: bool = False):
+        self.stats["failures"] += 1
+        self.stats["timeouts"] += timed_out
+        self.failures += 1
+        self.probe_in_flight = False
+        if self.state == "half_open" or self.failures >= BREAKER_FAILURES:
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def snapshot(self) -> dict:
+        def ms(v):
+            return round(v * 1000, 1) if v is not None else None
+
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "samples": len(self.latencies),
+            "p50_ms": ms(self.percentile(50)),
+            "p95_ms": ms(self.percentile(95)),
+            "p99_ms": ms(self.percentile(99)),
+            "timeout_s": round(self.timeout(self.cap), 2),
+            "timeout_cap_s": self.cap,
+            "hedge_url": self.hedge_url or None,
+            **self.stats,
+        }
+
+
+_backends: Dict[str, BackendState] = {}
+
+
+def backend(name: str) -> BackendState:
+    state = _backends.get(name)
+    if state is None:
+        state = _backends[name] = BackendState(name)
+    return state
+
+
+def _hedge_target(url: str, hedge_base: str) -> str:
+    base = httpx.URL(hedge_base)
+    return str(httpx.URL(url).copy_with(scheme=base.scheme, host=base.host, port=base.port))
+
+
+def _observe(name: str, outcome: str, t0: float):
+    BACKEND_SECONDS.labels(name, outcome).observe(time.perf_counter() - t0)
+
+
+async def _hedged(send, url: str, hedge_url: str, delay: float, state: BackendState):
+    primary = asyncio.create_task(send(url))
+    done, _ = await asyncio.wait({primary}, timeout=delay)
+    if done:
+        return primary.result()
+
+    state.stats["hedged"] += 1
+    secondary = asyncio.create_task(send(_hedge_target(url, hedge_url)))
+    pending = {primary, secondary}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None and task.result().status_code < 500:
+                    state.stats["hedge_wins"] += task is secondary
+                    return task.result()
+        # Both failed: surface the primary's outcome
+        return primary.result()
+    finally:
+        for task in (primary, secondary):
+            task.cancel()
+
+
+async def post(name: str, url: str, *, timeout: float, pool: Optional[str] = None,
+               **kwargs) -> httpx.Response:
+    """
+    POST through backend `name`'s breaker, adaptive timeout and optional hedge.
+    `timeout` is the caller's cap in seconds; `pool` picks the pooled client
+    (default: the backend name). 5xx responses count as failures but are
+    returned; timeouts and connection errors raise BackendUnavailable.
+    """
+    state = backend(name)
+    state.acquire()
+    state.cap = timeout
+    limit = state.timeout(timeout)
+    client = get_client(pool or name)
+    kwargs["headers"] = {**(kwargs.get("headers") or {}), **request_headers()}
+
+    async def send(target: str) -> httpx.Response:
+        return await client.post(target, timeout=limit, **kwargs)
+
+    t0 = time.perf_counter()
+    try:
+        if state.hedge_url:
+            r = await asyncio.wait_for(
+                _hedged(send, url, state.hedge_url, state.hedge_delay(), state), limit
+            )
+        else:
+            r = await asyncio.wait_for(send(url), limit)
+    except (asyncio.TimeoutError, httpx.TimeoutException):
+        state.failure(timed_out=True)
+        _observe(name, "timeout", t0)
+        raise BackendUnavailable(name, f"timed out after {limit:.1f}s", timed_out=True)
+    except httpx.TransportError as e:
+        state.failure()
+        _observe(name, "error", t0)
+        raise BackendUnavailable(name, f"{type(e).__name__}: {e}")
+    except BaseException:
+        # Cancelled by the caller (e.g. fan-out deadline): not the backend's fault
+        state.probe_in_flight = False
+        _observe(name, "cancelled", t0)
+        raise
+
+    if r.status_code >= 500:
+        state.failure()
+        _observe(name, "error", t0)
+    else:
+        state.success(time.perf_counter() - t0)
+        _observe(name, "ok", t0)
+    return r
+
+
+@asynccontextmanager
+async def stream(name: str, method: str, url: str, *, timeout: float,
+                 pool: Optional[str] = None, **kwargs) -> AsyncIterator[httpx.Response]:
+    """
+    client.stream() through backend `name`'s breaker. The adaptive timeout
+    bounds connect and each read; streams are not hedged.
+    """
+    state = backend(name)
+    state.acquire()
+    state.cap = timeout
+    limit = state.timeout(timeout)
+    kwargs["headers"] = {**(kwargs.get("headers") or {}), **request_headers()}
+    t0 = time.perf_counter()
+    r = None
+    try:
+        async with get_client(pool or name).stream(method, url, timeout=limit, **kwargs) as r:
+            yield r
+    except httpx.TimeoutException:
+        state.failure(timed_out=True)
+        _observe(name, "timeout", t0)
+        raise BackendUnavailable(name, f"timed out after {limit:.1f}s", timed_out=True)
+    except httpx.TransportError as e:
+        state.failure()
+        _observe(name, "error", t0)
+        raise BackendUnavailable(name, f"{type(e).__name__}: {e}")
+    except BaseException:
+        # raise_for_status() on a 5xx inside the block is the backend's fault;
+        # anything else (caller cancelled, parse error) is not
+        if r is not None and r.status_code >= 500:
+            state.failure()
+            _observe(name, "error", t0)
+        else:
+            state.probe_in_flight = False
+            _observe(name, "cancelled", t0)
+        raise
+    if r.status_code >= 500:
+        state.failure()
+        _observe(name, "error", t0)
+    else:
+        state.success(time.perf_counter() - t0)
+        _observe(name, "ok", t0)
+
+
+def snapshot() -> Dict[str, dict]:
+    return {name: state.snapshot() for name, state in sorted(_backends.items())}
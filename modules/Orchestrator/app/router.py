@@ -1,18 +1,60 @@
 # app/router.py
-import os, asyncio, httpx
+import asyncio
+import inspect
+import os
+import time
+
+import httpx
 from fastapi import HTTPException
 
-from .schemas import Profile, DietRules, Gaps, Targets, Conflicts, Plan
+from .schemas import Profile, Plan
+from .pipeline import PIPELINE, execute
+from . import resilience
+from .metrics import CHAT_STAGE_SECONDS
+from .singleflight import SingleFlight, normalize_message
+
+from .intents import MATCHER, match_intents
+from .tools.diabetes_qwen_ov import call_diabetes_qwen, stream_diabetes_qwen
+from .tools.hypertension_qwen_ov import call_htn_qwen, stream_htn_qwen
+from .tools.lipids_qwen_ov import call_lipids_qwen
+from .tools.kidney_qwen_ov import call_kidney_qwen
+
+# Specialty (see app/intents.py) -> (tool, streaming tool or None)
+SPECIALTY_TOOLS = {
+    "diabetes": (call_diabetes_qwen, stream_diabetes_qwen),
+    "hypertension": (call_htn_qwen, stream_htn_qwen),
+    "lipids": (call_lipids_qwen, None),
+    "kidney": (call_kidney_qwen, None),
+}
+
+# Identical concurrent /chat messages (after normalize_message) on the same
+# route share one backend call
+CHAT_COALESCER = SingleFlight()
+
+# Fan-out mode: per-backend deadline in seconds (FANOUT_DEADLINE_S, or e.g.
+# KIDNEY_DEADLINE_S=10), never above the tool's own timeout (lipids: 15 s);
+# a backend that misses it is reported, not awaited
+FANOUT_DEADLINE_S = float(os.getenv("FANOUT_DEADLINE_S", "45"))
+
+
+def deadline_for(name: str) -> float:
+    call_tool, _ = SPECIALTY_TOOLS[name]
+    tool_cap = inspect.signature(call_tool).parameters["timeout"].default
+    return min(float(os.getenv(f"{name.upper()}_DEADLINE_S", FANOUT_DEADLINE_S)), tool_cap)
 
-from .tools.diabetes_qwen_ov import is_diabetes_query, call_diabetes_qwen
-from .tools.hypertension_qwen_ov import is_hypertension_query, call_htn_qwen
-from .tools.lipids_qwen_ov import is_lipids_query, call_lipids_qwen
-from .tools.kidney_qwen_ov import is_kidney_query, call_kidney_qwen 
+
+def _resolve(user_message: str) -> tuple:
+    """match_intents, timed as the "intent" chat stage under the chosen route."""
+    t0 = time.perf_counter()
+    intents, source = match_intents(user_message)
+    route = intents[0][0] if intents else "generic_llm"
+    CHAT_STAGE_SECONDS.labels("intent", route).observe(time.perf_counter() - t0)
+    return intents, source
 
 # -------------------------------------------------------------------
 # Generic LLM fallback (for non-diabetes queries)
 # -------------------------------------------------------------------
-def call_generic_llm(prompt: str) -> str:
+async def call_generic_llm(prompt: str) -> str:
     """
     Existing logic that calls your default LLM / MCP tools.
     (Fill in with your current implementation.)
@@ -21,104 +63,198 @@ def call_generic_llm(prompt: str) -> str:
     raise NotImplementedError
 
 
-def route_user_message(user_message: str) -> dict:
+async def route_user_message(user_message: str) -> dict:
     """
     Central routing function used by your FastAPI endpoint.
     Returns a dict with the reply and some metadata.
-    """
-
-    # 1) Diabetes-specialized routing
-    if is_diabetes_query(user_message):
-        completion = call_diabetes_qwen(user_message)
-        return {
-            "reply": completion,
-            "provider": "diabetes_qwen_ov",
-            "specialized": True,
-        }
 
-    # 2) Hypertension-specialized routing
-    if is_hypertension_query(user_message):
-        completion = call_htn_qwen(user_message)
-        return {
-            "reply": completion,
-            "provider": "hypertension_qwen_ov",
-            "specialized": True,
-        }
-
-    # 3) Lipids-specialized routing
-    if is_lipids_query(user_message):
-        completion = call_lipids_qwen(user_message)
-        return {
-            "reply": completion,
-            "provider": "lipids_qwen_ov",
-            "specialized": True,
-        }
+    The intent classifier (keyword rules when it is unsure) finds every
+    matching specialty; the best-scoring one answers, otherwise the generic
+    path. Ties, including probabilities within INTENT_TIE_MARGIN, go to the
+    order in app/intents.py: diabetes, hypertension, lipids, kidney.
+    "intents" holds probabilities or keyword hits, as "intent_source" says.
 
-    # 4) Kidney-specialized routing
-    if is_kidney_query(user_message):
-        completion = call_kidney_qwen(user_message)
+    Concurrent requests with the same normalized message and route are
+    coalesced into one backend call (CHAT_COALESCER).
+    """
+    intents, source = _resolve(user_message)
+    key = normalize_message(user_message)
+    t0 = time.perf_counter()
+    if intents:
+        name = intents[0][0]
+        call_tool, _ = SPECIALTY_TOOLS[name]
+        completion = await CHAT_COALESCER.do((name, key), lambda: call_tool(user_message))
+        CHAT_STAGE_SECONDS.labels("backend", name).observe(time.perf_counter() - t0)
         return {
             "reply": completion,
-            "provider": "kidney_qwen_ov",
+            "provider": MATCHER.providers[name],
             "specialized": True,
+            "intents": dict(intents),
+            "intent_source": source,
         }
 
-   # 5) Fallback: generic orchestrator path
-    completion = call_generic_llm(user_message)
+    # Fallback: generic orchestrator path
+    completion = await CHAT_COALESCER.do(("generic_llm", key),
+                                         lambda: call_generic_llm(user_message))
+    CHAT_STAGE_SECONDS.labels("backend", "generic_llm").observe(time.perf_counter() - t0)
     return {
         "reply": completion,
         "provider": "generic_llm",
         "specialized": False,
+        "intents": {},
+        "intent_source": source,
     }
 
 
+async def _call_section(name: str, user_message: str) -> dict:
+    """
+    One fan-out section: the specialty reply, or its timeout/error. The tool
+    raises instead of answering with an error string, so backend failures
+    (including an open breaker's fast-fail) are reported as such.
+    """
+    call_tool, _ = SPECIALTY_TOOLS[name]
+    deadline = deadline_for(name)
+    section = {"specialty": name, "provider": MATCHER.providers[name]}
+    t0 = time.perf_counter()
+    try:
+        section["reply"] = await asyncio.wait_for(
+            call_tool(user_message, timeout=deadline, raise_errors=True), timeout=deadline
+        )
+        section["status"] = "ok"
+    except asyncio.TimeoutError:
+        section["reply"] = f"[{name} did not answer within {deadline:g}s]"
+        section["status"] = "timeout"
+    except resilience.BackendUnavailable as e:
+        section["reply"] = f"[{name} unavailable: {e.reason}]"
+        section["status"] = "timeout" if e.timed_out else "error"
+    except httpx.HTTPStatusError as e:
+        section["reply"] = f"[{name} error: HTTP {e.response.status_code}]"
+        section["status"] = "error"
+    except Exception as e:
+        section["reply"] = f"[{name} error: {e!r}]"
+        section["status"] = "error"
+    elapsed = time.perf_counter() - t0
+    CHAT_STAGE_SECONDS.labels("backend", name).observe(elapsed)
+    section["latency_ms"] = round(elapsed * 1000, 1)
+    return section
+
+
+def merge_sections(sections: list) -> str:
+    """
+    One reply with a heading per specialty, in intent order. A failed
+    section shows a one-line notice; its error stays in its "reply".
+    """
+    def body(s: dict) -> str:
+        if s["status"] == "ok":
+            return s["reply"]
+        reason = "timed out" if s["status"] == "timeout" else "failed"
+        return f"_{s['specialty'].capitalize()} advice is unavailable right now ({reason})._"
+
+    if len(sections) == 1:
+        return body(sections[0])
+    return "\n\n".join(
+        f"## {s['specialty'].capitalize()} ({s['provider']})\n{body(s)}" for s in sections
+    )
+
+
+async def fan_out_user_message(user_message: str) -> dict:
+    """
+    Comorbid mode: call every matched specialty concurrently, each under its
+    own deadline, and merge the replies into one sectioned answer. Total
+    latency is the slowest backend (capped by its deadline), not the sum.
+    """
+    intents, source = _resolve(user_message)
+    if not intents:
+        return await route_user_message(user_message)
+
+    sections = await asyncio.gather(
+        *(_call_section(name, user_message) for name, _ in intents)
+    )
+    return {
+        "reply": merge_sections(sections),
+        "provider": sections[0]["provider"] if len(sections) == 1 else "fan_out",
+        "specialized": True,
+        "intents": dict(intents),
+        "intent_source": source,
+        "sections": list(sections),
+    }
+
+
+async def _as_stream(fn, user_message: str):
+    """Wrap a non-streaming tool as a one-chunk stream."""
+    yield {"delta": await fn(user_message)}
+
+
+async def stream_user_message(user_message: str):
+    """
+    Streaming counterpart of route_user_message.
+    Yields events: {"provider", "specialized", "intents", "intent_source"} first,
+    then {"delta"} chunks, then {"done": True}. Backends without a stream
+    endpoint arrive as one chunk. Streaming backends send a {"completion"} before "done": the cleaned reply
+    (what /chat returns), which replaces the text streamed so far.
+    """
+    intents, source = _resolve(user_message)
+    if intents:
+        name = intents[0][0]
+        call_tool, stream_tool = SPECIALTY_TOOLS[name]
+        provider = MATCHER.providers[name]
+        chunks = stream_tool(user_message) if stream_tool else _as_stream(call_tool, user_message)
+    else:
+        provider, chunks = "generic_llm", _as_stream(call_generic_llm, user_message)
+
+    yield {"provider": provider, "specialized": provider != "generic_llm",
+           "intents": dict(intents), "intent_source": source}
+    try:
+        async for event in chunks:
+            yield event
+    except Exception as e:
+        yield {"error": repr(e)}
+    yield {"done": True}
+
+
+async def stream_fan_out(user_message: str):
+    """
+    Streaming counterpart of fan_out_user_message.
+    Yields {"provider", "specialized", "intents", "intent_source"} first, then
+    one {"section"} event per specialty as soon as it answers (or misses its
+    deadline), then {"done": True}.
+    """
+    intents, source = _resolve(user_message)
+    if not intents:
+        async for event in stream_user_message(user_message):
+            yield event
+        return
+
+    yield {"provider": "fan_out" if len(intents) > 1 else MATCHER.providers[intents[0][0]],
+           "specialized": True, "intents": dict(intents), "intent_source": source}
+    for next_done in asyncio.as_completed(
+        [_call_section(name, user_message) for name, _ in intents]
+    ):
+        yield {"section": await next_done}
+    yield {"done": True}
+
+
 # -------------------------------------------------------------------
-# Existing A1–A5 pipeline (unchanged)
+# A1–A5 pipeline (dependency graph in pipeline.py)
 # -------------------------------------------------------------------
-A1_URL = os.getenv("A1_URL", "http://a1:9001")
-A2_URL = os.getenv("A2_URL", "http://a2:9002")
-A3_URL = os.getenv("A3_URL", "http://a3:9003")
-A4_URL = os.getenv("A4_URL", "http://a4:9004")
-A5_URL = os.getenv("A5_URL", "http://a5:9005")
-
-TIMEOUT = httpx.Timeout(15.0, connect=5.0)
+TIMEOUT_S = 15.0
 HEADERS = {"Content-Type": "application/json"}
 
 
-async def call(url: str, payload: dict) -> dict:
-    async with httpx.AsyncClient(timeout=TIMEOUT) as client:
-        r = await client.post(url, json=payload, headers=HEADERS)
-        if r.status_code >= 400:
-            raise HTTPException(status_code=r.status_code, detail=r.text)
-        return r.json()
+async def call(url: str, payload: dict, backend: str = "agents") -> dict:
+    try:
+        r = await resilience.post(backend, url, json=payload, headers=HEADERS,
+                                  timeout=TIMEOUT_S, pool="agents")
+    except resilience.BackendUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    if r.status_code >= 400:
+        raise HTTPException(status_code=r.status_code, detail=r.text)
+    return r.json()
 
 
 async def run_pipeline(profile: Profile) -> Plan:
-    # A1 → diet rules
-    a1 = await call(f"{A1_URL}/diet-rules", profile.model_dump())
-    diet_rules = DietRules(**a1)
-
-    # A2 → gaps
-    a2 = await call(f"{A2_URL}/gaps", {"patient_id": profile.patient_id})
-    gaps = Gaps(**a2)
-
-    # A3 → targets
-    a3 = await call(f"{A3_URL}/targets", {"patient_id": profile.patient_id})
-    targets = Targets(**a3)
-
-    # A4 → conflicts
-    a4 = await call(f"{A4_URL}/conflicts", {"patient_id": profile.patient_id})
-    conflicts = Conflicts(**a4)
-
-    # A5 → plan
-    a5_payload = {
-        "patient_id": profile.patient_id,
-        "diet_rules": diet_rules.model_dump(),
-        "gaps": gaps.model_dump(),
-        "targets": targets.model_dump(),
-        "conflicts": conflicts.model_dump(),
-    }
-    a5 = await call(f"{A5_URL}/plan", a5_payload)
-    plan = Plan(**a5)
+    # A1–A4 run concurrently; A5 starts once all four are in
+    results, trace = await execute(PIPELINE, profile, call)
+    plan = results["plan"]
+    plan.trace = {**plan.trace, "pipeline": trace}
     return plan
-
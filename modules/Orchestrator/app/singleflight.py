@@ -0,0 +1,56 @@
+# app/singleflight.py
+"""
+Single-flight coalescing: concurrent calls with the same key share one
+execution and all receive its result (or exception).
+
+The shared call runs in its own task, and each caller awaits it through
+asyncio.shield, so one impatient client disconnecting does not cancel the
+backend call the other callers are waiting on.
+"""
+import asyncio
+import re
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+_WS = re.compile(r"\s+")
+
+
+def normalize_message(text: str) -> str:
+    """Case- and whitespace-insensitive form of a chat message."""
+    return _WS.sub(" ", (text or "").strip().lower())
+
+
+class SingleFlight:
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._waiters: Dict[Hashable, int] = {}
+        self.stats = {"requests": 0, "executed": 0, "coalesced": 0, "max_waiters": 0}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        self.stats["requests"] += 1
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(fn())
+            self._inflight[key] = task
+            self._waiters[key] = 1
+            task.add_done_callback(lambda t, k=key: self._forget(k, t))
+            self.stats["executed"] += 1
+        else:
+            self._waiters[key] += 1
+            self.stats["coalesced"] += 1
+            self.stats["max_waiters"] = max(self.stats["max_waiters"], self._waiters[key])
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        self._waiters.pop(key, None)
+        # Mark the exception retrieved even if every caller went away
+        if not task.cancelled():
+            task.exception()
+
+    def snapshot(self) -> dict:
+        requests = self.stats["requests"]
+        return {
+            **self.stats,
+            "in_flight": len(self._inflight),
+            "coalesce_rate": round(self.stats["coalesced"] / requests, 3) if requests else 0.0,
+        }
@@ -1,8 +1,11 @@
 # app/tools/diabetes_qwen_ov.py
+import json
 import os
-from typing import Optional
+from typing import AsyncIterator, Optional
 
-import requests
+from .. import resilience
+from ..intents import MATCHER
+from .prompt_format import STOP, STOP_AFTER, build_prompt
 
 # Diabetes OV server running on inference host
 DIABETES_OV_URL = os.getenv(
@@ -52,40 +55,23 @@ General Guidelines:
 
 
 def build_diabetes_prompt(user_message: str) -> str:
-    return (
-        SYSTEM_PROMPT
-        + "\n\nPatient request:\n"
-        + user_message.strip()
-        + "\n\nProvide the 1-day diabetes meal plan now:\n"
-    )
+    return build_prompt(SYSTEM_PROMPT, user_message, "Provide the 1-day diabetes meal plan now:")
 
 
 def is_diabetes_query(text: Optional[str]) -> bool:
-    if not text:
-        return False
-    t = text.lower()
-    keywords = [
-        "diabetes",
-        "diabetic",
-        "blood sugar",
-        "glucose",
-        "hba1c",
-        "t2dm",
-        "type 2",
-        "type-2",
-        "insulin",
-        "metformin",
-    ]
-    return any(k in t for k in keywords)
-
-
-def call_diabetes_qwen(
+    # Vocabulary lives in app/intents.py (one scan for all specialties)
+    return MATCHER.matches(text, "diabetes")
+
+
+async def call_diabetes_qwen(
     user_message: str,
     max_new_tokens: int = 160,
     timeout: float = 60.0,
+    raise_errors: bool = False,
 ) -> str:
     """
     Call the Xeon OpenVINO diabetes Qwen service with a compact, structured prompt.
+    Failures come back as an error reply unless raise_errors (fan-out mode).
     """
     url = f"{DIABETES_OV_URL}/generate"
     prompt = build_diabetes_prompt(user_message)
@@ -93,10 +79,12 @@ def call_diabetes_qwen(
     payload = {
         "prompt": prompt,
         "max_new_tokens": max_new_tokens,
+        "stop": STOP,
+        "stop_after": STOP_AFTER,
     }
 
     try:
-        r = requests.post(url, json=payload, timeout=timeout)
+        r = await resilience.post("diabetes", url, json=payload, timeout=timeout)
         r.raise_for_status()
         data = r.json()
         return (
@@ -105,5 +93,42 @@ def call_diabetes_qwen(
             or data.get("output", "")
         ).strip()
     except Exception as e:
+        if raise_errors:
+            raise
         return f"[Diabetes Qwen OV error: {e}]"
 
+
+async def stream_diabetes_qwen(
+    user_message: str,
+    max_new_tokens: int = 160,
+    timeout: float = 60.0,
+) -> AsyncIterator[dict]:
+    """
+    Stream the diabetes Qwen reply from /generate/stream (NDJSON).
+    Yields {"delta": text} chunks as the service decodes them, then
+    {"completion": text} with the service's cleaned reply, which replaces
+    the streamed draft (it is what /chat returns).
+    """
+    url = f"{DIABETES_OV_URL}/generate/stream"
+    payload = {
+        "prompt": build_diabetes_prompt(user_message),
+        "max_new_tokens": max_new_tokens,
+        "stop": STOP,
+        "stop_after": STOP_AFTER,
+    }
+
+    try:
+        async with resilience.stream(
+            "diabetes", "POST", url, json=payload, timeout=timeout
+        ) as r:
+            r.raise_for_status()
+            async for line in r.aiter_lines():
+                if not line:
+                    continue
+                event = json.loads(line)
+                if event.get("done"):
+                    yield {"completion": (event.get("completion") or "").strip()}
+                elif event.get("text"):
+                    yield {"delta": event["text"]}
+    except Exception as e:
+        yield {"delta": f"[Diabetes Qwen OV error: {e}]"}
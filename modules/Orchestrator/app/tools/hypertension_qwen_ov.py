@@ -1,8 +1,11 @@
 # app/tools/hypertension_qwen_ov.py
+import json
 import os
-from typing import Optional
+from typing import AsyncIterator, Optional
 
-import requests
+from .. import resilience
+from ..intents import MATCHER
+from .prompt_format import STOP, STOP_AFTER, build_prompt
 
 # OV service endpoint for hypertension model (running on inference server 69)
 HYPERTENSION_OV_URL = os.getenv(
@@ -59,45 +62,26 @@ STOP AFTER THIS EXACT FORMAT. DO NOT CONTINUE FURTHER.
 
 
 def build_htn_prompt(user_message: str) -> str:
-    return (
-        SYSTEM_PROMPT
-        + "\n\nPatient request:\n"
-        + user_message.strip()
-        + "\n\nProvide the diet plan now:\n"
-    )
+    return build_prompt(SYSTEM_PROMPT, user_message, "Provide the diet plan now:")
 
 
 def is_hypertension_query(text: Optional[str]) -> bool:
     """
     Simple heuristic router for hypertension / blood pressure topics.
-    If any of these keywords appear, route to the hypertension agent.
+    Vocabulary lives in app/intents.py (one scan for all specialties).
     """
-    if not text:
-        return False
-    t = text.lower()
-    keywords = [
-        "hypertension",
-        "high blood pressure",
-        "blood pressure",
-        "bp ",
-        " bp",
-        "high bp",
-        "htn",
-        "systolic",
-        "diastolic",
-        "dash diet",
-        "dash-style",
-    ]
-    return any(k in t for k in keywords)
-
-
-def call_htn_qwen(
+    return MATCHER.matches(text, "hypertension")
+
+
+async def call_htn_qwen(
     user_message: str,
     max_new_tokens: int = 256,
     timeout: float = 60.0,
+    raise_errors: bool = False,
 ) -> str:
     """
     Call the Xeon OpenVINO hypertension Qwen service.
+    Failures come back as an error reply unless raise_errors (fan-out mode).
     """
     url = f"{HYPERTENSION_OV_URL}/generate"
     prompt = build_htn_prompt(user_message)
@@ -105,10 +89,12 @@ def call_htn_qwen(
     payload = {
         "prompt": prompt,
         "max_new_tokens": max_new_tokens,
+        "stop": STOP,
+        "stop_after": STOP_AFTER,
     }
 
     try:
-        r = requests.post(url, json=payload, timeout=timeout)
+        r = await resilience.post("hypertension", url, json=payload, timeout=timeout)
         r.raise_for_status()
         data = r.json()
         return (
@@ -117,5 +103,42 @@ def call_htn_qwen(
             or data.get("output", "")
         ).strip()
     except Exception as e:
+        if raise_errors:
+            raise
         return f"[Hypertension Qwen OV error: {e}]"
 
+
+async def stream_htn_qwen(
+    user_message: str,
+    max_new_tokens: int = 256,
+    timeout: float = 60.0,
+) -> AsyncIterator[dict]:
+    """
+    Stream the hypertension Qwen reply from /generate/stream (NDJSON).
+    Yields {"delta": text} chunks as the service decodes them, then
+    {"completion": text} with the service's cleaned reply, which replaces
+    the streamed draft (it is what /chat returns).
+    """
+    url = f"{HYPERTENSION_OV_URL}/generate/stream"
+    payload = {
+        "prompt": build_htn_prompt(user_message),
+        "max_new_tokens": max_new_tokens,
+        "stop": STOP,
+        "stop_after": STOP_AFTER,
+    }
+
+    try:
+        async with resilience.stream(
+            "hypertension", "POST", url, json=payload, timeout=timeout
+        ) as r:
+            r.raise_for_status()
+            async for line in r.aiter_lines():
+                if not line:
+                    continue
+                event = json.loads(line)
+                if event.get("done"):
+                    yield {"completion": (event.get("completion") or "").strip()}
+                elif event.get("text"):
+                    yield {"delta": event["text"]}
+    except Exception as e:
+        yield {"delta": f"[Hypertension Qwen OV error: {e}]"}
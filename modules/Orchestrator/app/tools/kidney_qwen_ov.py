@@ -2,10 +2,10 @@
 # app/tools/kidney_qwen_ov.py
 
 import os
-import re
 from typing import Optional
 
-import requests
+from .. import resilience
+from ..intents import MATCHER
 
 # -----------------------------------------------------------
 # Kidney / CKD OV inference endpoint (Xeon server)
@@ -19,30 +19,24 @@ KIDNEY_QWEN_OV_URL = os.getenv(
 # Simple kidney-intent detector
 # -----------------------------------------------------------
 
-_KIDNEY_PAT = re.compile(
-    r"\b(ckd|chronic kidney|kidney disease|kidney|renal|egfr|creatinine|"
-    r"dialysis|nephro|proteinuria|potassium|phosphorus|fluid restriction)\b",
-    flags=re.IGNORECASE,
-)
-
-
 def is_kidney_query(text: Optional[str]) -> bool:
-    if not text:
-        return False
-    return bool(_KIDNEY_PAT.search(text))
+    # Vocabulary lives in app/intents.py (one scan for all specialties)
+    return MATCHER.matches(text, "kidney")
 
 
 # -----------------------------------------------------------
 # Call Kidney Qwen OV service on Xeon
 # -----------------------------------------------------------
 
-def call_kidney_qwen(
+async def call_kidney_qwen(
     user_message: str,
     max_new_tokens: int = 200,
     timeout: float = 60.0,
+    raise_errors: bool = False,
 ) -> str:
     """
     Thin wrapper around the Xeon OpenVINO kidney generator.
+    Failures come back as an error reply unless raise_errors (fan-out mode).
 
     Expected request:
         POST /generate
@@ -58,7 +52,7 @@ def call_kidney_qwen(
     }
 
     try:
-        resp = requests.post(KIDNEY_QWEN_OV_URL, json=payload, timeout=timeout)
+        resp = await resilience.post("kidney", KIDNEY_QWEN_OV_URL, json=payload, timeout=timeout)
         resp.raise_for_status()
         data = resp.json()
         return (
@@ -67,5 +61,7 @@ def call_kidney_qwen(
             or data.get("output", "")
         ).strip()
     except Exception as e:
+        if raise_errors:
+            raise
         return f"[Kidney Qwen OV error: {e}]"
 
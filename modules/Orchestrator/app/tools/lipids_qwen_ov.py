@@ -1,10 +1,10 @@
 #!/usr/bin/env python3
 # app/tools/lipids_qwen_ov.py
 import os
-import re
 from typing import Optional
 
-import requests
+from .. import resilience
+from ..intents import MATCHER
 
 # Default: Xeon inference server LIPIDS service
 # Adjust IP if your Xeon inference IP is different
@@ -15,25 +15,17 @@ LIPIDS_QWEN_OV_URL = os.getenv(
 
 # --------- Simple lipids-intent detector ----------
 
-_LIPIDS_PAT = re.compile(
-    r"\b(ldl|hdl|triglyceride|triglycerides|cholesterol|lipid profile|"
-    r"dyslipidemia|hyperlipidemia)\b",
-    flags=re.IGNORECASE,
-)
-
-
 def is_lipids_query(text: Optional[str]) -> bool:
-    if not text:
-        return False
-    # very cheap heuristic, same style as HTN
-    return bool(_LIPIDS_PAT.search(text))
+    # Vocabulary lives in app/intents.py (one scan for all specialties)
+    return MATCHER.matches(text, "lipids")
 
 
 # --------- HTTP call into Xeon OV Lipids service ----------
 
-def call_lipids_qwen(
+async def call_lipids_qwen(
     user_message: str,
     timeout: float = 15.0,
+    raise_errors: bool = False,
 ) -> str:
     """
     For now, we wrap the free-text user prompt as 'notes' and use
@@ -46,6 +38,8 @@ def call_lipids_qwen(
 
     Response:
         { "plan": "..." }
+
+    Failures come back as an error reply unless raise_errors (fan-out mode).
     """
     payload = {
         "age": 60,          # neutral defaults for router-based calls
@@ -57,7 +51,7 @@ def call_lipids_qwen(
         "notes": user_message,    # carry the actual question here
     }
     try:
-        resp = requests.post(LIPIDS_QWEN_OV_URL, json=payload, timeout=timeout)
+        resp = await resilience.post("lipids", LIPIDS_QWEN_OV_URL, json=payload, timeout=timeout)
         resp.raise_for_status()
         data = resp.json()
         # Prefer "plan", but fall back to other keys if needed
@@ -68,6 +62,8 @@ def call_lipids_qwen(
             or data.get("output", "")
         ).strip()
     except Exception as e:
+        if raise_errors:
+            raise
         # Fallback: at least return a usable error string to the caller
         return f"[Lipids Qwen OV error: {e}]"
 
@@ -0,0 +1,23 @@
+# app/tools/prompt_format.py
+"""
+Prompt layout shared by the meal-plan OV tools (diabetes, hypertension):
+
+    <SYSTEM_PROMPT, whose OUTPUT FORMAT ends with "General Guidelines:">
+
+    Patient request:
+    <user message>
+
+    <ask>
+"""
+
+PATIENT_REQUEST = "Patient request:"
+GUIDELINES = "General Guidelines:"
+
+# The service stops as soon as the model starts a new "Patient request"
+# or finishes the General Guidelines block, instead of running to max tokens
+STOP = [PATIENT_REQUEST]
+STOP_AFTER = [GUIDELINES]
+
+
+def build_prompt(system_prompt: str, user_message: str, ask: str) -> str:
+    return f"{system_prompt}\n\n{PATIENT_REQUEST}\n{user_message.strip()}\n\n{ask}\n"
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: single-pass IntentMatcher vs the old sequential checks.
+
+    cd modules/Orchestrator && python bench_intents.py [--sizes 200 2000 20000] [--repeat 200]
+
+"legacy" reproduces the previous is_diabetes_query / is_hypertension_query /
+is_lipids_query / is_kidney_query chain (lowercase + keyword scan per
+specialty, first match wins). Messages are built from the curated JSONL
+user turns, padded to each size; the worst case for "legacy" is a message
+with no specialty term, where every check scans the whole text.
+
+Also reports how often the two agree on which specialties match at all,
+and the learned classifier's load time and batch latency (app/intents.py
+resolve_intents_batch: n-gram model + keyword features + fallback).
+"""
+import argparse
+import json
+import re
+import time
+from pathlib import Path
+
+from app.intents import INTENT_MODEL, MATCHER, load_classifier, resolve_intents_batch
+
+# This file lives at: modules/Orchestrator/bench_intents.py
+ROOT = Path(__file__).resolve().parents[2]
+CURATED_DIR = ROOT / "data/hypertension/curated"
+
+_DIABETES = ["diabetes", "diabetic", "blood sugar", "glucose", "hba1c",
+             "t2dm", "type 2", "type-2", "insulin", "metformin"]
+_HTN = ["hypertension", "high blood pressure", "blood pressure", "bp ", " bp",
+        "high bp", "htn", "systolic", "diastolic", "dash diet", "dash-style"]
+_LIPIDS = re.compile(
+    r"\b(ldl|hdl|triglyceride|triglycerides|cholesterol|lipid profile|"
+    r"dyslipidemia|hyperlipidemia)\b", flags=re.IGNORECASE)
+_KIDNEY = re.compile(
+    r"\b(ckd|chronic kidney|kidney disease|kidney|renal|egfr|creatinine|"
+    r"dialysis|nephro|proteinuria|potassium|phosphorus|fluid restriction)\b",
+    flags=re.IGNORECASE)
+
+
+def legacy_all(text: str):
+    found = []
+    if any(k in text.lower() for k in _DIABETES):
+        found.append("diabetes")
+    if any(k in text.lower() for k in _HTN):
+        found.append("hypertension")
+    if _LIPIDS.search(text):
+        found.append("lipids")
+    if _KIDNEY.search(text):
+        found.append("kidney")
+    return found
+
+
+def legacy_route(text: str):
+    found = legacy_all(text)
+    return found[0] if found else None
+
+
+def load_texts():
+    texts = []
+    for path in sorted(CURATED_DIR.glob("*.jsonl")):
+        with path.open() as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    rec = json.loads(line)
+                    texts += [m["content"] for m in rec["messages"] if m.get("role") == "user"]
+    return texts
+
+
+def timeit(fn, messages, repeat: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for msg in messages:
+            fn(msg)
+    return (time.perf_counter() - t0) / (repeat * len(messages)) * 1e6
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[200, 2000, 20000])
+    ap.add_argument("--repeat", type=int, default=200)
+    args = ap.parse_args()
+
+    texts = load_texts()
+    same = sum(set(legacy_all(t)) == {n for n, _ in MATCHER.match(t)} for t in texts)
+    print(f"🔹 agreement on matched specialties: {same}/{len(texts)} curated prompts")
+
+    filler = "I walk every morning and eat home food with vegetables and dal. "
+    for size in args.sizes:
+        cases = {
+            "no match": [(filler * (size // len(filler) + 1))[:size]],
+            "match at end": [(filler * (size // len(filler) + 1))[:size] + " my ldl is 170"],
+            "curated": [(t + " " + filler * (size // len(filler) + 1))[:size] for t in texts[:20]],
+        }
+        for name, messages in cases.items():
+            repeat = max(1, args.repeat * 200 // max(size, 200))
+            legacy = timeit(legacy_route, messages, repeat)
+            legacy_full = timeit(legacy_all, messages, repeat)
+            single = timeit(MATCHER.match, messages, repeat)
+            print(f"{size:>6} chars, {name:<12}: legacy first-match {legacy:8.1f} us, "
+                  f"legacy all {legacy_full:8.1f} us, single pass {single:8.1f} us")
+
+    t0 = time.perf_counter()
+    model = load_classifier(INTENT_MODEL)
+    load_ms = (time.perf_counter() - t0) * 1000
+    if model is None:
+        print(f"⚠️ no classifier at {INTENT_MODEL}; run train_intent_classifier.py")
+        return
+    print(f"🔹 classifier loaded in {load_ms:.1f} ms")
+    for batch in (1, 32, 256):
+        messages = (texts * (batch // len(texts) + 1))[:batch]
+        t0 = time.perf_counter()
+        runs = max(1, 2000 // batch)
+        for _ in range(runs):
+            resolve_intents_batch(messages, model)
+        per_msg = (time.perf_counter() - t0) / (runs * batch) * 1e6
+        print(f"   batch {batch:>4}: {per_msg:8.1f} us/message")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Exercise app/resilience.py against local fake backends.
+
+    cd modules/Orchestrator && python verify_resilience.py
+
+Starts two fake OV services on localhost (a primary and a hedge replica)
+whose latency and failures are switched per scenario, points the diabetes
+tool at them, and checks:
+  1. the breaker opens after BREAKER_FAILURES 5xx answers, fails fast while
+     open, and closes again after a successful half-open probe
+  2. the timeout adapts to observed latency, so a stalled backend costs
+     ~ADAPTIVE_TIMEOUT_MULT x p99 instead of the tool's 60 s
+  3. a slow primary is hedged to the replica and the replica's answer wins
+  4. GET /health/backends reports the state
+Exits non-zero on the first failed check.
+"""
+import asyncio
+import os
+import socket
+import sys
+import threading
+import time
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+PRIMARY_PORT, REPLICA_PORT = free_port(), free_port()
+
+# Small limits so the scenarios run in seconds; must be set before app imports
+os.environ.update({
+    "DIABETES_OV_URL": f"http://127.0.0.1:{PRIMARY_PORT}",
+    "DIABETES_HEDGE_URL": f"http://127.0.0.1:{REPLICA_PORT}",
+    "BREAKER_FAILURES": "3",
+    "BREAKER_COOLDOWN_S": "1",
+    "ADAPTIVE_MIN_SAMPLES": "10",
+    "ADAPTIVE_TIMEOUT_MIN_S": "0.3",
+    "HEDGE_DELAY_S": "0.3",
+    "PLAN_DB": "",
+})
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+from app import resilience
+from app.clients import close_clients
+from app.main import app
+from app.tools.diabetes_qwen_ov import call_diabetes_qwen
+
+
+class FakeBackend:
+    """OV /generate stand-in; `delay` and `fail` are changed between checks."""
+
+    def __init__(self, name: str, port: int):
+        self.name = name
+        self.delay = 0.0
+        self.fail = False
+        self.calls = 0
+        api = FastAPI()
+
+        @api.post("/generate")
+        async def generate(req: Request):
+            self.calls += 1
+            await asyncio.sleep(self.delay)
+            if self.fail:
+                return JSONResponse(status_code=500, content={"detail": "injected failure"})
+            return {"completion": f"plan from {self.name}"}
+
+        config = uvicorn.Config(api, host="127.0.0.1", port=port, log_level="warning")
+        self.server = uvicorn.Server(config)
+        threading.Thread(target=self.server.run, daemon=True).start()
+        while not self.server.started:
+            time.sleep(0.01)
+
+
+def check(ok: bool, message: str):
+    if not ok:
+        print(f"❌ {message}")
+        sys.exit(1)
+    print(f"✅ {message}")
+
+
+async def timed(coro):
+    t0 = time.perf_counter()
+    result = await coro
+    return result, time.perf_counter() - t0
+
+
+async def scenarios(primary: FakeBackend, replica: FakeBackend):
+    state = resilience.backend("diabetes")
+
+    # 1. Circuit breaker
+    primary.fail = True
+    for _ in range(3):
+        await call_diabetes_qwen("sugar is high")
+    check(state.state == "open", "breaker opens after 3 consecutive 5xx")
+    calls = primary.calls
+    reply, elapsed = await timed(call_diabetes_qwen("sugar is high"))
+    check(primary.calls == calls and "circuit open" in reply and elapsed < 0.05,
+          f"open breaker fails fast without calling the backend ({elapsed * 1000:.1f} ms)")
+    primary.fail = False
+    await asyncio.sleep(1.1)
+    reply, _ = await timed(call_diabetes_qwen("sugar is high"))
+    check(state.state == "closed" and reply == "plan from primary",
+          "half-open probe succeeds and closes the breaker")
+
+    # 2. Adaptive timeout
+    primary.delay = 0.05
+    for _ in range(12):
+        await call_diabetes_qwen("sugar is high")
+    limit = state.timeout(60.0)
+    check(limit < 1.0, f"timeout adapted from 60 s to {limit:.2f} s")
+    primary.delay = replica.delay = 30.0
+    reply, elapsed = await timed(call_diabetes_qwen("sugar is high"))
+    check("timed out" in reply and elapsed < limit + 0.5,
+          f"stalled backend gives up after {elapsed:.2f} s")
+
+    # 3. Hedging
+    primary.delay, replica.delay = 2.0, 0.02
+    wins = state.stats["hedge_wins"]
+    reply, elapsed = await timed(call_diabetes_qwen("sugar is high"))
+    check(reply == "plan from replica" and state.stats["hedge_wins"] == wins + 1
+          and elapsed < 1.0, f"slow primary hedged to replica ({elapsed:.2f} s)")
+    primary.delay = 0.0
+    # Pooled clients belong to this event loop; the app opens its own
+    await close_clients()
+
+
+def main():
+    primary = FakeBackend("primary", PRIMARY_PORT)
+    replica = FakeBackend("replica", REPLICA_PORT)
+    asyncio.run(scenarios(primary, replica))
+
+    # 4. Health endpoint (breaker state is per process, so it carries over)
+    with TestClient(app) as client:
+        body = client.get("/health/backends").json()
+    diabetes = body["backends"]["diabetes"]
+    check("diet_rules" in body["backends"] and diabetes["hedged"] >= 1
+          and diabetes["p99_ms"] is not None,
+          f"/health/backends reports {len(body['backends'])} backends "
+          f"(diabetes: {diabetes['state']}, p95 {diabetes['p95_ms']} ms, "
+          f"timeout {diabetes['timeout_s']} s)")
+
+    for backend in (primary, replica):
+        backend.server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()